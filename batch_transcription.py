@@ -0,0 +1,459 @@
+'''
+This module transcribes a whole list of YT videos at once instead of one at a time.
+You give it a txt file with one url per line (or a playlist url), and it fetches
+the video info and transcripts for a bunch of videos at the same time using a pool
+of worker threads. Each transcript is saved to its own txt file as soon as it's
+done, and at the end you get a report of which videos worked and which didn't.
+
+The actual YT calls live behind a "provider" so we can swap in a fake one that
+doesn't touch the network (handy for trying things out and for benchmarks).
+
+Usage:
+python batch_transcription.py urls.txt --output-dir transcripts --workers 8
+python batch_transcription.py "https://www.youtube.com/playlist?list=..." --format json
+python batch_transcription.py urls.txt --fake-latency 0.5
+python batch_transcription.py urls.txt --dedup-db signatures.db
+python batch_transcription.py urls.txt --format json --sqlite-db transcripts.sqlite3 --create-tables
+'''
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+
+from instrumentation import metrics
+from text_normalization import remove_special_characters_from_string
+from transcript_cache import TranscriptCache
+from transcript_writer import EXISTING_FILE_POLICIES, STREAMING_FORMATTERS, get_streaming_formatter, write_transcript
+from youtube_urls import extract_video_id
+
+
+class TranscriptProvider:
+    '''
+    This is the interface every provider has to follow. The batch code only ever
+    talks to YT through these methods.
+    '''
+
+    def get_video_title(self, video_id: str) -> str:
+        '''
+        Returns: str of the video's title. This is a network call, so it's only
+        made when the title is actually needed.
+        '''
+        raise NotImplementedError
+
+    def get_video_info(self, video_id: str) -> dict:
+        '''
+        Returns: dictionary with everything the video_info table keeps about a video:
+        "title", "publish_date" (str like "dd-mm-yyyy", or None), "description", "tags"
+        (list of str) and "duration" (int seconds)
+        '''
+        raise NotImplementedError
+
+    def get_transcript(self, video_id: str, language: str = "en") -> list[dict]:
+        '''
+        Returns: list of transcript segments like {"text": ..., "start": ..., "duration": ...},
+        from the transcript in the given language code
+        '''
+        raise NotImplementedError
+
+    def get_playlist_urls(self, playlist_url: str) -> list[str]:
+        '''
+        Returns: list of the video urls in a playlist
+        '''
+        raise NotImplementedError
+
+
+class YouTubeProvider(TranscriptProvider):
+    '''
+    The real provider, which uses pytube for video info and youtube_transcript_api
+    for the transcripts. Those libraries are only imported once they're needed.
+    '''
+
+    def get_video_title(self, video_id: str) -> str:
+        from pytube import YouTube
+
+        return YouTube(f"https://www.youtube.com/watch?v={video_id}").title
+
+    def get_video_info(self, video_id: str) -> dict:
+        from pytube import YouTube
+        from utils import format_publish_date_to_str
+
+        youtube = YouTube(f"https://www.youtube.com/watch?v={video_id}")
+        publish_date = youtube.publish_date
+        return {"title": youtube.title,
+                "publish_date": format_publish_date_to_str(publish_date) if publish_date else None,
+                "description": youtube.description, "tags": list(youtube.keywords or []),
+                "duration": youtube.length}
+
+    def get_transcript(self, video_id: str, language: str = "en") -> list[dict]:
+        from youtube_transcript_api import YouTubeTranscriptApi
+
+        return YouTubeTranscriptApi.get_transcript(video_id=video_id, languages=[language])
+
+    def get_playlist_urls(self, playlist_url: str) -> list[str]:
+        from pytube import Playlist
+
+        return list(Playlist(playlist_url).video_urls)
+
+
+class FakeProvider(TranscriptProvider):
+    '''
+    A provider that never touches the network. It just sleeps for a while to pretend
+    it's waiting on YT, then makes up a transcript. Any video id in failing_video_ids
+    raises an error so we can see how failures get reported.
+
+    Parameters:
+    latency_seconds: how long each call should take
+    latency_jitter: extra random time (0 to this many seconds) added to each call
+    segment_count: how many segments each made up transcript has
+    failing_video_ids: video ids that should fail when their transcript is fetched
+    '''
+
+    def __init__(self, latency_seconds: float = 0.1, latency_jitter: float = 0.0,
+                 segment_count: int = 100, failing_video_ids: set[str] = None) -> None:
+        self.latency_seconds = latency_seconds
+        self.latency_jitter = latency_jitter
+        self.segment_count = segment_count
+        self.failing_video_ids = failing_video_ids or set()
+
+    def wait(self) -> None:
+        time.sleep(self.latency_seconds + random.uniform(0, self.latency_jitter))
+
+    def get_video_title(self, video_id: str) -> str:
+        self.wait()
+        return f"Fake Video {video_id}"
+
+    def get_video_info(self, video_id: str) -> dict:
+        self.wait()
+        return {"title": f"Fake Video {video_id}", "publish_date": "18-10-2023",
+                "description": f"A made up video with the id {video_id}", "tags": ["fake"],
+                "duration": int(self.segment_count * 2.5)}
+
+    def get_transcript(self, video_id: str, language: str = "en") -> list[dict]:
+        self.wait()
+        if video_id in self.failing_video_ids:
+            raise RuntimeError(f"Could not retrieve a transcript for the video {video_id}")
+
+        return [{"text": f"this is segment number {i} of video {video_id}",
+                 "start": i * 2.5, "duration": 2.5}
+                for i in range(self.segment_count)]
+
+    def get_playlist_urls(self, playlist_url: str) -> list[str]:
+        self.wait()
+        return [f"https://www.youtube.com/watch?v=fake{i:07d}" for i in range(10)]
+
+
+class CachingProvider(TranscriptProvider):
+    '''
+    Wraps another provider with a TranscriptCache, so only videos that aren't in
+    the cache (or whose cached info has expired) actually get fetched.
+
+    Parameters:
+    provider: the TranscriptProvider to fetch from on a cache miss
+    cache: the TranscriptCache to check first
+    '''
+
+    def __init__(self, provider: TranscriptProvider, cache: TranscriptCache) -> None:
+        self.provider = provider
+        self.cache = cache
+
+    def get_video_title(self, video_id: str) -> str:
+        metadata = self.cache.get_metadata(video_id)
+        if metadata is None:
+            metadata = {"title": self.provider.get_video_title(video_id)}
+            self.cache.put_metadata(video_id, metadata)
+        return metadata["title"]
+
+    def get_video_info(self, video_id: str) -> dict:
+        metadata = self.cache.get_metadata(video_id)
+        # get_video_title only caches the title, so that's not enough here
+        if metadata is None or "duration" not in metadata:
+            metadata = self.provider.get_video_info(video_id)
+            self.cache.put_metadata(video_id, metadata)
+        return metadata
+
+    def get_transcript(self, video_id: str, language: str = "en") -> list[dict]:
+        fetch_segments = partial(self.provider.get_transcript, language=language)
+        return self.cache.get_or_fetch_segments(video_id, fetch_segments, language=language)
+
+    def get_playlist_urls(self, playlist_url: str) -> list[str]:
+        return self.provider.get_playlist_urls(playlist_url)
+
+
+def read_urls_from_file(filename: str) -> list[str]:
+    '''
+    Reads a txt file with one YT url per line. Blank lines and lines that
+    start with # are skipped.
+
+    Parameters:
+    filename: str of the txt file with the urls in it
+
+    Returns: list of url strings
+    '''
+    with open(filename, 'r') as url_file:
+        return [line.strip() for line in url_file
+                if line.strip() and not line.strip().startswith('#')]
+
+
+def remove_signature_unless_committed(dedup_index, video_id: str, committed: bool) -> None:
+    if not committed:
+        dedup_index.remove(video_id)
+
+
+def transcribe_one_video(provider: TranscriptProvider, video_url: str, output_dir: str,
+                         formatted_type: str = "text", existing_file_policy: str = "replace",
+                         dedup_index=None, db_writer=None, language: str = "en") -> dict:
+    '''
+    This is one "job". It gets the transcript for a single url and streams it into a
+    file in output_dir. The video ID comes straight from the url, and the title is
+    only fetched for txt files, since those need it for the header and filename
+    (json, srt and vtt files are just named after the video ID). Any error is caught
+    and put in the result instead of being raised, so one bad video doesn't stop the
+    whole batch.
+
+    Parameters:
+    provider: the TranscriptProvider to get the data from
+    video_url: str of the YT video url
+    output_dir: str of the folder to save the transcript in
+    formatted_type: "text" for a txt file with a header, or "json", "srt" or "vtt"
+    existing_file_policy: "replace", "skip" or "refuse" (fail) if the file already exists
+    dedup_index: optional near_duplicates.NearDuplicateIndex. If the transcript is a near
+    duplicate of one already in it, the video is skipped before anything is written.
+    Otherwise its own signature is added, and taken back out if writing the file (or its
+    database row) fails.
+    db_writer: optional db_writer.DatabaseWriter. The transcript's segments are queued to
+    be logged as a transcription_data row, without waiting on the database, whenever its
+    file is written (not when an existing file is skipped).
+    language: str of the transcript language code to get, like "en"
+
+    Returns: dictionary with the "url", "video_id", "filename", "success", "skipped",
+    "duplicate_of" (the video ID it's a near duplicate of, or None), "error" and "seconds"
+    '''
+    start_time = time.perf_counter()
+    result = {"url": video_url, "video_id": None, "filename": None, "success": False,
+              "skipped": False, "duplicate_of": None, "error": None}
+
+    try:
+        video_id = extract_video_id(video_url)
+        result["video_id"] = video_id
+        formatter = get_streaming_formatter(formatted_type)
+
+        with metrics.stage("get_transcript"):
+            segments = provider.get_transcript(video_id, language=language)
+        metrics.increment("segments", len(segments))
+
+        duplicates = []
+        added_signature = False
+        if dedup_index is not None:
+            # the check and the add are one locked step, so two workers can't both let the same
+            # transcript through. The lock is let go right away, the slow part happens below.
+            already_indexed = video_id in dedup_index
+            with metrics.stage("dedup_check"):
+                duplicates = dedup_index.check_and_add(video_id, ' '.join(segment["text"] for segment in segments))
+            added_signature = not duplicates and not already_indexed
+
+        if not duplicates:
+            try:
+                if formatter.file_extension == ".txt":
+                    with metrics.stage("get_video_info"):
+                        video_title = provider.get_video_title(video_id)
+                    file_friendly_title = remove_special_characters_from_string(video_title)
+                    filename = os.path.join(output_dir, f"{file_friendly_title}_{video_id}.txt")
+                    header = f"Video Title: {file_friendly_title}\nVideo URL: {video_url}\n\n"
+                else:
+                    filename = os.path.join(output_dir, video_id + formatter.file_extension)
+                    header = ''
+
+                was_written = write_transcript(filename, segments, formatter, header=header,
+                                               existing_file_policy=existing_file_policy)
+
+                # a skipped file was already logged the time it was written
+                if db_writer is not None and was_written:
+                    on_done = None
+                    if added_signature:
+                        # the row is only committed later on the writer thread, so the signature
+                        # is taken back out then if it never makes it into the database
+                        on_done = partial(remove_signature_unless_committed, dedup_index, video_id)
+                    db_writer.write((video_id, 1, json.dumps(segments)), on_done=on_done)
+
+            except Exception:
+                # a video that failed to save never makes a later copy of it look like a duplicate
+                if added_signature:
+                    dedup_index.remove(video_id)
+                raise
+
+        if duplicates:
+            result["duplicate_of"] = duplicates[0][0]
+            result["skipped"] = True
+            result["success"] = True
+            metrics.increment("videos_duplicate")
+        else:
+            result["filename"] = filename
+            result["skipped"] = not was_written
+            result["success"] = True
+            metrics.increment("videos_transcribed")
+
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+        metrics.increment("videos_failed")
+
+    result["seconds"] = time.perf_counter() - start_time
+    metrics.observe("video_total", result["seconds"])
+    return result
+
+
+def transcribe_videos(video_urls: list[str], output_dir: str, provider: TranscriptProvider = None,
+                      workers: int = 8, formatted_type: str = "text", existing_file_policy: str = "replace",
+                      on_result=None, dedup_index=None, db_writer=None, language: str = "en") -> list[dict]:
+    '''
+    This function transcribes a bunch of videos at the same time with a pool of
+    worker threads. Since almost all the time is spent waiting on YT, threads work
+    great here. Files are written as each job finishes, not at the end.
+
+    Parameters:
+    video_urls: list of YT video urls to transcribe
+    output_dir: str of the folder to save the transcripts in (it's created if needed)
+    provider: the TranscriptProvider to use. Defaults to the real YouTubeProvider.
+    workers: how many videos to work on at the same time
+    formatted_type: "text", "json", "srt" or "vtt"
+    existing_file_policy: "replace", "skip" or "refuse" (fail) if a file already exists
+    on_result: optional function that gets called with each job result as soon as it's done
+    dedup_index: optional near_duplicates.NearDuplicateIndex to skip near duplicate transcripts with
+    db_writer: optional db_writer.DatabaseWriter to log every transcript to in the background
+    language: str of the transcript language code to get, like "en"
+
+    Returns: list of the job results (see transcribe_one_video), in the order they finished.
+    '''
+    provider = provider or YouTubeProvider()
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(transcribe_one_video, provider, video_url, output_dir,
+                                formatted_type, existing_file_policy, dedup_index, db_writer, language)
+                for video_url in video_urls]
+
+        for job in as_completed(jobs):
+            result = job.result()
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    return results
+
+
+def open_transcription_writer(sqlite_filename: str = None, create_tables: bool = False):
+    '''
+    Returns: a db_writer.DatabaseWriter that logs to the transcription_data table, in the
+    SQLite file if one is given or the PostgreSQL db in config.py otherwise. The db
+    modules are only imported when this is called.
+    '''
+    import db_dictionaries
+    from db_writer import DatabaseWriter, connect_to_database
+
+    database = connect_to_database(sqlite_filename)
+    table_name = db_dictionaries.video_transcription_data["table_name"]
+    if create_tables:
+        database.build_database_table(table_name=table_name, column_dict=db_dictionaries.video_transcription_data)
+    return DatabaseWriter(database, table_name)
+
+
+def print_job_result(result: dict) -> None:
+    if result["duplicate_of"]:
+        print(f'[dup]    {result["url"]}: near duplicate of {result["duplicate_of"]}')
+    elif result["skipped"]:
+        print(f'[skip]   {result["url"]}: {result["filename"]} already exists')
+    elif result["success"]:
+        print(f'[ok]     {result["url"]} -> {result["filename"]} ({result["seconds"]:.2f}s)')
+    else:
+        print(f'[failed] {result["url"]}: {result["error"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe a list or playlist of YT videos.")
+    parser.add_argument("source", help="txt file with one url per line, or a YT playlist url")
+    parser.add_argument("--output-dir", default="transcripts", help="where to save the transcripts")
+    parser.add_argument("--workers", type=int, default=8, help="how many videos to work on at the same time")
+    parser.add_argument("--format", choices=sorted(STREAMING_FORMATTERS), default="text", help="output format")
+    parser.add_argument("--existing", choices=EXISTING_FILE_POLICIES, default="replace",
+                        help="what to do when an output file already exists")
+    parser.add_argument("--language", default="en", help="language code of the transcripts to get (default: en)")
+    parser.add_argument("--report", help="optional json file to save the per-video report to")
+    parser.add_argument("--fake-latency", type=float, default=None,
+                        help="use the offline fake provider with this many seconds of latency per call")
+    parser.add_argument("--cache-dir", help="optional folder to cache transcripts and video info in")
+    parser.add_argument("--metrics", help="time each stage and save the timings to this file "
+                                          "(.prom for Prometheus text format, anything else for json lines)")
+    parser.add_argument("--dedup-db", help="skip videos whose transcripts are near duplicates of ones "
+                                           "in this signature file (see near_duplicates.py)")
+    parser.add_argument("--log-to-db", action="store_true",
+                        help="log every transcript to the PostgreSQL db in config.py from a background thread")
+    parser.add_argument("--sqlite-db", help="log every transcript to this SQLite file instead of PostgreSQL")
+    parser.add_argument("--create-tables", action="store_true", help="create the db table first if needed")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable()
+
+    if args.fake_latency is not None:
+        provider = FakeProvider(latency_seconds=args.fake_latency)
+    else:
+        provider = YouTubeProvider()
+
+    if args.cache_dir:
+        cache = TranscriptCache(args.cache_dir)
+        provider = CachingProvider(provider, cache)
+
+    if "playlist?list=" in args.source:
+        video_urls = provider.get_playlist_urls(args.source)
+    else:
+        video_urls = read_urls_from_file(args.source)
+
+    dedup_index = None
+    if args.dedup_db:
+        from near_duplicates import NearDuplicateIndex
+        dedup_index = NearDuplicateIndex(args.dedup_db)
+
+    writer = None
+    if args.log_to_db or args.sqlite_db:
+        writer = open_transcription_writer(args.sqlite_db, create_tables=args.create_tables)
+
+    start_time = time.perf_counter()
+    results = transcribe_videos(video_urls, output_dir=args.output_dir, provider=provider,
+                                workers=args.workers, formatted_type=args.format,
+                                existing_file_policy=args.existing,
+                                on_result=print_job_result, dedup_index=dedup_index, db_writer=writer,
+                                language=args.language)
+    elapsed_seconds = time.perf_counter() - start_time
+
+    succeeded = sum(result["success"] for result in results)
+    print(f"\n{succeeded} of {len(results)} videos transcribed in {elapsed_seconds:.2f}s "
+          f"({len(results) - succeeded} failed)")
+
+    # the writer goes first, its last rows can still take a signature back out of the index
+    if writer is not None:
+        from db_writer import print_report
+        print_report(writer.close())
+
+    if dedup_index is not None:
+        print(f'{sum(bool(result["duplicate_of"]) for result in results)} near duplicates skipped')
+        dedup_index.close()
+
+    if args.cache_dir:
+        cache_stats = cache.stats()
+        print(f'Cache: {sum(cache_stats["hits"].values())} hits, '
+              f'{sum(cache_stats["misses"].values())} misses, {cache_stats["evictions"]} evictions')
+
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(results, report_file, indent=2)
+
+    if args.metrics:
+        print('\n' + metrics.format_summary())
+        metrics.save(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+'''
+This module times the hot paths in this repo (reading transcript files, counting words,
+cleaning strings, formatting transcripts and building SQL strings) so we can see how
+they hold up on long transcripts, and catch it when a change makes one of them slower.
+
+It uses the ISTA 130 midterm review transcript that comes with this repo, plus synthetic
+transcripts that are made from its words but are a lot bigger. The synthetic ones are
+always the same for the same size, so runs can be compared against each other. None of
+this needs the internet.
+
+Every run can be saved to a json file, and compared against a saved baseline run. If any
+stage got slower than the baseline by more than the threshold, the script exits with 1.
+Timings depend on the machine, so the baseline (benchmark_baseline.json) isn't kept in git.
+Make your own with --save-baseline on the machine you compare on, before making changes.
+
+The database ingestion benchmark needs a local PostgreSQL server (set up in config.py,
+same as database.py), so it only runs if you pass --postgres.
+
+Usage:
+python benchmarks.py
+python benchmarks.py --save-baseline
+python benchmarks.py --output results.json --threshold 0.25
+python benchmarks.py --legacy
+python benchmarks.py --postgres --rows 20000
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import txt_file_analytics
+import utils
+from text_normalization import Tokenizer, normalize_text, remove_special_characters_from_string
+from transcript_writer import STREAMING_FORMATTERS
+
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_TRANSCRIPT = os.path.join(BENCHMARK_FOLDER, "ISTA 130 Intro to Python Midterm Review.txt")
+BASELINE_FILENAME = os.path.join(BENCHMARK_FOLDER, "benchmark_baseline.json")
+
+# 1 is the real sample transcript, anything bigger is a synthetic one that many times its size
+DEFAULT_SCALES = (1, 10, 100)
+
+# a stage only counts as slower if it's slower by this fraction of its baseline time...
+DEFAULT_REGRESSION_THRESHOLD = 0.25
+# ...and by at least this many seconds, so tiny timings bouncing around don't count
+MINIMUM_REGRESSION_SECONDS = 0.005
+
+
+def legacy_build_unique_word_dictionary(input_string: str) -> dict[str, int]:
+    '''
+    This is the old way we counted words, kept around only so we have something to
+    compare against. It does a full substring count of the whole string for every
+    unique word, so it gets slow fast on long transcripts.
+
+    Parameters:
+    input_string: any string you wish to count the unique words in
+
+    Returns: dictionary of unique words and their (substring) counts.
+    '''
+    unique_word_set = {word for word in input_string.split()
+                       if len(word) != 1 or word in ['a', 'i']}
+    return {word: input_string.count(word) for word in unique_word_set}
+
+
+def legacy_remove_special_characters_from_string(input_string: str) -> str:
+    '''
+    This is the character by character += version of remove_special_characters_from_string
+    that download_a_yt_video.py and the transcribe scripts used to each have a copy of,
+    kept around only so we have something to compare text_normalization against.
+
+    Parameters:
+    input_string: str you wish to format
+
+    Returns: formatted str
+    '''
+    new_string = ""
+    for character in input_string:
+        if character.isalnum() or character.isspace():
+            new_string += character
+    return new_string
+
+
+def build_synthetic_transcript(source_text: str, scale: int, seed: int = 130) -> str:
+    '''
+    This function makes a bigger fake transcript by randomly picking words from
+    the source text. The same seed always gives back the same transcript.
+
+    Parameters:
+    source_text: str of the transcript we want to borrow words from
+    scale: how many times bigger than the source text the new transcript should be
+    seed: seed for the random number generator
+
+    Returns: str of the synthetic transcript, with 8 words per line like the real ones.
+    '''
+    source_words = source_text.split()
+    randomizer = random.Random(seed)
+    words = randomizer.choices(source_words, k=len(source_words) * scale)
+    lines = [' '.join(words[i:i + 8]) for i in range(0, len(words), 8)]
+    return '\n'.join(lines)
+
+
+def time_function(function, *args, repeat: int = 3) -> float:
+    '''
+    Runs a function a few times and returns the fastest run, in seconds.
+
+    Parameters:
+    function: the function to time
+    args: whatever arguments should be passed into the function
+    repeat: how many times to run it
+
+    Returns: float of the best time in seconds
+    '''
+    best_time = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function(*args)
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time
+
+
+def build_synthetic_segments(text: str, words_per_segment: int = 8) -> list[dict]:
+    '''
+    Turns a transcript into fake {"text", "start", "duration"} segments, like the ones
+    youtube_transcript_api gives us, with every segment lasting 2.5 seconds.
+
+    Parameters:
+    text: str of the transcript
+    words_per_segment: how many words go in each segment
+
+    Returns: list of segment dicts
+    '''
+    words = text.split()
+    return [{"text": ' '.join(words[i:i + words_per_segment]),
+             "start": (i // words_per_segment) * 2.5, "duration": 2.5}
+            for i in range(0, len(words), words_per_segment)]
+
+
+def get_benchmark_stages(text: str, text_filename: str) -> list[tuple]:
+    '''
+    This function lists every stage we time, with everything it needs already built,
+    so the timings only include the work we actually care about.
+
+    Parameters:
+    text: str of the transcript to run the stages on
+    text_filename: str of a file with that same transcript in it
+
+    Returns: list of (stage name, function, arguments) tuples
+    '''
+    segments = build_synthetic_segments(text)
+    words = text.split()
+
+    casefolding_tokenizer = Tokenizer(hyphens="split", apostrophes="keep", casefold=True, unicode_form="NFKC")
+
+    def format_segments(formatter):
+        return ''.join(formatter.iter_transcript(segments))
+
+    def count_casefolded_words(text):
+        return casefolding_tokenizer.count(text)
+
+    stages = [
+        ("extract_text_from_file", txt_file_analytics.extract_text_from_file, (text_filename,)),
+        ("build_unique_word_dictionary", txt_file_analytics.build_unique_word_dictionary, (text,)),
+        ("build_unique_word_dictionary_from_file",
+         txt_file_analytics.build_unique_word_dictionary_from_file, (text_filename,)),
+        ("remove_special_characters_from_string", remove_special_characters_from_string, (text,)),
+        ("legacy_remove_special_characters_from_string", legacy_remove_special_characters_from_string, (text,)),
+        ("normalize_text", normalize_text, (text,)),
+        ("casefolded_word_counting", count_casefolded_words, (text,)),
+        ("format_list_into_sql_array", utils.format_list_into_sql_array, (words,)),
+    ]
+
+    for formatted_type in ("text", "json", "srt", "vtt"):
+        stages.append((f"format_{formatted_type}", format_segments, (STREAMING_FORMATTERS[formatted_type](),)))
+
+    return stages
+
+
+def run_benchmark_suite(scales: tuple[int, ...] = DEFAULT_SCALES, repeat: int = 5, on_result=None) -> list[dict]:
+    '''
+    This function times every stage on the sample transcript and on synthetic transcripts
+    of each size. The transcripts are written to a temp folder for the stages that read files.
+
+    Parameters:
+    scales: the sizes to test, where 1 is the real transcript and anything bigger is synthetic
+    repeat: how many times to run each stage (the fastest run counts)
+    on_result: optional function that gets called with each result as soon as it's done
+
+    Returns: list of dicts with the "name", "stage", "scale", "bytes" and "seconds" of each stage
+    '''
+    source_text = txt_file_analytics.extract_text_from_file(SAMPLE_TRANSCRIPT)
+    results = []
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+        for scale in scales:
+            text = source_text if scale == 1 else build_synthetic_transcript(source_text, scale=scale)
+            text_filename = os.path.join(temp_folder, f"transcript_x{scale}.txt")
+            with open(text_filename, 'w', encoding='utf-8') as text_file:
+                text_file.write(text)
+
+            for stage, function, arguments in get_benchmark_stages(text, text_filename):
+                result = {
+                    "name": f"{stage}/x{scale}",
+                    "stage": stage,
+                    "scale": scale,
+                    "bytes": len(text.encode()),
+                    "seconds": time_function(function, *arguments, repeat=repeat),
+                }
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+    return results
+
+
+def save_results(filename: str, results: list[dict]) -> None:
+    '''
+    Saves benchmark results to a json file, along with what machine and python they came from.
+
+    Parameters:
+    filename: str of the json file to save to
+    results: list of result dicts from run_benchmark_suite
+
+    Returns: None
+    '''
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(filename, 'w', encoding='utf-8') as json_file:
+        json.dump(report, json_file, indent=2)
+
+
+def load_results(filename: str) -> list[dict]:
+    '''
+    Returns: the list of result dicts saved in a benchmark json file
+    '''
+    with open(filename, 'r', encoding='utf-8') as json_file:
+        return json.load(json_file)["results"]
+
+
+def compare_to_baseline(results: list[dict], baseline_results: list[dict],
+                        threshold: float = DEFAULT_REGRESSION_THRESHOLD,
+                        minimum_seconds: float = MINIMUM_REGRESSION_SECONDS) -> list[dict]:
+    '''
+    This function compares each stage's time to the same stage (and size) in the baseline.
+    Stages that aren't in the baseline are skipped.
+
+    Parameters:
+    results: list of result dicts from this run
+    baseline_results: list of result dicts from the baseline run
+    threshold: how much slower (as a fraction, 0.25 is 25%) a stage can get before it's a regression
+    minimum_seconds: a stage also has to be at least this many seconds slower to be a regression
+
+    Returns: list of dicts with the "name", "seconds", "baseline_seconds", "change"
+    (as a fraction, negative means faster) and "regression" (True or False) of each stage
+    '''
+    baseline_seconds_by_name = {result["name"]: result["seconds"] for result in baseline_results}
+    comparisons = []
+
+    for result in results:
+        baseline_seconds = baseline_seconds_by_name.get(result["name"])
+        if baseline_seconds is None:
+            continue
+
+        change = (result["seconds"] - baseline_seconds) / baseline_seconds if baseline_seconds else 0.0
+        comparisons.append({
+            "name": result["name"],
+            "seconds": result["seconds"],
+            "baseline_seconds": baseline_seconds,
+            "change": change,
+            "regression": change > threshold and result["seconds"] - baseline_seconds > minimum_seconds,
+        })
+
+    return comparisons
+
+
+def benchmark_word_counting(scales: tuple[int, ...] = (1, 100)) -> list[dict]:
+    '''
+    This function compares the old word counting against the single pass one
+    on the sample transcript at each scale.
+
+    Parameters:
+    scales: the sizes to test, where 1 is the real transcript and anything bigger is synthetic
+
+    Returns: list of dicts with the results for each scale
+    '''
+    source_text = txt_file_analytics.extract_text_from_file(SAMPLE_TRANSCRIPT)
+    results = []
+
+    for scale in scales:
+        if scale == 1:
+            text = source_text
+        else:
+            text = build_synthetic_transcript(source_text, scale=scale)
+
+        legacy_seconds = time_function(legacy_build_unique_word_dictionary, text, repeat=1)
+        single_pass_seconds = time_function(txt_file_analytics.build_unique_word_dictionary, text)
+
+        results.append({
+            "stage": "word_counting",
+            "scale": scale,
+            "bytes": len(text.encode()),
+            "legacy_seconds": legacy_seconds,
+            "single_pass_seconds": single_pass_seconds,
+            "speedup": legacy_seconds / single_pass_seconds,
+        })
+
+    return results
+
+
+def build_synthetic_transcription_rows(row_count: int, segments_per_row: int = 20) -> list[tuple]:
+    '''
+    Makes fake rows for the transcription_data table: (id, part_number, transcription_text).
+
+    Parameters:
+    row_count: how many rows to make
+    segments_per_row: how many transcript segments go in each row's json
+
+    Returns: list of row tuples
+    '''
+    randomizer = random.Random(130)
+    rows = []
+    for row_number in range(row_count):
+        segments = [{"text": f"segment {i} says {randomizer.random():.6f}", "start": i * 2.5, "duration": 2.5}
+                    for i in range(segments_per_row)]
+        rows.append((f"video{row_number // 10:07d}", row_number % 10, json.dumps(segments)))
+    return rows
+
+
+def benchmark_db_ingestion(row_count: int = 5000, batch_size: int = 1000) -> list[dict]:
+    '''
+    This function compares logging rows one at a time (log_to_DB) against the batched
+    path (log_many_to_DB) on a local PostgreSQL server. The rows go into a scratch copy
+    of the transcription_data table that's dropped afterwards.
+
+    Parameters:
+    row_count: how many rows to insert with each method
+    batch_size: how many rows per batch for the bulk path
+
+    Returns: list of dicts with the rows/s for each method
+    '''
+    import config
+    import db_dictionaries
+    from database import Database
+
+    db_instance = Database(dbname=config.database_info["database_name"], user=config.database_info["user"],
+                           password=config.database_info["password"], host=config.database_info["host"],
+                           port=config.database_info["port"])
+
+    table_name = "benchmark_transcription_data"
+    column_dict = {key: value for key, value in db_dictionaries.video_transcription_data.items()
+                   if key != "table_name"}
+    columns = ', '.join(f'{key} {value}' for key, value in column_dict.items())
+    rows = build_synthetic_transcription_rows(row_count)
+    results = []
+
+    def per_row_path():
+        for row in rows:
+            db_instance.log_to_DB(row, table_name)
+
+    def bulk_path():
+        db_instance.log_many_to_DB(rows, table_name, batch_size=batch_size)
+
+    try:
+        for method, function in (("per_row", per_row_path), ("bulk", bulk_path)):
+            db_instance.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            db_instance.cursor.execute(f"CREATE TABLE {table_name} ({columns})")
+            db_instance.conn.commit()
+
+            seconds = time_function(function, repeat=1)
+            results.append({
+                "stage": "db_ingestion",
+                "method": method,
+                "rows": row_count,
+                "batch_size": batch_size if method == "bulk" else 1,
+                "seconds": seconds,
+                "rows_per_second": row_count / seconds,
+            })
+    finally:
+        db_instance.cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        db_instance.conn.commit()
+        db_instance.conn.close()
+
+    return results
+
+
+def print_stage_result(result: dict) -> None:
+    print(f'{result["name"]:<55} {result["bytes"]:>12,} bytes {result["seconds"] * 1000:>10.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the analytics, formatting and ingestion hot paths.")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES),
+                        help="transcript sizes to test, 1 is the sample transcript (default: 1 10 100)")
+    parser.add_argument("--repeat", type=int, default=5, help="how many times to run each stage (best time counts)")
+    parser.add_argument("--output", help="save the results to this json file")
+    parser.add_argument("--baseline", default=BASELINE_FILENAME, help="json file of the results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="save these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help="how much slower a stage can get before it fails, 0.25 is 25%% (default: 0.25)")
+    parser.add_argument("--legacy", action="store_true", help="also compare against the old substring word counting")
+    parser.add_argument("--postgres", action="store_true", help="also benchmark ingestion into the PostgreSQL db in config.py")
+    parser.add_argument("--rows", type=int, default=5000, help="rows to insert for the ingestion benchmark")
+    parser.add_argument("--batch-size", type=int, default=1000, help="batch size for the bulk ingestion path")
+    args = parser.parse_args()
+
+    results = run_benchmark_suite(scales=tuple(args.scales), repeat=args.repeat, on_result=print_stage_result)
+
+    if args.output:
+        save_results(args.output, results)
+
+    regressions = []
+
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print(f"\nSaved the baseline to {args.baseline}")
+
+    elif os.path.exists(args.baseline):
+        comparisons = compare_to_baseline(results, load_results(args.baseline), threshold=args.threshold)
+        regressions = [comparison for comparison in comparisons if comparison["regression"]]
+
+        print(f"\nCompared {len(comparisons)} stages to {args.baseline}:")
+        for comparison in comparisons:
+            status = "SLOWER" if comparison["regression"] else "ok"
+            print(f'[{status:>6}] {comparison["name"]:<55} {comparison["baseline_seconds"] * 1000:>10.2f}ms -> '
+                  f'{comparison["seconds"] * 1000:>10.2f}ms ({comparison["change"]:+.0%})')
+
+    else:
+        print(f"\nThere's no baseline at {args.baseline} to compare against yet, "
+              f"run with --save-baseline to make one on this machine")
+
+    if args.legacy:
+        print()
+        for result in benchmark_word_counting():
+            print(f'{result["stage"]} x{result["scale"]} ({result["bytes"]:,} bytes): '
+                  f'legacy {result["legacy_seconds"]:.3f}s, '
+                  f'single pass {result["single_pass_seconds"]:.3f}s, '
+                  f'{result["speedup"]:.1f}x faster')
+
+    if args.postgres:
+        for result in benchmark_db_ingestion(row_count=args.rows, batch_size=args.batch_size):
+            print(f'{result["stage"]} {result["method"]} (batch size {result["batch_size"]}): '
+                  f'{result["rows"]:,} rows in {result["seconds"]:.2f}s, '
+                  f'{result["rows_per_second"]:,.0f} rows/s')
+
+    # only after every run that was asked for, so one slower stage doesn't skip the rest
+    if regressions:
+        print(f"\n{len(regressions)} stages got more than {args.threshold:.0%} slower than the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+'''
+This module saves "most spoken words" charts (like the top 50 png in this repo) straight
+to image files, without opening any windows. It's meant for making charts for a whole
+folder of transcripts at once, so the charts are drawn in parallel worker processes.
+
+matplotlib is only imported inside the functions that draw, and it's used through the
+Agg canvas directly instead of pyplot, so nothing needs a screen and every figure is
+thrown away as soon as it's saved (pyplot would keep them all around until closed).
+
+Usage:
+python chart_rendering.py path/to/transcripts --output-dir charts --format png --format svg
+'''
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Union
+
+import txt_file_analytics
+from dictionary_index import load_dictionary_index
+from top_k import SpaceSaving, get_top_words
+
+
+DICTIONARY_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "words_alpha.txt")
+CHART_FORMATS = ("png", "svg")
+
+
+def render_word_chart(word_dict: Union[dict[str, int], SpaceSaving], filename: str,
+                      output_filenames: list[str], top_k: int = 50, dpi: int = 100) -> None:
+    '''
+    This function draws the top words chart and saves it to one or more image files
+    (the file type comes from each file's extension, like .png or .svg).
+
+    Parameters:
+    word_dict: dictionary (or SpaceSaving counter) of words and their counts
+    filename: name of the transcript file, used for the chart title
+    output_filenames: list of image files to save the chart to
+    top_k: how many of the most spoken words to plot
+    dpi: resolution for png files
+
+    Returns: None
+    '''
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(16, 10))
+    FigureCanvasAgg(figure)
+
+    try:
+        txt_file_analytics.draw_top_words(figure.gca(), get_top_words(word_dict, top_k), filename)
+        figure.tight_layout()
+        for output_filename in output_filenames:
+            figure.savefig(output_filename, dpi=dpi)
+    finally:
+        figure.clear()
+
+
+def render_timeline_chart(report: dict, filename: str, output_filenames: list[str], dpi: int = 100) -> None:
+    '''
+    This function draws the words per minute and term frequency over time chart from
+    timeline_analytics and saves it to one or more image files.
+
+    Parameters:
+    report: dictionary from timeline_analytics.analyze_timeline
+    filename: name of the transcript file, used for the chart title
+    output_filenames: list of image files to save the chart to
+    dpi: resolution for png files
+
+    Returns: None
+    '''
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from timeline_analytics import draw_timeline
+
+    figure = Figure(figsize=(16, 10))
+    FigureCanvasAgg(figure)
+
+    try:
+        draw_timeline(figure, report, filename)
+        figure.tight_layout()
+        for output_filename in output_filenames:
+            figure.savefig(output_filename, dpi=dpi)
+    finally:
+        figure.clear()
+
+
+def render_transcript_chart(transcript_filename: str, output_dir: str, formats: tuple[str, ...] = ("png",),
+                            top_k: int = 50, real_words_only: bool = True) -> dict:
+    '''
+    This is one job for a worker process: count the words in a transcript and save its chart.
+    Errors are caught and put in the result so one bad file doesn't stop the batch.
+
+    Parameters:
+    transcript_filename: str of the transcript txt file
+    output_dir: str of the folder to save the charts in
+    formats: which image types to save, like ("png", "svg")
+    top_k: how many of the most spoken words to plot
+    real_words_only: if True, only words found in words_alpha.txt are plotted
+
+    Returns: dictionary with the "filename", the "charts" that were saved, "success" and "error"
+    '''
+    from corpus_analytics import get_output_name
+
+    result = {"filename": transcript_filename, "charts": [], "success": False, "error": None}
+
+    try:
+        word_dict = txt_file_analytics.build_unique_word_dictionary_from_file(transcript_filename)
+
+        if real_words_only:
+            real_words = load_dictionary_index(DICTIONARY_FILENAME)
+            word_dict = txt_file_analytics.word_dictionary_real_word_extraction(word_dict, real_words)
+            real_words.close()
+
+        if not word_dict:
+            raise ValueError("there are no words to plot")
+
+        # same naming as the word tables, so same named transcripts in different folders don't clash
+        chart_name = get_output_name(transcript_filename)
+        output_filenames = [os.path.join(output_dir, f"{chart_name}.{chart_format}") for chart_format in formats]
+        render_word_chart(word_dict, transcript_filename, output_filenames, top_k=top_k)
+
+        result["charts"] = output_filenames
+        result["success"] = True
+
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+
+    return result
+
+
+def render_charts(transcript_filenames: list[str], output_dir: str, formats: tuple[str, ...] = ("png",),
+                  top_k: int = 50, real_words_only: bool = True, workers: int = None, on_result=None) -> list[dict]:
+    '''
+    This function saves a chart for every transcript, spread across worker processes.
+
+    Parameters:
+    transcript_filenames: list of transcript txt files
+    output_dir: str of the folder to save the charts in (it's created if needed)
+    formats: which image types to save, like ("png", "svg")
+    top_k: how many of the most spoken words to plot
+    real_words_only: if True, only words found in words_alpha.txt are plotted
+    workers: how many worker processes to use. Defaults to the number of CPU cores.
+    on_result: optional function that gets called with each result as soon as it's done
+
+    Returns: list of the job results (see render_transcript_chart), in the order they finished.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+
+    if real_words_only:
+        # build the index once up here so the workers don't all try to build it at the same time
+        load_dictionary_index(DICTIONARY_FILENAME).close()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = [executor.submit(render_transcript_chart, transcript_filename, output_dir,
+                                tuple(formats), top_k, real_words_only)
+                for transcript_filename in transcript_filenames]
+
+        for job in as_completed(jobs):
+            result = job.result()
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+    return results
+
+
+def main():
+    from corpus_analytics import find_transcript_files
+
+    parser = argparse.ArgumentParser(description="Save top words charts for a folder of transcripts.")
+    parser.add_argument("path", help="folder of transcript txt files, or a glob pattern")
+    parser.add_argument("--output-dir", default="charts", help="where to save the charts")
+    parser.add_argument("--format", dest="formats", action="append", choices=CHART_FORMATS,
+                        help="image type to save, can be given more than once (default: png)")
+    parser.add_argument("--top", type=int, default=50, help="how many words to plot")
+    parser.add_argument("--all-words", action="store_true", help="plot every word, not just ones in words_alpha.txt")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    transcript_filenames = find_transcript_files(args.path)
+    if not transcript_filenames:
+        print(f"I couldn't find any txt files in {args.path}...")
+        return
+
+    start_time = time.perf_counter()
+    results = render_charts(transcript_filenames, args.output_dir, formats=args.formats or ["png"],
+                            top_k=args.top, real_words_only=not args.all_words, workers=args.workers)
+    elapsed_seconds = time.perf_counter() - start_time
+
+    for result in results:
+        if not result["success"]:
+            print(f'[failed] {result["filename"]}: {result["error"]}')
+
+    succeeded = sum(result["success"] for result in results)
+    print(f"Saved charts for {succeeded} of {len(results)} transcripts to {args.output_dir} "
+          f"in {elapsed_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+'''
+One command line entry point for everything in this repo, so nothing has to be
+typed into input() prompts and it can all run from scripts and cron jobs.
+
+Each subcommand only imports what it needs once it actually runs. Just loading this
+file (or running --help) imports nothing but argparse, so "analyze" never pays for
+pytube or psycopg2 and "--help" never pays for anything. tests/test_cli_startup.py
+keeps it that way.
+
+Usage:
+python cli.py download <urls or urls.txt> [--policy audio_only] [--budget 2000000000] [--plan-only]
+python cli.py transcribe <url or urls.txt or playlist url> [--format text|json|srt|vtt] [--output-dir transcripts]
+python cli.py analyze <transcript.txt or folder> [--top 50] [--real-words-only] [--chart chart.png]
+python cli.py ingest <json transcripts...> [--batch-size 1000] [--create-tables]
+python cli.py similar <folder of transcripts> [--video transcript.txt] [--top 5] [--save term_matrix.npz]
+python cli.py timeline <transcript.json or .segs> [--bin-seconds 60] [--terms python loop] [--chart timeline.png]
+'''
+import argparse
+import os
+import sys
+
+
+def run_download(args: argparse.Namespace) -> int:
+    if args.filename:
+        import download_a_yt_video
+
+        if len(args.sources) != 1:
+            print("--filename only works when downloading one video", file=sys.stderr)
+            return 1
+
+        video_was_successfully_saved = download_a_yt_video.download_video(
+            url=args.sources[0], filename=args.filename, workers=args.workers, policy=args.policy,
+            min_resolution=args.min_resolution, max_bytes=args.max_bytes)
+        if not video_was_successfully_saved:
+            print("There was a problem in trying to save the video...", file=sys.stderr)
+            return 1
+
+        print("Video was saved successfully")
+        return 0
+
+    import stream_selection
+    from batch_transcription import read_urls_from_file
+
+    video_urls = []
+    for source in args.sources:
+        video_urls.extend(read_urls_from_file(source) if os.path.isfile(source) else [source])
+
+    plan = stream_selection.plan_downloads(video_urls, policy=args.policy, min_resolution=args.min_resolution,
+                                           max_bytes=args.max_bytes, byte_budget=args.budget)
+    stream_selection.print_plan(plan)
+    if args.plan_only:
+        return 0
+
+    print()
+    report = stream_selection.download_planned_videos(plan, args.output_dir, workers=args.workers,
+                                                      on_result=stream_selection.print_download_result)
+    print(f'\nDownloaded {report["downloaded_bytes"] / 1_000_000:.1f} MB')
+    return 0 if all(result["success"] or result["skipped"] for result in report["results"]) else 1
+
+
+def run_transcribe(args: argparse.Namespace) -> int:
+    import batch_transcription
+    from instrumentation import metrics
+
+    if args.metrics:
+        metrics.enable()
+
+    if args.fake_latency is not None:
+        provider = batch_transcription.FakeProvider(latency_seconds=args.fake_latency)
+    else:
+        provider = batch_transcription.YouTubeProvider()
+
+    if args.cache_dir:
+        from transcript_cache import TranscriptCache
+        provider = batch_transcription.CachingProvider(provider, TranscriptCache(args.cache_dir))
+
+    video_urls = []
+    for source in args.sources:
+        if os.path.isfile(source):
+            video_urls.extend(batch_transcription.read_urls_from_file(source))
+        elif "playlist?list=" in source:
+            video_urls.extend(provider.get_playlist_urls(source))
+        else:
+            video_urls.append(source)
+
+    dedup_index = None
+    if args.dedup_db:
+        from near_duplicates import NearDuplicateIndex
+        dedup_index = NearDuplicateIndex(args.dedup_db)
+
+    writer = None
+    if args.log_to_db or args.sqlite_db:
+        writer = batch_transcription.open_transcription_writer(args.sqlite_db, create_tables=args.create_tables)
+
+    results = batch_transcription.transcribe_videos(
+        video_urls, output_dir=args.output_dir, provider=provider, workers=args.workers,
+        formatted_type=args.format, existing_file_policy=args.existing,
+        on_result=batch_transcription.print_job_result, dedup_index=dedup_index, db_writer=writer,
+        language=args.language)
+
+    failed = sum(not result["success"] for result in results)
+    print(f"\n{len(results) - failed} of {len(results)} videos transcribed ({failed} failed)")
+
+    # the writer goes first, its last rows can still take a signature back out of the index
+    if writer is not None:
+        from db_writer import print_report
+        print_report(writer.close())
+
+    if dedup_index is not None:
+        print(f'{sum(bool(result["duplicate_of"]) for result in results)} near duplicates skipped')
+        dedup_index.close()
+
+    if args.metrics:
+        print('\n' + metrics.format_summary())
+        metrics.save(args.metrics)
+
+    return 1 if failed else 0
+
+
+def run_analyze(args: argparse.Namespace) -> int:
+    if os.path.isfile(args.path):
+        import txt_file_analytics
+        from top_k import get_top_words
+
+        word_dict = txt_file_analytics.build_unique_word_dictionary_from_file(args.path)
+
+        if args.real_words_only:
+            from dictionary_index import load_dictionary_index
+            real_words = load_dictionary_index(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                            "words_alpha.txt"))
+            word_dict = txt_file_analytics.word_dictionary_real_word_extraction(word_dict, real_words)
+
+        if args.chart:
+            from chart_rendering import render_word_chart
+            render_word_chart(word_dict, args.path, [args.chart], top_k=args.top)
+
+        for word, count in get_top_words(word_dict, args.top):
+            print(f'{count:>10,}  {word}')
+        return 0
+
+    import corpus_analytics
+    from top_k import get_top_words
+
+    filenames = corpus_analytics.find_transcript_files(args.path)
+    if not filenames:
+        print(f"I couldn't find any txt files in {args.path}...", file=sys.stderr)
+        return 1
+
+    report = corpus_analytics.analyze_corpus(filenames, output_dir=args.output_dir, workers=args.workers,
+                                             real_words_only=args.real_words_only)
+    print(f'Analyzed {report["files"]} files ({report["bytes"] / 1_000_000:.1f} MB) '
+          f'in {report["seconds"]:.2f}s: {report["files_per_second"]:.1f} files/s, '
+          f'{report["megabytes_per_second"]:.1f} MB/s')
+
+    for word, count in get_top_words(report["word_counts"], args.top):
+        print(f'{count:>10,}  {word}')
+    return 0
+
+
+def run_ingest(args: argparse.Namespace) -> int:
+    import json
+
+    import db_dictionaries
+    from db_writer import connect_to_database
+    from text_normalization import clean_text_for_storage
+    from youtube_urls import extract_video_id
+
+    db_instance = connect_to_database(args.sqlite_db)
+
+    dedup_index = None
+    if args.dedup_db:
+        from near_duplicates import NearDuplicateIndex
+        dedup_index = NearDuplicateIndex(args.dedup_db)
+
+    table_name = db_dictionaries.video_transcription_data["table_name"]
+    if args.create_tables:
+        db_instance.build_database_table(table_name=table_name,
+                                         column_dict=db_dictionaries.video_transcription_data)
+
+    rows_logged = 0
+    batch = []
+    # signatures added for the batch that isn't committed yet, taken back out if it never makes it
+    new_signature_ids = []
+
+    try:
+        for json_filename in args.json_files:
+            video_id = extract_video_id(os.path.splitext(os.path.basename(json_filename))[0])
+            with open(json_filename, 'r', encoding='utf-8') as json_file:
+                segments = json.load(json_file)
+
+            for segment in segments:
+                segment["text"] = clean_text_for_storage(segment["text"])
+
+            if dedup_index is not None:
+                already_indexed = video_id in dedup_index
+                duplicates = dedup_index.check_and_add(video_id, ' '.join(segment["text"] for segment in segments))
+                if duplicates:
+                    print(f"Skipping {json_filename}, it's a near duplicate of {duplicates[0][0]}")
+                    continue
+                if not already_indexed:
+                    new_signature_ids.append(video_id)
+
+            batch.append((video_id, 1, json.dumps(segments)))
+            if len(batch) >= args.batch_size:
+                rows_logged += db_instance.log_batch_to_DB(batch, table_name)
+                batch, new_signature_ids = [], []
+
+        if batch:
+            rows_logged += db_instance.log_batch_to_DB(batch, table_name)
+            new_signature_ids = []
+    except Exception:
+        for video_id in new_signature_ids:
+            dedup_index.remove(video_id)
+        raise
+    finally:
+        db_instance.close()
+        if dedup_index is not None:
+            dedup_index.close()
+
+    print(f"Logged {rows_logged} transcripts to {table_name}")
+    return 0
+
+
+def run_similar(args: argparse.Namespace) -> int:
+    import vector_analytics
+
+    if args.load:
+        counts, vocabulary, filenames = vector_analytics.load_term_matrix(args.load)
+    elif not args.path:
+        print("Give a folder of transcripts or --load a saved term matrix", file=sys.stderr)
+        return 1
+    else:
+        filenames = vector_analytics.find_transcript_files(args.path)
+        if not filenames:
+            print(f"I couldn't find any txt files in {args.path}...", file=sys.stderr)
+            return 1
+        counts, vocabulary = vector_analytics.build_term_matrix_from_files(filenames, workers=args.workers)
+
+    if args.save:
+        vector_analytics.save_term_matrix(args.save, counts, vocabulary, filenames)
+
+    query_rows = list(range(len(filenames)))
+    if args.video:
+        query_rows = [vector_analytics.get_row_for_video(filenames, args.video)]
+        if query_rows[0] < 0:
+            print(f"{args.video} isn't one of the transcripts", file=sys.stderr)
+            return 1
+
+    vector_analytics.print_similar_videos(counts, vocabulary, filenames, query_rows, top=args.top, terms=args.terms)
+    return 0
+
+
+def run_timeline(args: argparse.Namespace) -> int:
+    import timeline_analytics
+
+    report = timeline_analytics.analyze_timeline_file(args.transcript, bin_seconds=args.bin_seconds, top_k=args.top,
+                                                      terms=args.terms, min_silence_seconds=args.min_silence)
+    timeline_analytics.print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json_file.write(timeline_analytics.report_to_json(report))
+
+    if args.chart:
+        from chart_rendering import render_timeline_chart
+        render_timeline_chart(report, args.transcript, [args.chart])
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Download, transcribe and analyze YT videos.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    download_parser = subparsers.add_parser("download", help="download videos, picking streams by policy")
+    download_parser.add_argument("sources", nargs="+", help="video urls, or txt files of urls")
+    download_parser.add_argument("--filename", help="where to save the video, for a single video")
+    download_parser.add_argument("--output-dir", default=".", help="where to save the videos")
+    download_parser.add_argument("--policy", default="highest_resolution",
+                                 choices=["highest_resolution", "audio_only", "smallest_above_resolution", "max_bytes"],
+                                 help="which stream to download for each video")
+    download_parser.add_argument("--min-resolution", type=int, default=360,
+                                 help="lowest resolution for smallest_above_resolution, like 360")
+    download_parser.add_argument("--max-bytes", type=int, help="biggest stream allowed for the max_bytes policy")
+    download_parser.add_argument("--budget", type=int, help="most bytes to download for the whole batch")
+    download_parser.add_argument("--plan-only", action="store_true", help="just print the plan and estimated sizes")
+    download_parser.add_argument("--workers", type=int, default=4, help="how many chunks to download at once")
+    download_parser.set_defaults(run=run_download)
+
+    transcribe_parser = subparsers.add_parser("transcribe", help="transcribe videos, lists of urls or playlists")
+    transcribe_parser.add_argument("sources", nargs="+", help="video urls, playlist urls, or txt files of urls")
+    transcribe_parser.add_argument("--output-dir", default=".", help="where to save the transcripts")
+    transcribe_parser.add_argument("--format", choices=["text", "json", "srt", "vtt"], default="text")
+    transcribe_parser.add_argument("--workers", type=int, default=8, help="how many videos to work on at once")
+    transcribe_parser.add_argument("--language", default="en", help="language code of the transcripts to get")
+    # same default as batch_transcription.py, so a batch acts the same from either entry point
+    transcribe_parser.add_argument("--existing", choices=["refuse", "replace", "skip"], default="replace",
+                                   help="what to do when a transcript file already exists (default: replace)")
+    transcribe_parser.add_argument("--cache-dir", help="optional folder to cache transcripts and video info in")
+    transcribe_parser.add_argument("--metrics", help="save per-stage timings to this file (.prom or json lines)")
+    transcribe_parser.add_argument("--dedup-db", help="skip near duplicate transcripts (signature file)")
+    transcribe_parser.add_argument("--log-to-db", action="store_true",
+                                   help="log transcripts to the db in config.py from a background thread")
+    transcribe_parser.add_argument("--sqlite-db", help="log transcripts to this SQLite file instead")
+    transcribe_parser.add_argument("--create-tables", action="store_true", help="create the db table first if needed")
+    transcribe_parser.add_argument("--fake-latency", type=float, default=None, help=argparse.SUPPRESS)
+    transcribe_parser.set_defaults(run=run_transcribe)
+
+    analyze_parser = subparsers.add_parser("analyze", help="count the most spoken words in a transcript or folder")
+    analyze_parser.add_argument("path", help="transcript txt file, folder of them, or a glob pattern")
+    analyze_parser.add_argument("--top", type=int, default=50, help="how many words to show")
+    analyze_parser.add_argument("--real-words-only", action="store_true", help="only count words in words_alpha.txt")
+    analyze_parser.add_argument("--chart", help="save a chart of the top words to this png/svg file (single file only)")
+    analyze_parser.add_argument("--output-dir", default=None, help="save csv word tables here (folders only)")
+    analyze_parser.add_argument("--workers", type=int, default=None, help="worker processes for folders")
+    analyze_parser.set_defaults(run=run_analyze)
+
+    ingest_parser = subparsers.add_parser("ingest", help="log json transcripts to the database in config.py")
+    ingest_parser.add_argument("json_files", nargs="+", help="<video_id>.json transcript files")
+    ingest_parser.add_argument("--batch-size", type=int, default=1000, help="rows per INSERT and commit")
+    ingest_parser.add_argument("--create-tables", action="store_true", help="create the table first if needed")
+    ingest_parser.add_argument("--dedup-db", help="skip near duplicate transcripts (signature file)")
+    ingest_parser.add_argument("--sqlite-db", help="log to this SQLite file instead of the db in config.py")
+    ingest_parser.set_defaults(run=run_ingest)
+
+    similar_parser = subparsers.add_parser("similar", help="find distinctive words and similar videos in a folder")
+    similar_parser.add_argument("path", nargs="?", help="folder of transcript txt files, or a glob pattern")
+    similar_parser.add_argument("--load", help="load a term matrix saved with --save instead of reading transcripts")
+    similar_parser.add_argument("--save", help="save the term matrix to this .npz file")
+    similar_parser.add_argument("--video", help="only show results for this transcript file")
+    similar_parser.add_argument("--top", type=int, default=5, help="how many similar videos to show")
+    similar_parser.add_argument("--terms", type=int, default=10, help="how many distinctive words to show")
+    similar_parser.add_argument("--workers", type=int, default=None, help="worker processes for reading transcripts")
+    similar_parser.set_defaults(run=run_similar)
+
+    timeline_parser = subparsers.add_parser("timeline", help="words per minute, words over time and silences")
+    timeline_parser.add_argument("transcript", help="json transcript or segment store file")
+    timeline_parser.add_argument("--bin-seconds", type=float, default=60.0, help="seconds in each time bin")
+    timeline_parser.add_argument("--top", type=int, default=10, help="how many of the most said words to track")
+    timeline_parser.add_argument("--terms", nargs="+", help="track these words instead of the most said ones")
+    timeline_parser.add_argument("--min-silence", type=float, default=2.0,
+                                 help="shortest gap in seconds that counts as a silence")
+    timeline_parser.add_argument("--json", help="save the whole report to this json file")
+    timeline_parser.add_argument("--chart", help="save a chart to this png/svg file")
+    timeline_parser.set_defaults(run=run_timeline)
+
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+'''
+This module runs the word counting from txt_file_analytics over a whole folder
+(or glob) of transcription txt files at once. Each file is counted in its own
+worker process, then all the counts get merged together at the end, and the
+word tables for each file and for the whole corpus are saved as csv files.
+
+Usage:
+python corpus_analytics.py path/to/transcripts --output-dir word_tables
+python corpus_analytics.py "transcripts/*.txt" --workers 8 --real-words-only
+python corpus_analytics.py path/to/transcripts --incremental
+python corpus_analytics.py path/to/transcripts --max-counters 100000 --top 50
+'''
+import argparse
+import csv
+import glob
+import hashlib
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+import txt_file_analytics
+from dictionary_index import load_dictionary_index
+from manifest import Manifest
+from text_normalization import TOKENIZER_VERSION
+from top_k import SpaceSaving, get_top_words
+
+
+# words_alpha.txt lives next to this script, wherever it gets run from
+DICTIONARY_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), "words_alpha.txt")
+CORPUS_TABLE_FILENAME = "corpus_word_counts.csv"
+MANIFEST_FILENAME = "manifest.json"
+
+
+def find_transcript_files(path_or_glob: str, extensions: tuple[str, ...] = (".txt",)) -> list[str]:
+    '''
+    This function finds all the transcript files we want to analyze. If you give it
+    a folder it grabs every .txt file in it (and its sub folders), otherwise it
+    treats what you gave it as a glob pattern. The dictionary word list is skipped.
+
+    Parameters:
+    path_or_glob: str of a folder path or a glob pattern like "transcripts/*.txt"
+    extensions: which kinds of files to grab from a folder
+
+    Returns: sorted list of file paths
+    '''
+    if os.path.isdir(path_or_glob):
+        filenames = [filename for extension in extensions
+                     for filename in glob.glob(os.path.join(path_or_glob, '**', '*' + extension), recursive=True)]
+    else:
+        filenames = glob.glob(path_or_glob, recursive=True)
+
+    return sorted(filename for filename in filenames
+                  if os.path.isfile(filename) and os.path.basename(filename) != os.path.basename(DICTIONARY_FILENAME))
+
+
+def count_words_in_file(filename: str, real_words_only: bool = False,
+                        start_offset: int = 0) -> tuple[str, int, Counter]:
+    '''
+    This is the "map" step that runs inside each worker process. It streams the
+    file and counts its words.
+
+    Parameters:
+    filename: str of the transcript file to count
+    real_words_only: if True, only words found in words_alpha.txt are kept
+    start_offset: byte offset to start counting from, for files that were appended to
+
+    Returns: Tuple --> (filename, number of bytes counted, Counter of the words)
+    '''
+    word_counts = txt_file_analytics.count_words(
+        txt_file_analytics.iter_words_from_file(filename, start_offset=start_offset))
+
+    if real_words_only:
+        real_words = load_dictionary_index(DICTIONARY_FILENAME)
+        word_counts = Counter(txt_file_analytics.word_dictionary_real_word_extraction(
+            word_dict=word_counts, valid_words=real_words))
+        real_words.close()
+
+    return filename, os.path.getsize(filename) - start_offset, word_counts
+
+
+def count_words_in_files(jobs: list[tuple[str, int]], real_words_only: bool = False) -> list[tuple[str, int, Counter]]:
+    '''
+    Counts a batch of (filename, start offset) jobs in one go, so each worker gets
+    handed a bunch of small files at a time instead of one at a time.
+    '''
+    return [count_words_in_file(filename, real_words_only, start_offset) for filename, start_offset in jobs]
+
+
+def split_into_batches(jobs: list[tuple[str, int]], batch_count: int) -> list[list[tuple[str, int]]]:
+    '''
+    Splits the (filename, start offset) jobs into about batch_count batches of roughly
+    the same total size, biggest first, so no one worker ends up stuck with all the big ones.
+    '''
+    batches = [[] for _ in range(max(1, min(batch_count, len(jobs))))]
+    batch_sizes = [0] * len(batches)
+    job_sizes = {job: os.path.getsize(job[0]) - job[1] for job in jobs}
+
+    for job in sorted(jobs, key=job_sizes.get, reverse=True):
+        smallest_batch = batch_sizes.index(min(batch_sizes))
+        batches[smallest_batch].append(job)
+        batch_sizes[smallest_batch] += job_sizes[job]
+
+    return [batch for batch in batches if batch]
+
+
+def count_files_in_parallel(jobs: list[tuple[str, int]], workers: int, real_words_only: bool = False):
+    '''
+    Runs the (filename, start offset) jobs across a pool of worker processes.
+
+    Returns: generator of (filename, number of bytes counted, Counter of the words) tuples
+    '''
+    if real_words_only:
+        # build the index once up here so the workers don't all try to build it at the same time
+        load_dictionary_index(DICTIONARY_FILENAME).close()
+
+    # a few batches per worker keeps everyone busy until the very end
+    batches = split_into_batches(jobs, batch_count=workers * 4)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_result in executor.map(count_words_in_files, batches, [real_words_only] * len(batches)):
+            yield from batch_result
+
+
+def read_word_table(csv_filename: str) -> Counter:
+    '''
+    Loads a word table saved by write_word_table.
+
+    Parameters:
+    csv_filename: str of the csv file to read
+
+    Returns: Counter of words and their counts (empty if the file doesn't exist)
+    '''
+    word_counts = Counter()
+    if not os.path.exists(csv_filename):
+        return word_counts
+
+    with open(csv_filename, 'r', newline='', encoding='utf-8') as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader, None)
+        for word, count in reader:
+            word_counts[word] = int(count)
+
+    return word_counts
+
+
+def write_word_table(word_counts: Union[Counter, SpaceSaving], csv_filename: str) -> None:
+    '''
+    Saves a word table as a csv file with the most common words at the top.
+
+    Parameters:
+    word_counts: Counter (or SpaceSaving counter) of words and how many times they appeared
+    csv_filename: str of the csv file to write to (it gets overwritten)
+
+    Returns: None
+    '''
+    with open(csv_filename, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["word", "count"])
+        writer.writerows(get_top_words(word_counts, len(word_counts)))
+
+
+def get_output_name(transcript_filename: str) -> str:
+    '''
+    Returns: str to name a transcript's output files with, like "lecture_1a2b3c4d". The end
+    is a hash of the file's full path, since find_transcript_files looks through sub folders
+    too and two transcripts with the same name in different folders can't share a table.
+    '''
+    transcript_name = os.path.splitext(os.path.basename(transcript_filename))[0]
+    path_hash = hashlib.blake2b(os.path.abspath(transcript_filename).encode(), digest_size=4).hexdigest()
+    return f"{transcript_name}_{path_hash}"
+
+
+def get_word_table_filename(output_dir: str, transcript_filename: str) -> str:
+    '''
+    Returns: str of where the word table for a given transcript should go.
+    '''
+    return os.path.join(output_dir, f"{get_output_name(transcript_filename)}_word_counts.csv")
+
+
+def analyze_corpus(filenames: list[str], output_dir: str = None, workers: int = None,
+                   real_words_only: bool = False, max_counters: int = None) -> dict:
+    '''
+    This function counts the words in every file across a pool of worker processes,
+    merges all the partial counts into one corpus wide count (map-reduce style),
+    and optionally writes the per-file and corpus word tables to a folder.
+
+    Parameters:
+    filenames: list of the transcript files to analyze
+    output_dir: str of the folder to save the word tables in. If None nothing gets saved.
+    workers: how many worker processes to use. Defaults to the number of CPU cores.
+    real_words_only: if True, only words found in words_alpha.txt are counted
+    max_counters: if given, the corpus wide counts are kept in a top_k.SpaceSaving counter
+    that never holds more than this many words, instead of an exact Counter of every word.
+    Each count is then at most total words / max_counters too high.
+
+    Returns: dictionary with the merged "word_counts" Counter (or SpaceSaving), plus "files", "bytes",
+    "seconds", "files_per_second" and "megabytes_per_second" so we can see how fast it went.
+    '''
+    start_time = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if max_counters:
+        corpus_word_counts = SpaceSaving(max_counters)
+    else:
+        corpus_word_counts = Counter()
+    total_bytes = 0
+
+    for filename, file_size, word_counts in count_files_in_parallel(
+            [(filename, 0) for filename in filenames], workers, real_words_only):
+        if max_counters:
+            corpus_word_counts.update_many(word_counts)
+        else:
+            corpus_word_counts.update(word_counts)
+        total_bytes += file_size
+
+        if output_dir:
+            write_word_table(word_counts, get_word_table_filename(output_dir, filename))
+
+    if output_dir:
+        write_word_table(corpus_word_counts, os.path.join(output_dir, CORPUS_TABLE_FILENAME))
+
+    elapsed_seconds = time.perf_counter() - start_time
+
+    return {
+        "word_counts": corpus_word_counts,
+        "files": len(filenames),
+        "bytes": total_bytes,
+        "seconds": elapsed_seconds,
+        "files_per_second": len(filenames) / elapsed_seconds,
+        "megabytes_per_second": total_bytes / 1_000_000 / elapsed_seconds,
+    }
+
+
+def update_corpus(filenames: list[str], output_dir: str, workers: int = None,
+                  real_words_only: bool = False) -> dict:
+    '''
+    This is the incremental version of analyze_corpus. A manifest in output_dir
+    remembers which files were counted last time, so only new or changed files get
+    counted, files that were appended to only get their new part counted, and the
+    counts of deleted or changed files are taken back out of the corpus table
+    (using their saved word tables). Over an unchanged corpus this only has to
+    check file sizes and modified times.
+
+    Parameters:
+    filenames: list of every transcript file in the corpus right now
+    output_dir: str of the folder the word tables and the manifest are saved in
+    workers: how many worker processes to use. Defaults to the number of CPU cores.
+    real_words_only: if True, only words found in words_alpha.txt are counted.
+    Changing this from last time makes everything get recounted.
+
+    Returns: same dictionary as analyze_corpus, plus how many files were "added",
+    "changed", "appended", "deleted" and "unchanged". "bytes" is only what was actually read.
+    '''
+    start_time = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+
+    settings = {"real_words_only": real_words_only, "tokenizer_version": TOKENIZER_VERSION}
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_FILENAME), settings=settings)
+    corpus_table_filename = os.path.join(output_dir, CORPUS_TABLE_FILENAME)
+
+    if manifest.settings_changed or not os.path.exists(corpus_table_filename):
+        manifest.entries = {}
+        corpus_word_counts = Counter()
+    else:
+        corpus_word_counts = read_word_table(corpus_table_filename)
+
+    changes = manifest.scan(filenames)
+
+    # take the old counts of changed and deleted files back out of the corpus
+    for path in changes["changed"] + changes["deleted"]:
+        old_word_table = manifest.get(path)["word_table"]
+        corpus_word_counts.subtract(read_word_table(old_word_table))
+
+        if path in changes["deleted"]:
+            manifest.remove(path)
+            if os.path.exists(old_word_table):
+                os.remove(old_word_table)
+
+    appended_paths = set(changes["appended"])
+    jobs = [(path, 0) for path in changes["added"] + changes["changed"]]
+    jobs += [(path, manifest.get(path)["size"]) for path in changes["appended"]]
+    total_bytes = 0
+
+    for filename, bytes_counted, word_counts in count_files_in_parallel(jobs, workers, real_words_only):
+        corpus_word_counts.update(word_counts)
+        total_bytes += bytes_counted
+
+        word_table_filename = get_word_table_filename(output_dir, filename)
+        old_word_table = (manifest.get(filename) or {}).get("word_table")
+        if filename in appended_paths:
+            word_counts = read_word_table(old_word_table) + word_counts
+
+        write_word_table(word_counts, word_table_filename)
+        manifest.update(filename, word_table=word_table_filename)
+
+        # tables saved under an older naming scheme would otherwise be left behind
+        if old_word_table and old_word_table != word_table_filename and os.path.exists(old_word_table):
+            os.remove(old_word_table)
+
+    # unary + drops any words whose count went down to zero
+    corpus_word_counts = +corpus_word_counts
+    write_word_table(corpus_word_counts, corpus_table_filename)
+    manifest.save()
+
+    elapsed_seconds = time.perf_counter() - start_time
+    report = {
+        "word_counts": corpus_word_counts,
+        "files": len(jobs),
+        "bytes": total_bytes,
+        "seconds": elapsed_seconds,
+        "files_per_second": len(jobs) / elapsed_seconds,
+        "megabytes_per_second": total_bytes / 1_000_000 / elapsed_seconds,
+    }
+    report.update({change_type: len(paths) for change_type, paths in changes.items()})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count words across a whole folder of transcripts.")
+    parser.add_argument("path", help="folder of transcript txt files, or a glob pattern")
+    parser.add_argument("--output-dir", default="word_tables", help="where to save the csv word tables")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--real-words-only", action="store_true", help="only count words found in words_alpha.txt")
+    parser.add_argument("--top", type=int, default=0, help="print this many of the most common words at the end")
+    # incremental runs take changed files' old counts back out of the corpus table, which
+    # needs exact counts, so the two can't be used together
+    counting_mode = parser.add_mutually_exclusive_group()
+    counting_mode.add_argument("--max-counters", type=int, default=None,
+                               help="cap the corpus table at this many words using approximate (Space-Saving) counting")
+    counting_mode.add_argument("--incremental", action="store_true",
+                               help="only count files that are new or changed since the last --incremental run")
+    args = parser.parse_args()
+
+    filenames = find_transcript_files(args.path)
+    if not filenames:
+        print(f"I couldn't find any txt files in {args.path}...")
+        return
+
+    if args.incremental:
+        report = update_corpus(filenames, output_dir=args.output_dir, workers=args.workers,
+                               real_words_only=args.real_words_only)
+        print(f'{report["added"]} added, {report["changed"]} changed, {report["appended"]} appended, '
+              f'{report["deleted"]} deleted, {report["unchanged"]} unchanged')
+    else:
+        report = analyze_corpus(filenames, output_dir=args.output_dir, workers=args.workers,
+                                real_words_only=args.real_words_only, max_counters=args.max_counters)
+
+    print(f'Analyzed {report["files"]} files ({report["bytes"] / 1_000_000:.1f} MB) '
+          f'in {report["seconds"]:.2f}s: {report["files_per_second"]:.1f} files/s, '
+          f'{report["megabytes_per_second"]:.1f} MB/s')
+    print(f'Word tables saved to {args.output_dir}')
+
+    if args.top:
+        for word, count in get_top_words(report["word_counts"], args.top):
+            print(f'{count:>10,}  {word}')
+
+
+if __name__ == "__main__":
+    main()
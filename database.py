@@ -6,9 +6,10 @@ This module is designed with the intent of storing our database class object.
 This script uses a PostgreSQL db schema.
 '''
 import psycopg2
-import config
+import psycopg2.extras
 import utils
 import db_dictionaries
+from instrumentation import metrics
 
 
 class Database:
@@ -55,11 +56,103 @@ class Database:
         # The if is to make sure there is anything in the tuple at all, otherwise don't log anything to the database.
         if formatted_tuple:
             formatted_string = utils.format_tuple_into_string(formatted_tuple)
-            self.cursor.execute(f'INSERT INTO {table_to_add_values_to} VALUES {formatted_string}', formatted_tuple)
-            self.conn.commit()
+            with metrics.stage("db_insert"):
+                self.cursor.execute(f'INSERT INTO {table_to_add_values_to} VALUES {formatted_string}', formatted_tuple)
+                self.conn.commit()
+            metrics.increment("db_rows")
+
+    def log_many_to_DB(self, rows, table_to_add_values_to: str, batch_size: int = 1000) -> int:
+        """
+        This function logs a whole bunch of rows to a table at once. Instead of one INSERT
+        and one commit per row, the rows are sent over in batches with one multi-row INSERT
+        (psycopg2's execute_values) and one commit per batch, which is way faster when
+        ingesting lots of videos or transcription parts.
+
+        Parameters:
+        rows: any iterable of tuples (a generator is fine), where each tuple is one row in
+        the same column order as the table, like the tuples you'd pass to log_to_DB.
+        table_to_add_values_to: The name of the table in the database, like "video_info" or "transcription_data".
+        batch_size: how many rows to send and commit at a time.
+
+        Returns: int of how many rows were logged.
+        """
+        rows_logged = 0
+        batch = []
+
+        for row in rows:
+            if not row:
+                continue
+
+            batch.append(row)
+            if len(batch) >= batch_size:
+                rows_logged += self.log_batch_to_DB(batch, table_to_add_values_to)
+                batch = []
+
+        if batch:
+            rows_logged += self.log_batch_to_DB(batch, table_to_add_values_to)
+
+        return rows_logged
+
+    def log_batch_to_DB(self, batch: list[tuple], table_to_add_values_to: str) -> int:
+        """
+        Sends one batch of rows in a single INSERT and commits it. If anything goes wrong
+        the batch is rolled back so the connection can still be used.
+
+        Returns: int of how many rows were logged.
+        """
+        try:
+            with metrics.stage("db_insert"):
+                psycopg2.extras.execute_values(self.cursor, f'INSERT INTO {table_to_add_values_to} VALUES %s',
+                                               batch, page_size=len(batch))
+                self.conn.commit()
+        except psycopg2.Error:
+            self.conn.rollback()
+            raise
+
+        metrics.increment("db_rows", len(batch))
+        return len(batch)
+
+    def log_batches_to_DB(self, batches: dict[str, list[tuple]]) -> int:
+        """
+        Logs rows to more than one table in a single transaction, so either all of them
+        are saved or none of them are (like a video's video_info row and its transcription_data row).
+
+        Parameters:
+        batches: dictionary of table name -> list of row tuples for that table
+
+        Returns: int of how many rows were logged.
+        """
+        try:
+            with metrics.stage("db_insert"):
+                for table_name, batch in batches.items():
+                    if batch:
+                        psycopg2.extras.execute_values(self.cursor, f'INSERT INTO {table_name} VALUES %s',
+                                                       batch, page_size=len(batch))
+                self.conn.commit()
+        except psycopg2.Error:
+            self.conn.rollback()
+            raise
+
+        row_count = sum(len(batch) for batch in batches.values())
+        metrics.increment("db_rows", row_count)
+        return row_count
+
+    def get_existing_ids(self, table_name: str, id_column: str = "id") -> set[str]:
+        """
+        Returns: set of every id already in a table, so videos that are already stored can be skipped.
+        """
+        self.cursor.execute(f'SELECT DISTINCT {id_column} FROM {table_name}')
+        return {row[0] for row in self.cursor.fetchall()}
+
+    def close(self) -> None:
+        self.cursor.close()
+        self.conn.close()
 
 
 def main():
+    # config.py has the db login info, it's only needed when running this script directly
+    import config
+
     # db variables
     dbname = config.database_info["database_name"]
     user = config.database_info["user"]
@@ -0,0 +1,321 @@
+'''
+This module logs rows to the database from a background thread, so the threads that
+fetch transcripts never sit waiting on a network round trip and a commit.
+
+A DatabaseWriter owns the database connection. Rows go into a bounded queue, and the
+writer thread takes them out and sends them in batches, one transaction each. A batch
+is sent when it has batch_size rows or when its oldest row has waited
+flush_interval_seconds, whichever comes first. If the queue fills up (the database
+can't keep up), write() blocks until there's room, so memory doesn't grow forever and
+the producers slow down to the speed the database can handle.
+
+If a batch fails, its rows are tried again one at a time, so one bad row doesn't take
+the rest of the batch down with it. A row can come with an on_done function, which the
+writer thread calls with True once the row is committed or False if it failed, for
+callers that need to undo something when a row never makes it in. close() writes
+everything that's left and returns a report of how many rows were written and how
+many failed.
+
+It works with the PostgreSQL Database from database.py or the SQLite stand-in from
+sqlite_database.py, since they have the same methods.
+
+Usage:
+python db_writer.py --sqlite-db test.sqlite3 --rows 100000 --batch-size 500
+python db_writer.py --rows 10000   (PostgreSQL, using the login info in config.py)
+'''
+import argparse
+import json
+import queue
+import threading
+import time
+
+import db_dictionaries
+from instrumentation import metrics
+
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1.0
+DEFAULT_MAX_QUEUE_SIZE = 10_000
+
+# only this many error messages are kept for the report, the counts are always exact
+MAX_REPORTED_ERRORS = 20
+
+# special queue items that tell the writer thread to flush now or to stop
+FLUSH = object()
+STOP = object()
+
+
+def connect_to_database(sqlite_filename: str = None):
+    '''
+    Returns: a SQLiteDatabase for sqlite_filename if it's given, otherwise the PostgreSQL
+    Database with the login info in config.py. Each one is only imported when it's used,
+    so the SQLite stand-in doesn't need psycopg2.
+    '''
+    if sqlite_filename:
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(sqlite_filename)
+
+    import config
+    from database import Database
+
+    return Database(dbname=config.database_info["database_name"], user=config.database_info["user"],
+                    password=config.database_info["password"], host=config.database_info["host"],
+                    port=config.database_info["port"])
+
+
+class DatabaseWriter:
+    '''
+    Parameters:
+    database: the Database (or SQLiteDatabase) to log rows to. The writer owns it from
+    here on and closes it in close(), unless close_database is False.
+    table_name: the table rows go into when write() isn't given one
+    batch_size: most rows to send in one transaction
+    flush_interval_seconds: longest a row waits before its batch is sent, even if the
+    batch isn't full
+    max_queue_size: most rows waiting to be written before write() blocks
+    close_database: whether close() should close the database too
+    '''
+
+    def __init__(self, database, table_name: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE, close_database: bool = True) -> None:
+        self.database = database
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.close_database = close_database
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.start_time = time.perf_counter()
+
+        self.rows_queued = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.transactions = 0
+        self.blocked_writes = 0
+        self.blocked_seconds = 0.0
+        self.errors = []
+
+        self.thread = threading.Thread(target=self.run, name="DatabaseWriter", daemon=True)
+        self.thread.start()
+
+    def write(self, row: tuple, table_name: str = None, timeout: float = None, on_done=None) -> None:
+        '''
+        This function queues one row to be logged and returns right away, unless the queue
+        is full, in which case it waits for room (that's the backpressure).
+
+        Parameters:
+        row: tuple of the row's values, in the same column order as the table
+        table_name: optional table for this row, instead of the writer's table_name
+        timeout: most seconds to wait for room in the queue. None waits as long as it
+        takes, and if the time runs out queue.Full is raised and the row isn't queued.
+        on_done: optional function the writer thread calls with True once the row is
+        committed, or False if it failed. Keep it quick, the writer thread waits on it.
+        '''
+        if self.closed:
+            raise RuntimeError("this DatabaseWriter has already been closed")
+
+        # counted before it's queued, so the writer thread can never finish a row that isn't counted yet
+        with self.lock:
+            self.rows_queued += 1
+
+        item = (table_name or self.table_name, row, on_done)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            wait_start = time.perf_counter()
+            try:
+                self.queue.put(item, timeout=timeout)
+            except queue.Full:
+                with self.lock:
+                    self.rows_queued -= 1
+                raise
+            finally:
+                waited_seconds = time.perf_counter() - wait_start
+                with self.lock:
+                    self.blocked_writes += 1
+                    self.blocked_seconds += waited_seconds
+                metrics.observe("db_queue_wait", waited_seconds)
+
+    def write_many(self, rows, table_name: str = None) -> None:
+        for row in rows:
+            self.write(row, table_name)
+
+    def flush(self) -> None:
+        '''
+        Waits until every row written so far has been sent to the database.
+        '''
+        if self.closed:
+            return
+        flushed = threading.Event()
+        self.queue.put((FLUSH, flushed, None))
+        flushed.wait()
+
+    def run(self) -> None:
+        '''
+        The writer thread: collects rows into batches and sends each one once it's full
+        or has waited flush_interval_seconds.
+        '''
+        batch = []
+        batch_deadline = None
+
+        while True:
+            timeout = None if batch_deadline is None else max(0.0, batch_deadline - time.monotonic())
+            try:
+                table_name, row, on_done = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                self.write_batch(batch)
+                batch, batch_deadline = [], None
+                continue
+
+            if table_name is FLUSH or table_name is STOP:
+                self.write_batch(batch)
+                batch, batch_deadline = [], None
+                if table_name is STOP:
+                    return
+                row.set()
+                continue
+
+            if not batch:
+                batch_deadline = time.monotonic() + self.flush_interval_seconds
+            batch.append((table_name, row, on_done))
+
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch, batch_deadline = [], None
+
+    def write_batch(self, batch: list[tuple]) -> None:
+        '''
+        Sends a batch in one transaction per table. If a transaction fails, its rows are
+        tried one at a time so only the bad ones end up counted as failed.
+        '''
+        items_by_table = {}
+        for table_name, row, on_done in batch:
+            items_by_table.setdefault(table_name, []).append((row, on_done))
+
+        for table_name, items in items_by_table.items():
+            try:
+                self.record_written(self.database.log_batch_to_DB([row for row, _ in items], table_name))
+            except Exception:
+                for row, on_done in items:
+                    try:
+                        self.record_written(self.database.log_batch_to_DB([row], table_name))
+                    except Exception as error:
+                        self.record_failed(table_name, error)
+                        self.report_done(on_done, False)
+                    else:
+                        self.report_done(on_done, True)
+            else:
+                for _, on_done in items:
+                    self.report_done(on_done, True)
+
+    def report_done(self, on_done, committed: bool) -> None:
+        '''
+        Calls a row's on_done function, if it has one. An error in it is only counted in
+        the report, so it can't stop the writer thread.
+        '''
+        if on_done is None:
+            return
+        try:
+            on_done(committed)
+        except Exception as error:
+            with self.lock:
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append(f"on_done: {type(error).__name__}: {error}")
+
+    def record_written(self, row_count: int) -> None:
+        with self.lock:
+            self.rows_written += row_count
+            self.transactions += 1
+
+    def record_failed(self, table_name: str, error: Exception) -> None:
+        metrics.increment("db_rows_failed")
+        with self.lock:
+            self.rows_failed += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append(f"{table_name}: {type(error).__name__}: {error}")
+
+    def report(self) -> dict:
+        '''
+        Returns: dictionary with "rows_queued", "rows_written", "rows_failed", "rows_pending"
+        (queued but not written or failed yet), "transactions", "blocked_writes" and
+        "blocked_seconds" (how often and how long write() had to wait for room), "errors"
+        (the first few error messages) and "seconds" since the writer started
+        '''
+        with self.lock:
+            return {
+                "rows_queued": self.rows_queued,
+                "rows_written": self.rows_written,
+                "rows_failed": self.rows_failed,
+                "rows_pending": self.rows_queued - self.rows_written - self.rows_failed,
+                "transactions": self.transactions,
+                "blocked_writes": self.blocked_writes,
+                "blocked_seconds": self.blocked_seconds,
+                "errors": list(self.errors),
+                "seconds": time.perf_counter() - self.start_time,
+            }
+
+    def close(self) -> dict:
+        '''
+        This function writes every row that's still queued, stops the writer thread, and
+        closes the database (if close_database is True). It's safe to call more than once.
+
+        Returns: the final report (see report)
+        '''
+        if not self.closed:
+            self.closed = True
+            self.queue.put((STOP, None, None))
+            self.thread.join()
+            if self.close_database:
+                self.database.close()
+        return self.report()
+
+    def __enter__(self) -> 'DatabaseWriter':
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+
+def print_report(report: dict) -> None:
+    print(f'{report["rows_written"]:,} rows written, {report["rows_failed"]:,} failed '
+          f'in {report["transactions"]:,} transactions ({report["seconds"]:.2f}s)')
+    if report["blocked_writes"]:
+        print(f'write() waited for room {report["blocked_writes"]:,} times, '
+              f'{report["blocked_seconds"]:.2f}s total')
+    for error in report["errors"]:
+        print(f'  {error}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log made up transcription rows through the background writer.")
+    parser.add_argument("--sqlite-db", help="use this SQLite file instead of the PostgreSQL db in config.py")
+    parser.add_argument("--rows", type=int, default=10_000, help="how many rows to log")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="most rows per transaction")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL_SECONDS,
+                        help="longest a row waits before it's sent")
+    parser.add_argument("--max-queue-size", type=int, default=DEFAULT_MAX_QUEUE_SIZE,
+                        help="most rows waiting before write() blocks")
+    args = parser.parse_args()
+
+    database = connect_to_database(args.sqlite_db)
+    table_name = db_dictionaries.video_transcription_data["table_name"]
+    database.build_database_table(table_name=table_name, column_dict=db_dictionaries.video_transcription_data)
+
+    segments = json.dumps([{"text": "this is a made up segment", "start": 0.0, "duration": 2.5}] * 20)
+    start_time = time.perf_counter()
+
+    with DatabaseWriter(database, table_name, batch_size=args.batch_size,
+                        flush_interval_seconds=args.flush_interval, max_queue_size=args.max_queue_size) as writer:
+        for row_number in range(args.rows):
+            writer.write((f"video{row_number:07d}", 1, segments))
+        queued_seconds = time.perf_counter() - start_time
+
+    print(f'Queued {args.rows:,} rows in {queued_seconds:.2f}s')
+    print_report(writer.report())
+
+
+if __name__ == "__main__":
+    main()
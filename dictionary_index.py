@@ -0,0 +1,166 @@
+'''
+This module compiles a word list (like words_alpha.txt) into a sorted index file
+that sits next to it on disk. After the first run the index is just memory mapped,
+so loading it is basically instant, and checking if a word is real is a binary
+search instead of looking through a 370k item list one word at a time.
+
+Index file layout (native byte order):
+header  -> magic, source file size, source file mtime (ns), word count
+offsets -> word count + 1 unsigned 32 bit ints, where word i is data[offsets[i]:offsets[i+1]]
+data    -> every word encoded as UTF-8, sorted, with nothing in between them
+'''
+import mmap
+import os
+import struct
+from array import array
+
+
+INDEX_MAGIC = b'WORDIDX1'
+INDEX_HEADER = struct.Struct('=8sQqQ')
+INDEX_EXTENSION = '.idx'
+
+
+class DictionaryIndex:
+
+    def __init__(self, index_filename: str) -> None:
+        self.index_filename = index_filename
+
+        with open(index_filename, 'rb') as index_file:
+            self.mapped_file = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, self.source_size, self.source_mtime_ns, self.word_count = \
+                INDEX_HEADER.unpack_from(self.mapped_file, 0)
+        except struct.error:
+            magic = None
+        if magic != INDEX_MAGIC:
+            self.mapped_file.close()
+            raise ValueError(f"{index_filename} is not a dictionary index file")
+
+        offsets_start = INDEX_HEADER.size
+        offsets_end = offsets_start + (self.word_count + 1) * 4
+        if len(self.mapped_file) < offsets_end:
+            self.mapped_file.close()
+            raise ValueError(f"{index_filename} is cut short, build it again")
+
+        self.offsets = memoryview(self.mapped_file)[offsets_start:offsets_end].cast('I')
+        self.data_start = offsets_end
+
+        if len(self.mapped_file) < self.data_start + self.offsets[self.word_count]:
+            self.close()
+            raise ValueError(f"{index_filename} is cut short, build it again")
+
+    def __len__(self) -> int:
+        return self.word_count
+
+    def __contains__(self, word: object) -> bool:
+        if not isinstance(word, str):
+            return False
+
+        encoded_word = word.encode()
+        low, high = 0, self.word_count
+
+        while low < high:
+            middle = (low + high) // 2
+            middle_word = self.get_encoded_word(middle)
+
+            if middle_word < encoded_word:
+                low = middle + 1
+            elif middle_word > encoded_word:
+                high = middle
+            else:
+                return True
+
+        return False
+
+    def get_encoded_word(self, position: int) -> bytes:
+        start = self.data_start + self.offsets[position]
+        end = self.data_start + self.offsets[position + 1]
+        return self.mapped_file[start:end]
+
+    def matches_source(self, source_filename: str) -> bool:
+        '''
+        Checks if the index was built from the current version of the source file.
+
+        Parameters:
+        source_filename: str of the word list file the index was built from
+
+        Returns: True if the source file hasn't changed since the index was built.
+        '''
+        source_stat = os.stat(source_filename)
+        return (source_stat.st_size == self.source_size
+                and source_stat.st_mtime_ns == self.source_mtime_ns)
+
+    def close(self) -> None:
+        self.offsets.release()
+        self.mapped_file.close()
+
+
+def get_index_filename(source_filename: str) -> str:
+    '''
+    Returns: str of where the index for a given word list lives, like words_alpha.txt.idx
+    '''
+    return source_filename + INDEX_EXTENSION
+
+
+def build_dictionary_index(source_filename: str, index_filename: str = None) -> str:
+    '''
+    This function reads a word list with one word per line (or any whitespace really),
+    sorts the unique words, and writes them out to an index file. The file is written
+    to a temp file first and then renamed, so a half written index is never left behind.
+
+    Parameters:
+    source_filename: str of the word list file, like "words_alpha.txt"
+    index_filename: str of where to save the index. Defaults to the source filename + ".idx"
+
+    Returns: str of the index filename
+    '''
+    index_filename = index_filename or get_index_filename(source_filename)
+    source_stat = os.stat(source_filename)
+
+    with open(source_filename, 'r', encoding='utf-8') as source_file:
+        encoded_words = sorted({word.encode() for word in source_file.read().split()})
+
+    offsets = array('I', [0])
+    for encoded_word in encoded_words:
+        offsets.append(offsets[-1] + len(encoded_word))
+
+    header = INDEX_HEADER.pack(INDEX_MAGIC, source_stat.st_size,
+                               source_stat.st_mtime_ns, len(encoded_words))
+
+    temp_filename = f'{index_filename}.{os.getpid()}.tmp'
+    with open(temp_filename, 'wb') as index_file:
+        index_file.write(header)
+        offsets.tofile(index_file)
+        index_file.write(b''.join(encoded_words))
+
+    os.replace(temp_filename, index_filename)
+    return index_filename
+
+
+def load_dictionary_index(source_filename: str, index_filename: str = None) -> DictionaryIndex:
+    '''
+    This function loads the index for a word list, and (re)builds it first if it
+    doesn't exist yet or if the word list has changed since it was built.
+
+    Parameters:
+    source_filename: str of the word list file, like "words_alpha.txt"
+    index_filename: str of where the index is saved. Defaults to the source filename + ".idx"
+
+    Returns: DictionaryIndex object you can use with the "in" keyword.
+    '''
+    index_filename = index_filename or get_index_filename(source_filename)
+
+    if os.path.exists(index_filename):
+        try:
+            index = DictionaryIndex(index_filename)
+        except ValueError:
+            index = None
+
+        if index is not None:
+            if index.matches_source(source_filename):
+                return index
+            index.close()
+
+    build_dictionary_index(source_filename, index_filename)
+    return DictionaryIndex(index_filename)
@@ -7,23 +7,9 @@ download a YT video for you.
 '''
 from pytube import YouTube
 import os
-
-
-def remove_special_characters_from_string(input_string: str) -> str:
-    '''
-    This function takes a given input string and removes all characters that aren't
-    alpha-numeric or spaces. 
-
-    Parameters:
-    input_string: str you wish to format
-
-    Returns: str - copy of input string with only its letters, numbers, and spaces.
-    '''
-    new_string = ""
-    for character in input_string:
-        if character.isalnum() or character.isspace():
-            new_string += character
-    return new_string
+from parallel_download import DEFAULT_WORKERS, download_file
+from stream_selection import DEFAULT_MIN_RESOLUTION, get_file_extension, select_stream
+from text_normalization import format_filename
 
 
 def get_video_url_from_user_input() -> str:
@@ -43,30 +29,44 @@ def get_video_url_from_user_input() -> str:
             print("I don't understand that link. Please enter only the link of the video with a youtube.com or youtu.be url...")
 
 
-def download_video(url: str, filename: str = None) -> bool:
+def download_video(url: str, filename: str = None, workers: int = DEFAULT_WORKERS,
+                   policy: str = "highest_resolution", min_resolution: int = DEFAULT_MIN_RESOLUTION,
+                   max_bytes: int = None) -> bool:
     '''
     Saves a video to its highest resolution. Optional argument to pass in
     a custom filename. If none is passed, it will save with the video title
     as the filename, with only alphanumeric & space characters in the filename.
+    You can also pick a different stream policy, like "audio_only" when the video
+    only needs to be transcribed (see stream_selection.py).
+
+    The video is downloaded in parallel chunks (see parallel_download.py), so if the
+    download gets interrupted, calling this again picks up where it left off.
     
     Parameters: 
     url: the string of the URL of the YT vid you want to download. 
     This can be a normal url like youtube.com, or shortened like youtu.be, and
     this also works for shorts and past livestreams. 
     filename: str of the filename you wish to use. Can be relative or absolute.
+    workers: how many chunks of the video to download at the same time
+    policy: which stream to download, one of stream_selection.STREAM_POLICIES
+    min_resolution: lowest resolution (like 360) for the smallest_above_resolution policy
+    max_bytes: biggest stream allowed for the max_bytes policy
 
     Returns: True if the file was successfully saved, False otherwise.
     '''
     video: YouTube = YouTube(url=url)
-    video_filename = remove_special_characters_from_string(video.title) + ".mp4"
-    
-    if filename:
-        video.streams.get_highest_resolution().download(filename=filename)
-        return os.path.exists(filename)
+    stream = select_stream(video.streams, policy, min_resolution=min_resolution, max_bytes=max_bytes)
+    if stream is None:
+        print(f"There's no stream of this video that fits the {policy} policy")
+        return False
 
-    else:
-        video.streams.get_highest_resolution().download(filename=video_filename)
-        return os.path.exists(video_filename)
+    video_filename = filename or format_filename(video.title, extension=get_file_extension(stream))
+
+    report = download_file(stream.url, video_filename, workers=workers, expected_size=stream.filesize)
+    print(f'Downloaded {report["bytes"] / 1_000_000:.1f} MB in {report["seconds"]:.1f}s '
+          f'({report["megabytes_per_second"]:.1f} MB/s)')
+
+    return os.path.exists(video_filename)
     
 
 def main():
@@ -0,0 +1,567 @@
+'''
+This module is a job queue for ingesting lots of videos (like a 5,000 video playlist)
+into the video_info and transcription_data tables, that picks up right where it left
+off if the ingest dies halfway through.
+
+Every video is one job, saved in a local SQLite file, and each job goes through these states:
+
+pending -> metadata-fetched -> transcribed -> stored
+                                           \\-> failed (after max_attempts tries)
+
+The video info and the transcript are saved in the job as soon as they're fetched, so
+after a crash nothing that was already fetched is fetched again, and nothing that was
+already stored is stored again:
+- a job that fails is tried again later, waiting twice as long after every failure
+  (exponential backoff), and after max_attempts failures it's marked failed
+- a video whose id is already in transcription_data is skipped (marked stored) before
+  anything is fetched for it, so re-running the same playlist is cheap
+- a video's video_info row and transcription_data row are logged in one transaction,
+  so a video is either all the way in the db or not in it at all
+
+Usage:
+python ingest_queue.py add jobs.sqlite3 urls.txt
+python ingest_queue.py add jobs.sqlite3 "https://www.youtube.com/playlist?list=..."
+python ingest_queue.py run jobs.sqlite3 --create-tables
+python ingest_queue.py run jobs.sqlite3 --sqlite-db test.sqlite3 --fake-latency 0.05
+python ingest_queue.py status jobs.sqlite3 --failed
+python ingest_queue.py retry-failed jobs.sqlite3
+'''
+import argparse
+import json
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import db_dictionaries
+from youtube_urls import extract_video_id
+
+
+PENDING = "pending"
+METADATA_FETCHED = "metadata-fetched"
+TRANSCRIBED = "transcribed"
+STORED = "stored"
+FAILED = "failed"
+
+JOB_STATES = (PENDING, METADATA_FETCHED, TRANSCRIBED, STORED, FAILED)
+
+# states a job can still move on from
+UNFINISHED_STATES = (PENDING, METADATA_FETCHED, TRANSCRIBED)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY_SECONDS = 2.0
+DEFAULT_MAX_DELAY_SECONDS = 300.0
+
+# up to this fraction of extra random wait is added to every backoff, so jobs that failed
+# together (like during a network blip) don't all come back at the exact same moment
+BACKOFF_JITTER = 0.1
+
+DEFAULT_STORE_BATCH_SIZE = 50
+
+# longest the run loop waits for a worker before checking for jobs whose backoff is over
+POLL_SECONDS = 0.5
+
+
+class IngestQueue:
+    '''
+    The ingest jobs, saved in a SQLite file. Safe to use from the worker threads.
+
+    Parameters:
+    db_filename: str of the SQLite file to keep the jobs in (it's created if needed)
+    max_attempts: how many times a job is tried before it's marked failed
+    base_delay_seconds: how long to wait after a job's first failure, the wait doubles after every failure
+    max_delay_seconds: longest to ever wait before trying a job again
+    '''
+
+    def __init__(self, db_filename: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay_seconds: float = DEFAULT_BASE_DELAY_SECONDS,
+                 max_delay_seconds: float = DEFAULT_MAX_DELAY_SECONDS) -> None:
+        self.db_filename = db_filename
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.lock = threading.RLock()
+
+        self.conn = sqlite3.connect(db_filename, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS jobs (video_id TEXT PRIMARY KEY, url TEXT NOT NULL, "
+                              "state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                              "next_attempt_at REAL NOT NULL DEFAULT 0, last_error TEXT, "
+                              "video_info TEXT, transcript TEXT, updated_at REAL NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, next_attempt_at)")
+
+    def add(self, video_urls: list[str]) -> int:
+        '''
+        Adds a pending job for every url. Urls whose video already has a job (in any
+        state) are left alone, so adding the same playlist twice is fine.
+
+        Returns: int of how many new jobs were added
+
+        Raises: ValueError if a url doesn't have a video ID in it
+        '''
+        now = time.time()
+        jobs = [(extract_video_id(video_url), video_url, PENDING, now) for video_url in video_urls]
+        with self.lock, self.conn:
+            jobs_before = self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            self.conn.executemany("INSERT OR IGNORE INTO jobs (video_id, url, state, updated_at) "
+                                  "VALUES (?, ?, ?, ?)", jobs)
+            return self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - jobs_before
+
+    def get_job(self, video_id: str) -> dict:
+        '''
+        Returns: dictionary with the job's "video_id", "url", "state", "attempts",
+        "next_attempt_at", "last_error", "video_info" (dict or None), "transcript" (list of
+        segments or None) and "updated_at", or None if there's no job for this video
+        '''
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE video_id = ?", (video_id,)).fetchone()
+        return None if row is None else row_to_job(row)
+
+    def get_ready_jobs(self, limit: int, exclude: set[str] = frozenset()) -> list[dict]:
+        '''
+        Returns: list of up to limit unfinished jobs that aren't waiting on a backoff, the
+        ones furthest along first (so they get stored and their transcripts cleared out of
+        the file), then in the order they were added. Jobs in exclude are left out.
+        '''
+        placeholders = ", ".join("?" * len(exclude))
+        exclude_sql = f"AND video_id NOT IN ({placeholders})" if exclude else ""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM jobs WHERE state IN (?, ?, ?) AND next_attempt_at <= ? {exclude_sql} "
+                f"ORDER BY CASE state WHEN ? THEN 0 WHEN ? THEN 1 ELSE 2 END, rowid LIMIT ?",
+                (*UNFINISHED_STATES, time.time(), *exclude, TRANSCRIBED, METADATA_FETCHED, limit)).fetchall()
+        return [row_to_job(row) for row in rows]
+
+    def get_next_attempt_time(self) -> float:
+        '''
+        Returns: the time.time() when the next unfinished job can be tried, or None if
+        every job is stored or failed
+        '''
+        with self.lock:
+            return self.conn.execute("SELECT MIN(next_attempt_at) FROM jobs WHERE state IN (?, ?, ?)",
+                                     UNFINISHED_STATES).fetchone()[0]
+
+    def get_unfinished_ids(self) -> set[str]:
+        with self.lock:
+            return {row[0] for row in self.conn.execute("SELECT video_id FROM jobs WHERE state IN (?, ?, ?)",
+                                                        UNFINISHED_STATES)}
+
+    def save_video_info(self, video_id: str, video_info: dict) -> None:
+        self.update_job(video_id, METADATA_FETCHED, video_info=json.dumps(video_info))
+
+    def save_transcript(self, video_id: str, segments: list[dict]) -> None:
+        self.update_job(video_id, TRANSCRIBED, transcript=json.dumps(segments))
+
+    def update_job(self, video_id: str, state: str, **columns) -> None:
+        '''
+        Moves a job to a new state and saves any other columns given, in one commit.
+        Moving on to a new stage starts the attempts over, since they count the tries at a stage.
+        '''
+        assignments = "".join(f", {column} = ?" for column in columns)
+        with self.lock, self.conn:
+            self.conn.execute(f"UPDATE jobs SET state = ?, attempts = 0, next_attempt_at = 0, "
+                              f"last_error = NULL, updated_at = ?{assignments} WHERE video_id = ?",
+                              (state, time.time(), *columns.values(), video_id))
+
+    def mark_stored(self, video_ids, note: str = None) -> None:
+        '''
+        Marks jobs as stored and clears out their transcripts, since they're in the db now.
+        '''
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE jobs SET state = ?, attempts = 0, next_attempt_at = 0, last_error = ?, "
+                                  "transcript = NULL, updated_at = ? WHERE video_id = ?",
+                                  [(STORED, note, now, video_id) for video_id in video_ids])
+
+    def get_backoff_seconds(self, attempts: int) -> float:
+        '''
+        Returns: how long to wait before trying a job again after its attempts-th failure
+        '''
+        delay_seconds = min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempts - 1))
+        return delay_seconds * (1 + random.uniform(0, BACKOFF_JITTER))
+
+    def record_failure(self, video_id: str, error: Exception) -> dict:
+        '''
+        This function counts a failed try at a job's current stage. The job stays in the
+        same state and waits out its backoff, or it's marked failed once it has failed
+        max_attempts times.
+
+        Returns: the updated job (see get_job)
+        '''
+        error_message = f"{type(error).__name__}: {error}"
+        with self.lock, self.conn:
+            attempts = self.conn.execute("SELECT attempts FROM jobs WHERE video_id = ?",
+                                         (video_id,)).fetchone()[0] + 1
+            if attempts >= self.max_attempts:
+                self.conn.execute("UPDATE jobs SET state = ?, attempts = ?, last_error = ?, updated_at = ? "
+                                  "WHERE video_id = ?", (FAILED, attempts, error_message, time.time(), video_id))
+            else:
+                self.conn.execute("UPDATE jobs SET attempts = ?, next_attempt_at = ?, last_error = ?, "
+                                  "updated_at = ? WHERE video_id = ?",
+                                  (attempts, time.time() + self.get_backoff_seconds(attempts),
+                                   error_message, time.time(), video_id))
+            return self.get_job(video_id)
+
+    def retry_failed(self) -> int:
+        '''
+        Puts every failed job back in the queue, at the stage it failed at (worked out from
+        what was already saved in it), with its attempts started over.
+
+        Returns: int of how many jobs were put back
+        '''
+        with self.lock, self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET state = CASE WHEN transcript IS NOT NULL THEN ? "
+                "WHEN video_info IS NOT NULL THEN ? ELSE ? END, attempts = 0, next_attempt_at = 0, "
+                "updated_at = ? WHERE state = ?",
+                (TRANSCRIBED, METADATA_FETCHED, PENDING, time.time(), FAILED)).rowcount
+
+    def get_failed_jobs(self) -> list[dict]:
+        with self.lock:
+            rows = self.conn.execute("SELECT * FROM jobs WHERE state = ? ORDER BY rowid", (FAILED,)).fetchall()
+        return [row_to_job(row) for row in rows]
+
+    def counts(self) -> dict:
+        '''
+        Returns: dictionary of state -> how many jobs are in it, with every state in it
+        '''
+        state_counts = dict.fromkeys(JOB_STATES, 0)
+        with self.lock:
+            state_counts.update(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return state_counts
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def __enter__(self) -> 'IngestQueue':
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+
+def row_to_job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    for column in ("video_info", "transcript"):
+        if job[column] is not None:
+            job[column] = json.loads(job[column])
+    return job
+
+
+def run_job_stages(job_queue: IngestQueue, provider, job: dict, fetch_video_info: bool = True) -> dict:
+    '''
+    This function does the network part of a job, from whatever state it's in up to
+    transcribed, and saves it after each stage, so a crash only loses the stage that
+    was in the middle of running.
+
+    Parameters:
+    job_queue: the IngestQueue the job is in
+    provider: batch_transcription.TranscriptProvider to fetch the video info and transcript with
+    job: the job, from IngestQueue.get_ready_jobs
+    fetch_video_info: False if the video is already in video_info, so its info isn't needed
+
+    Returns: the job, now with its "video_info" and "transcript"
+    '''
+    video_id = job["video_id"]
+
+    if job["state"] == PENDING and fetch_video_info:
+        job["video_info"] = provider.get_video_info(video_id)
+        job_queue.save_video_info(video_id, job["video_info"])
+        job["state"] = METADATA_FETCHED
+
+    if job["state"] in (PENDING, METADATA_FETCHED):
+        job["transcript"] = provider.get_transcript(video_id)
+        job_queue.save_transcript(video_id, job["transcript"])
+        job["state"] = TRANSCRIBED
+
+    return job
+
+
+def get_job_rows(job: dict) -> tuple[tuple, tuple]:
+    '''
+    Returns: tuple of the job's video_info row (None if it has no video info) and its
+    transcription_data row, in the same column order as the tables in db_dictionaries
+    '''
+    from text_normalization import clean_text_for_storage
+
+    video_info = job["video_info"]
+    info_row = None
+    if video_info is not None:
+        info_row = (video_info["publish_date"], job["video_id"], job["url"], video_info["title"],
+                    video_info["description"], video_info["tags"], video_info["duration"])
+
+    segments = [{**segment, "text": clean_text_for_storage(segment["text"])}
+                for segment in job["transcript"]]
+    return info_row, (job["video_id"], 1, json.dumps(segments))
+
+
+def store_jobs(job_queue: IngestQueue, database, jobs: list[dict], video_info_ids: set[str]) -> list[tuple[dict, Exception]]:
+    '''
+    This function logs a batch of transcribed jobs to the db in one transaction and marks
+    them stored. If the transaction fails, the jobs are tried one at a time, so one bad
+    job doesn't hold the rest of the batch back.
+
+    Parameters:
+    job_queue: the IngestQueue the jobs are in
+    database: the Database (or SQLiteDatabase) to log to
+    jobs: list of transcribed jobs
+    video_info_ids: ids already in video_info, their video_info rows are left out (the
+    stored ids are added to it)
+
+    Returns: list of (job, error) for every job that couldn't be stored
+    '''
+    info_table = db_dictionaries.video_metadata["table_name"]
+    transcript_table = db_dictionaries.video_transcription_data["table_name"]
+
+    def log_jobs(jobs_to_log: list[dict]) -> None:
+        info_rows, transcript_rows = [], []
+        for job in jobs_to_log:
+            info_row, transcript_row = get_job_rows(job)
+            if info_row is not None and job["video_id"] not in video_info_ids:
+                info_rows.append(info_row)
+            transcript_rows.append(transcript_row)
+
+        database.log_batches_to_DB({info_table: info_rows, transcript_table: transcript_rows})
+
+    try:
+        log_jobs(jobs)
+        failures = []
+    except Exception as error:
+        failures = [(jobs[0], error)] if len(jobs) == 1 else []
+        if len(jobs) > 1:
+            for job in jobs:
+                try:
+                    log_jobs([job])
+                except Exception as job_error:
+                    failures.append((job, job_error))
+
+    # only marked stored once they're committed, so a crash before this just finds them in the db next run
+    failed_ids = {job["video_id"] for job, error in failures}
+    stored_ids = [job["video_id"] for job in jobs if job["video_id"] not in failed_ids]
+    job_queue.mark_stored(stored_ids)
+    video_info_ids.update(stored_ids)
+    return failures
+
+
+def run_ingest_queue(job_queue: IngestQueue, provider, database, workers: int = 8,
+                     store_batch_size: int = DEFAULT_STORE_BATCH_SIZE, on_event=None) -> dict:
+    '''
+    This function works through every unfinished job until each one is stored or failed.
+    The worker threads do the network stages (video info and transcript), and this thread
+    is the only one that touches the db, logging the transcribed jobs in batches.
+
+    Videos already in transcription_data are skipped before anything runs. Jobs that are
+    waiting on a backoff are picked up as soon as it's over, so this only returns once
+    there's nothing left to try.
+
+    Parameters:
+    job_queue: the IngestQueue to work through
+    provider: batch_transcription.TranscriptProvider to fetch the video info and transcripts with
+    database: the Database (or SQLiteDatabase) to log to, it needs the video_info and transcription_data tables
+    workers: how many jobs to run at the same time
+    store_batch_size: most jobs to log in one transaction
+    on_event: optional function called like on_event(event, video_id, detail) as jobs go,
+    where event is "skipped", "stored", "retry" or "failed"
+
+    Returns: dictionary with "already_stored" (skipped because they were in the db),
+    "stored", "retries" and "failed" (counts from this run), "seconds", and "counts" (how
+    many jobs are in each state now)
+    '''
+    on_event = on_event or (lambda event, video_id, detail: None)
+    summary = {"already_stored": 0, "stored": 0, "retries": 0, "failed": 0}
+    start_time = time.perf_counter()
+
+    transcript_ids = database.get_existing_ids(db_dictionaries.video_transcription_data["table_name"])
+    video_info_ids = database.get_existing_ids(db_dictionaries.video_metadata["table_name"])
+
+    already_stored = sorted(job_queue.get_unfinished_ids() & transcript_ids)
+    job_queue.mark_stored(already_stored, note="already in the db")
+    summary["already_stored"] = len(already_stored)
+    for video_id in already_stored:
+        on_event("skipped", video_id, "already in the db")
+
+    def handle_failure(video_id: str, error: Exception) -> None:
+        job = job_queue.record_failure(video_id, error)
+        if job["state"] == FAILED:
+            summary["failed"] += 1
+            on_event("failed", video_id, f'{job["last_error"]} (tried {job["attempts"]} times)')
+        else:
+            summary["retries"] += 1
+            on_event("retry", video_id, f'{job["last_error"]} (trying again in '
+                                        f'{job["next_attempt_at"] - time.time():.1f}s)')
+
+    def flush(store_batch: list[dict]) -> None:
+        failures = store_jobs(job_queue, database, store_batch, video_info_ids)
+        failed_ids = {job["video_id"] for job, error in failures}
+        for job in store_batch:
+            if job["video_id"] not in failed_ids:
+                summary["stored"] += 1
+                on_event("stored", job["video_id"], job["url"])
+        for job, error in failures:
+            handle_failure(job["video_id"], error)
+
+    in_flight = {}
+    store_batch = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # a few more jobs than workers are handed out, so no worker sits waiting on this loop
+            room = workers * 2 - len(in_flight)
+            if room > 0:
+                busy_ids = set(in_flight.values()) | {job["video_id"] for job in store_batch}
+                for job in job_queue.get_ready_jobs(room, exclude=busy_ids):
+                    if job["state"] == TRANSCRIBED:
+                        store_batch.append(job)
+                    else:
+                        future = executor.submit(run_job_stages, job_queue, provider, job,
+                                                 job["video_id"] not in video_info_ids)
+                        in_flight[future] = job["video_id"]
+
+            if len(store_batch) >= store_batch_size or (store_batch and not in_flight):
+                # a few workers can finish at once, so the batch can be a bit over store_batch_size
+                flush(store_batch[:store_batch_size])
+                store_batch = store_batch[store_batch_size:]
+                continue
+
+            if in_flight:
+                done, _ = wait(in_flight, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    video_id = in_flight.pop(future)
+                    try:
+                        store_batch.append(future.result())
+                    except Exception as error:
+                        handle_failure(video_id, error)
+                continue
+
+            next_attempt_time = job_queue.get_next_attempt_time()
+            if next_attempt_time is None:
+                break
+            time.sleep(min(POLL_SECONDS, max(0.0, next_attempt_time - time.time())))
+
+    summary["seconds"] = time.perf_counter() - start_time
+    summary["counts"] = job_queue.counts()
+    return summary
+
+
+def print_event(event: str, video_id: str, detail: str) -> None:
+    print(f'[{event}]{" " * (8 - len(event))}{video_id}: {detail}')
+
+
+def print_counts(state_counts: dict) -> None:
+    print(", ".join(f"{count:,} {state}" for state, count in state_counts.items()))
+
+
+def get_provider(args: argparse.Namespace):
+    '''
+    Returns: the provider the command line asked for, only importing what it needs
+    '''
+    from batch_transcription import CachingProvider, FakeProvider, YouTubeProvider
+
+    if args.fake_latency is not None:
+        provider = FakeProvider(latency_seconds=args.fake_latency)
+    else:
+        provider = YouTubeProvider()
+
+    if args.cache_dir:
+        from transcript_cache import TranscriptCache
+        provider = CachingProvider(provider, TranscriptCache(args.cache_dir))
+    return provider
+
+
+def add_source(job_queue: IngestQueue, source: str, provider) -> None:
+    from batch_transcription import read_urls_from_file
+
+    if "playlist?list=" in source:
+        video_urls = provider.get_playlist_urls(source)
+    else:
+        video_urls = read_urls_from_file(source)
+
+    added = job_queue.add(video_urls)
+    print(f"Added {added:,} new jobs ({len(video_urls) - added:,} were already in the queue)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A resumable job queue for ingesting lots of YT videos into the db.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_provider_arguments(command_parser: argparse.ArgumentParser) -> None:
+        command_parser.add_argument("--fake-latency", type=float, default=None,
+                                    help="use the offline fake provider with this many seconds of latency per call")
+        command_parser.add_argument("--cache-dir", help="optional folder to cache transcripts and video info in")
+
+    add_parser = subparsers.add_parser("add", help="add a job for every video in a url file or playlist")
+    add_parser.add_argument("queue_db", help="SQLite file the jobs are kept in")
+    add_parser.add_argument("source", help="txt file with one url per line, or a YT playlist url")
+    add_provider_arguments(add_parser)
+
+    run_parser = subparsers.add_parser("run", help="work through the queue, picking up where the last run stopped")
+    run_parser.add_argument("queue_db", help="SQLite file the jobs are kept in")
+    run_parser.add_argument("--source", help="add the videos in this url file or playlist first")
+    run_parser.add_argument("--sqlite-db", help="log to this SQLite file instead of the PostgreSQL db in config.py")
+    run_parser.add_argument("--create-tables", action="store_true", help="create the db tables first if needed")
+    run_parser.add_argument("--workers", type=int, default=8, help="how many videos to work on at the same time")
+    run_parser.add_argument("--batch-size", type=int, default=DEFAULT_STORE_BATCH_SIZE,
+                            help="most videos to log in one transaction")
+    run_parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                            help="how many times to try a video before it's marked failed")
+    run_parser.add_argument("--base-delay", type=float, default=DEFAULT_BASE_DELAY_SECONDS,
+                            help="seconds to wait after a first failure, doubled after every failure")
+    run_parser.add_argument("--max-delay", type=float, default=DEFAULT_MAX_DELAY_SECONDS,
+                            help="longest to wait before trying a video again")
+    add_provider_arguments(run_parser)
+
+    status_parser = subparsers.add_parser("status", help="show how many jobs are in each state")
+    status_parser.add_argument("queue_db", help="SQLite file the jobs are kept in")
+    status_parser.add_argument("--failed", action="store_true", help="list the failed jobs and their errors")
+
+    retry_parser = subparsers.add_parser("retry-failed", help="put the failed jobs back in the queue")
+    retry_parser.add_argument("queue_db", help="SQLite file the jobs are kept in")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        with IngestQueue(args.queue_db) as job_queue:
+            add_source(job_queue, args.source, get_provider(args))
+
+    elif args.command == "run":
+        from db_writer import connect_to_database
+
+        provider = get_provider(args)
+        database = connect_to_database(args.sqlite_db)
+        if args.create_tables:
+            for column_dict in (db_dictionaries.video_metadata, db_dictionaries.video_transcription_data):
+                database.build_database_table(table_name=column_dict["table_name"], column_dict=column_dict)
+
+        with IngestQueue(args.queue_db, max_attempts=args.max_attempts, base_delay_seconds=args.base_delay,
+                         max_delay_seconds=args.max_delay) as job_queue:
+            if args.source:
+                add_source(job_queue, args.source, provider)
+            summary = run_ingest_queue(job_queue, provider, database, workers=args.workers,
+                                       store_batch_size=args.batch_size, on_event=print_event)
+        database.close()
+
+        print(f'\n{summary["stored"]:,} stored, {summary["already_stored"]:,} already in the db, '
+              f'{summary["failed"]:,} failed, {summary["retries"]:,} retries in {summary["seconds"]:.2f}s')
+        print_counts(summary["counts"])
+
+    elif args.command == "status":
+        with IngestQueue(args.queue_db) as job_queue:
+            print_counts(job_queue.counts())
+            if args.failed:
+                for job in job_queue.get_failed_jobs():
+                    print(f'  {job["video_id"]} ({job["attempts"]} tries): {job["last_error"]}')
+
+    elif args.command == "retry-failed":
+        with IngestQueue(args.queue_db) as job_queue:
+            print(f"Put {job_queue.retry_failed():,} failed jobs back in the queue")
+
+
+if __name__ == "__main__":
+    main()
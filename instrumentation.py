@@ -0,0 +1,298 @@
+'''
+This module times each stage of the transcription pipeline (fetching video info,
+fetching the transcript, formatting it, writing the file, inserting into the db) so
+when a batch slows down we can see which stage it was.
+
+Every stage gets a latency histogram, and there are counters for things like bytes
+written and segments fetched. They can be saved as json lines or in the Prometheus
+text format.
+
+It's off by default, and while it's off, stage() hands back the same do-nothing
+context manager every time and timed functions just call straight through, so leaving
+the hooks in costs next to nothing.
+
+Usage:
+from instrumentation import metrics
+
+metrics.enable()
+
+with metrics.stage("get_transcript"):
+    segments = provider.get_transcript(video_id)
+metrics.increment("segments", len(segments))
+
+@metrics.timed("get_video_info")
+def get_video_info(video_url): ...
+
+metrics.save("metrics.prom")   # or metrics.jsonl
+'''
+import bisect
+import contextlib
+import functools
+import json
+import math
+import threading
+import time
+from typing import Iterable, Iterator
+
+
+# upper bounds (in seconds) of the histogram buckets, picked to cover everything from
+# formatting a transcript (milliseconds) to a slow YT call (seconds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+METRIC_PREFIX = "transcription_pipeline"
+
+NULL_STAGE = contextlib.nullcontext()
+
+
+class Histogram:
+    '''
+    Counts how many observed times fell into each bucket, plus their total, min and max.
+
+    Parameters:
+    buckets: sorted upper bounds of the buckets, the last one should be math.inf
+    '''
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, fraction: float) -> float:
+        '''
+        Returns: estimate of the value that fraction (like 0.95) of the observations are
+        under. It's the upper bound of the bucket it lands in, capped at the real max.
+        '''
+        if not self.count:
+            return 0.0
+
+        rank = fraction * self.count
+        seen = 0
+        for upper_bound, bucket_count in zip(self.buckets, self.bucket_counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(upper_bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {format_bucket_bound(bound): count
+                        for bound, count in zip(self.buckets, self.bucket_counts)},
+        }
+
+
+def format_bucket_bound(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(bound)
+
+
+class StageTimer:
+    '''
+    The context manager stage() hands out while metrics are on. It times the block
+    and counts an error for the stage if the block raises.
+    '''
+    __slots__ = ('metrics', 'stage_name', 'start_time')
+
+    def __init__(self, metrics: 'Metrics', stage_name: str) -> None:
+        self.metrics = metrics
+        self.stage_name = stage_name
+
+    def __enter__(self) -> 'StageTimer':
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback) -> None:
+        self.metrics.observe(self.stage_name, time.perf_counter() - self.start_time)
+        if exception_type is not None:
+            self.metrics.increment(f"{self.stage_name}_errors")
+
+
+class Metrics:
+    '''
+    Holds the stage histograms and counters. Safe to use from the batch worker threads.
+
+    Parameters:
+    enabled: whether to record anything at all
+    buckets: histogram bucket upper bounds in seconds
+    '''
+
+    def __init__(self, enabled: bool = False, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.enabled = enabled
+        self.buckets = buckets
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def stage(self, stage_name: str):
+        '''
+        Returns: context manager that times the code inside it as one run of the stage.
+        '''
+        if not self.enabled:
+            return NULL_STAGE
+        return StageTimer(self, stage_name)
+
+    def timed(self, stage_name: str):
+        '''
+        Decorator that times every call of a function as one run of the stage.
+        '''
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with StageTimer(self, stage_name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def timed_iterator(self, stage_name: str, iterable: Iterable) -> Iterator:
+        '''
+        Times only the time spent getting items out of an iterable (like a formatter
+        making a transcript one segment at a time), not the time the caller spends on
+        each item, and records it all as one run of the stage once it runs out.
+        '''
+        if not self.enabled:
+            return iter(iterable)
+        return self.iterate_timed(stage_name, iter(iterable))
+
+    def iterate_timed(self, stage_name: str, iterator: Iterator) -> Iterator:
+        perf_counter = time.perf_counter
+        elapsed_seconds = 0.0
+        try:
+            while True:
+                start_time = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed_seconds += perf_counter() - start_time
+                    break
+                elapsed_seconds += perf_counter() - start_time
+                yield item
+        finally:
+            self.observe(stage_name, elapsed_seconds)
+
+    def observe(self, stage_name: str, seconds: float) -> None:
+        '''
+        Records one run of a stage that took this many seconds.
+        '''
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage_name)
+            if histogram is None:
+                histogram = self.histograms[stage_name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, counter_name: str, amount: int = 1) -> None:
+        '''
+        Adds amount to a counter, like "bytes_written" or "segments".
+        '''
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[counter_name] = self.counters.get(counter_name, 0) + amount
+
+    def snapshot(self) -> dict:
+        '''
+        Returns: dictionary with a "stages" dict (stage name -> histogram summary) and
+        a "counters" dict (counter name -> value)
+        '''
+        with self.lock:
+            return {
+                "stages": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def to_json_lines(self) -> str:
+        '''
+        Returns: str with one json object per line, one per stage and one per counter.
+        '''
+        snapshot = self.snapshot()
+        timestamp = time.time()
+        lines = [json.dumps({"type": "stage", "name": name, "timestamp": timestamp, **summary})
+                 for name, summary in snapshot["stages"].items()]
+        lines += [json.dumps({"type": "counter", "name": name, "timestamp": timestamp, "value": value})
+                  for name, value in snapshot["counters"].items()]
+        return ''.join(line + '\n' for line in lines)
+
+    def to_prometheus_text(self) -> str:
+        '''
+        Returns: str of every histogram and counter in the Prometheus text exposition format.
+        '''
+        snapshot = self.snapshot()
+        lines = []
+
+        if snapshot["stages"]:
+            metric_name = f"{METRIC_PREFIX}_stage_seconds"
+            lines.append(f"# HELP {metric_name} How long each pipeline stage took.")
+            lines.append(f"# TYPE {metric_name} histogram")
+            for name, summary in snapshot["stages"].items():
+                cumulative_count = 0
+                for bound, count in summary["buckets"].items():
+                    cumulative_count += count
+                    lines.append(f'{metric_name}_bucket{{stage="{name}",le="{bound}"}} {cumulative_count}')
+                lines.append(f'{metric_name}_sum{{stage="{name}"}} {summary["sum"]!r}')
+                lines.append(f'{metric_name}_count{{stage="{name}"}} {summary["count"]}')
+
+        for name, value in snapshot["counters"].items():
+            metric_name = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric_name} counter")
+            lines.append(f"{metric_name} {value}")
+
+        return ''.join(line + '\n' for line in lines)
+
+    def save(self, filename: str) -> None:
+        '''
+        Saves everything recorded so far. Files ending in .prom get the Prometheus text
+        format, anything else gets json lines (added to the end of the file, so a file
+        can collect many runs).
+        '''
+        if filename.endswith(".prom"):
+            with open(filename, 'w', encoding='utf-8') as metrics_file:
+                metrics_file.write(self.to_prometheus_text())
+        else:
+            with open(filename, 'a', encoding='utf-8') as metrics_file:
+                metrics_file.write(self.to_json_lines())
+
+    def format_summary(self) -> str:
+        '''
+        Returns: str of a little table of every stage's count and latency, for printing.
+        '''
+        snapshot = self.snapshot()
+        lines = [f'{"stage":<20} {"count":>7} {"total s":>9} {"mean ms":>9} {"p95 ms":>9} {"max ms":>9}']
+        for name, summary in snapshot["stages"].items():
+            lines.append(f'{name:<20} {summary["count"]:>7} {summary["sum"]:>9.2f} {summary["mean"] * 1000:>9.1f} '
+                         f'{summary["p95"] * 1000:>9.1f} {summary["max"] * 1000:>9.1f}')
+        for name, value in snapshot["counters"].items():
+            lines.append(f'{name:<20} {value:>7,}')
+        return '\n'.join(lines)
+
+
+# the one shared instance the pipeline modules record to
+metrics = Metrics()
@@ -0,0 +1,155 @@
+'''
+This module keeps a manifest of the transcript files we've already processed (their
+path, size, modified time, and a hash of their contents), so analytics and index
+builds can skip everything that hasn't changed since the last run.
+
+Files are sorted into added, changed, appended, deleted, and unchanged. If a file's
+size and modified time are the same as last time, it's unchanged and we don't even
+read it. Since write_string_to_text_file only ever appends, a file that grew is checked
+to see if its old contents are still there at the start, and if they are it counts as
+"appended" so only the new part at the end has to be processed.
+'''
+import hashlib
+import json
+import os
+
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(filename: str, length: int = None) -> str:
+    '''
+    This function hashes a file's contents (or just the first length bytes of it).
+
+    Parameters:
+    filename: str of the file to hash
+    length: how many bytes from the start of the file to hash. None hashes all of it.
+
+    Returns: str of the hex digest
+    '''
+    file_hash = hashlib.blake2b(digest_size=20)
+    bytes_left = length
+
+    with open(filename, 'rb') as file:
+        while bytes_left is None or bytes_left > 0:
+            read_size = HASH_CHUNK_SIZE if bytes_left is None else min(HASH_CHUNK_SIZE, bytes_left)
+            chunk = file.read(read_size)
+            if not chunk:
+                break
+            file_hash.update(chunk)
+            if bytes_left is not None:
+                bytes_left -= len(chunk)
+
+    return file_hash.hexdigest()
+
+
+def ends_with_whitespace(filename: str, length: int) -> bool:
+    '''
+    Returns: True if the byte at length - 1 in the file is whitespace (or the file is empty),
+    so nothing appended after it could have been glued onto the end of an old word.
+    '''
+    if length == 0:
+        return True
+    with open(filename, 'rb') as file:
+        file.seek(length - 1)
+        return file.read(1).isspace()
+
+
+class Manifest:
+    '''
+    Parameters:
+    manifest_filename: str of the json file the manifest is saved in. It's loaded if it exists.
+    settings: optional dictionary of whatever settings the results depend on. If they don't
+    match the saved settings, the saved entries are thrown out (and settings_changed is set)
+    so everything gets processed from scratch.
+    '''
+
+    def __init__(self, manifest_filename: str, settings: dict = None) -> None:
+        self.manifest_filename = manifest_filename
+        self.settings = settings or {}
+        self.entries = {}
+        self.settings_changed = False
+
+        if os.path.exists(manifest_filename):
+            with open(manifest_filename, 'r', encoding='utf-8') as manifest_file:
+                saved_manifest = json.load(manifest_file)
+
+            if saved_manifest.get("settings", {}) == self.settings:
+                self.entries = saved_manifest["entries"]
+            else:
+                self.settings_changed = True
+
+    def scan(self, filenames: list[str]) -> dict[str, list[str]]:
+        '''
+        This function compares the files against the manifest to see what's different.
+        Nothing is changed in the manifest until you call update or remove.
+
+        Parameters:
+        filenames: list of every file that's part of the corpus right now
+
+        Returns: dictionary with "added", "changed", "appended", "deleted" and "unchanged"
+        lists of absolute file paths.
+        '''
+        changes = {"added": [], "changed": [], "appended": [], "deleted": [], "unchanged": []}
+        current_paths = set()
+
+        for filename in filenames:
+            path = os.path.abspath(filename)
+            if path in current_paths:
+                continue
+            current_paths.add(path)
+
+            entry = self.entries.get(path)
+            if entry is None:
+                changes["added"].append(path)
+                continue
+
+            file_stat = os.stat(path)
+            if file_stat.st_size == entry["size"] and file_stat.st_mtime_ns == entry["mtime_ns"]:
+                changes["unchanged"].append(path)
+
+            elif file_stat.st_size == entry["size"] and hash_file(path) == entry["hash"]:
+                # just touched, the contents are the same
+                entry["mtime_ns"] = file_stat.st_mtime_ns
+                changes["unchanged"].append(path)
+
+            elif (file_stat.st_size > entry["size"]
+                  and hash_file(path, length=entry["size"]) == entry["hash"]
+                  and ends_with_whitespace(path, entry["size"])):
+                changes["appended"].append(path)
+
+            else:
+                changes["changed"].append(path)
+
+        changes["deleted"].extend(path for path in self.entries if path not in current_paths)
+        return changes
+
+    def get(self, filename: str) -> dict:
+        '''
+        Returns: the manifest entry for a file, or None if it's not in the manifest.
+        '''
+        return self.entries.get(os.path.abspath(filename))
+
+    def update(self, filename: str, **extra) -> None:
+        '''
+        Records a file's current size, modified time and hash in the manifest. Any extra
+        keyword arguments are saved in its entry too (like where its results were saved).
+        '''
+        path = os.path.abspath(filename)
+        file_stat = os.stat(path)
+        entry = self.entries.get(path, {})
+        entry.update(extra)
+        entry.update({"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "hash": hash_file(path)})
+        self.entries[path] = entry
+
+    def remove(self, filename: str) -> None:
+        self.entries.pop(os.path.abspath(filename), None)
+
+    def save(self) -> None:
+        '''
+        Saves the manifest (through a temp file, so it's never half written).
+        '''
+        temp_filename = f'{self.manifest_filename}.{os.getpid()}.tmp'
+        with open(temp_filename, 'w', encoding='utf-8') as manifest_file:
+            json.dump({"settings": self.settings, "entries": self.entries}, manifest_file)
+        os.replace(temp_filename, self.manifest_filename)
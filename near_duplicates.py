@@ -0,0 +1,443 @@
+'''
+This module finds transcripts that are (almost) the same as ones we already have, like
+re-uploads, clips and mirrored lectures, so we don't pay to store and analyze the same
+video over and over.
+
+How it works:
+1. Shingling: a transcript becomes the set of every run of 5 words in a row in it.
+2. MinHash: that set gets squashed into a signature of 128 numbers, and the fraction of
+   numbers two signatures have in common is about how much their shingle sets overlap
+   (their Jaccard similarity).
+3. LSH: each signature is cut into bands, and every band is hashed into a bucket.
+   Transcripts that are near duplicates almost always share at least one bucket, while
+   different ones almost never do, so only transcripts in the same buckets ever get
+   compared. That's what keeps this from comparing every transcript to every other one.
+
+The signatures and buckets are saved in a SQLite file, so checking a new transcript is
+one bucket lookup per band (an indexed query), no matter how many transcripts there are.
+
+Usage:
+python near_duplicates.py add signatures.db path/to/transcripts
+python near_duplicates.py check signatures.db new_transcript.json
+python near_duplicates.py pairs signatures.db
+'''
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from text_normalization import TOKENIZER_VERSION, Tokenizer
+
+
+# words are case folded so a re-upload with different capitalization still matches
+SHINGLE_TOKENIZER = Tokenizer(casefold=True, unicode_form="NFKC")
+
+DEFAULT_SHINGLE_SIZE = 5
+DEFAULT_NUM_PERMUTATIONS = 128
+DEFAULT_THRESHOLD = 0.8
+
+# the random hash functions come from this seed, so signatures from different runs line up
+MINHASH_SEED = 130
+
+# how many shingles get hashed at once (each one takes num_permutations * 8 bytes)
+MINHASH_CHUNK_SIZE = 8192
+
+# big odd numbers for mixing hashes together (they wrap around at 64 bits on purpose)
+SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+BAND_MULTIPLIER = np.uint64(0xC2B2AE3D27D4EB4F)
+
+
+def hash_words(words: list[str]) -> np.ndarray:
+    '''
+    This function gives every word a 64 bit hash that's the same every run (Python's
+    hash() changes every time Python starts). Only the unique words are hashed. They're
+    numbered with a dict, which is faster than np.unique on strings and doesn't need a
+    fixed width string array as wide as the longest word.
+
+    Returns: uint64 array with the hash of every word, in the same order as words
+    '''
+    word_numbers = {}
+    word_ids = np.fromiter((word_numbers.setdefault(word, len(word_numbers)) for word in words),
+                           dtype=np.int64, count=len(words))
+    unique_hashes = np.fromiter((int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'little')
+                                 for word in word_numbers), dtype=np.uint64, count=len(word_numbers))
+    return unique_hashes[word_ids]
+
+
+def get_shingle_hashes(words: list[str], shingle_size: int = DEFAULT_SHINGLE_SIZE) -> np.ndarray:
+    '''
+    This function hashes every run of shingle_size words in a row (a "shingle"). The
+    word hashes are mixed together with whole array math, one pass per word in the shingle.
+    A transcript with fewer words than that is just one shingle.
+
+    Returns: uint64 array of the unique shingle hashes
+    '''
+    word_hashes = hash_words(words)
+    shingle_size = max(1, min(shingle_size, len(word_hashes)))
+    shingle_count = len(word_hashes) - shingle_size + 1
+    if shingle_count <= 0:
+        return np.array([], dtype=np.uint64)
+
+    shingle_hashes = word_hashes[:shingle_count].copy()
+    for offset in range(1, shingle_size):
+        shingle_hashes *= SHINGLE_MULTIPLIER
+        shingle_hashes += word_hashes[offset:offset + shingle_count]
+    return np.unique(shingle_hashes)
+
+
+def get_hash_functions(num_permutations: int = DEFAULT_NUM_PERMUTATIONS,
+                       seed: int = MINHASH_SEED) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns: tuple --> (multipliers, offsets), two uint64 arrays with one entry per hash
+    function h(x) = (multiplier * x + offset) >> 32. The multipliers are odd so no
+    information is lost in the multiply.
+    '''
+    random_numbers = np.random.default_rng(seed).integers(0, 2 ** 64, size=(2, num_permutations),
+                                                          dtype=np.uint64, endpoint=False)
+    return random_numbers[0] | np.uint64(1), random_numbers[1]
+
+
+def compute_minhash(shingle_hashes: np.ndarray, num_permutations: int = DEFAULT_NUM_PERMUTATIONS,
+                    seed: int = MINHASH_SEED) -> np.ndarray:
+    '''
+    This function works out a MinHash signature: for every hash function, the smallest
+    hash of any shingle. The shingles are hashed by every function at once, a chunk at
+    a time so it doesn't use too much memory on really long transcripts.
+
+    Parameters:
+    shingle_hashes: uint64 array of shingle hashes, like from get_shingle_hashes
+    num_permutations: how many hash functions (the length of the signature)
+    seed: the seed the hash functions come from
+
+    Returns: uint32 array signature with num_permutations values
+    '''
+    multipliers, offsets = get_hash_functions(num_permutations, seed)
+    signature = np.full(num_permutations, np.iinfo(np.uint32).max, dtype=np.uint64)
+
+    for chunk_start in range(0, len(shingle_hashes), MINHASH_CHUNK_SIZE):
+        chunk = shingle_hashes[chunk_start:chunk_start + MINHASH_CHUNK_SIZE]
+        permuted_hashes = (multipliers[:, None] * chunk[None, :] + offsets[:, None]) >> np.uint64(32)
+        np.minimum(signature, permuted_hashes.min(axis=1), out=signature)
+
+    return signature.astype(np.uint32)
+
+
+def estimate_similarity(signature: np.ndarray, other_signatures: np.ndarray) -> np.ndarray:
+    '''
+    Returns: float array of the estimated Jaccard similarity between one signature and
+    each row of other_signatures (the fraction of their values that match)
+    '''
+    return (np.atleast_2d(other_signatures) == signature).mean(axis=1)
+
+
+def choose_bands(num_permutations: int = DEFAULT_NUM_PERMUTATIONS,
+                 threshold: float = DEFAULT_THRESHOLD) -> tuple[int, int]:
+    '''
+    This function picks how to cut signatures into bands for LSH. Two transcripts with
+    similarity s share a bucket with probability 1 - (1 - s^rows)^bands, which jumps up
+    around s = (1 / bands)^(1 / rows). We pick the split where that jump is as close to
+    the threshold as it can be without going over it, so real near duplicates are almost
+    never missed (the extra candidates get checked against the threshold anyway).
+
+    Returns: tuple --> (bands, rows per band)
+    '''
+    splits = [(num_permutations // rows, rows) for rows in range(1, num_permutations + 1)
+              if num_permutations % rows == 0]
+    under_threshold = [(bands, rows) for bands, rows in splits if (1 / bands) ** (1 / rows) <= threshold]
+    return max(under_threshold or splits[:1], key=lambda split: (1 / split[0]) ** (1 / split[1]))
+
+
+def get_band_keys(signature: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    '''
+    Returns: int64 array with one bucket key per band. The band number is mixed in so
+    the same values in different bands end up in different buckets.
+    '''
+    band_values = signature[:bands * rows].reshape(bands, rows).astype(np.uint64)
+    keys = np.arange(1, bands + 1, dtype=np.uint64)
+    for row in range(rows):
+        keys *= BAND_MULTIPLIER
+        keys += band_values[:, row]
+    return keys.view(np.int64)
+
+
+def get_transcript_text(filename: str) -> str:
+    '''
+    Returns: the spoken text of a transcript file. json transcripts (lists of segment
+    dicts) have their segment text joined, anything else is read as plain text.
+    '''
+    with open(filename, 'r', encoding='utf-8') as transcript_file:
+        if filename.lower().endswith('.json'):
+            return ' '.join(segment["text"] for segment in json.load(transcript_file))
+        return transcript_file.read()
+
+
+class NearDuplicateIndex:
+    '''
+    MinHash signatures and LSH buckets for every transcript we've kept, saved in a SQLite
+    file. Safe to use from the batch worker threads.
+
+    Parameters:
+    db_filename: str of the SQLite file to keep the signatures in (it's created if needed)
+    threshold: how similar (0 to 1) two transcripts have to be to count as near duplicates
+    num_permutations: signature length, more is more accurate but slower
+    shingle_size: how many words in a row make one shingle
+
+    The signature settings are saved in the file, and opening it with different ones
+    raises a ValueError, since signatures made different ways can't be compared.
+    '''
+
+    def __init__(self, db_filename: str, threshold: float = DEFAULT_THRESHOLD,
+                 num_permutations: int = DEFAULT_NUM_PERMUTATIONS, shingle_size: int = DEFAULT_SHINGLE_SIZE) -> None:
+        self.db_filename = db_filename
+        self.threshold = threshold
+        self.num_permutations = num_permutations
+        self.shingle_size = shingle_size
+        self.bands, self.rows = choose_bands(num_permutations, threshold)
+        self.lock = threading.RLock()
+
+        self.conn = sqlite3.connect(db_filename, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS signatures (transcript_id TEXT PRIMARY KEY, "
+                              "signature BLOB NOT NULL, shingle_count INTEGER NOT NULL, added_at REAL NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS buckets (bucket INTEGER NOT NULL, "
+                              "transcript_id TEXT NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS buckets_by_bucket ON buckets (bucket)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS buckets_by_transcript ON buckets (transcript_id)")
+        self.check_settings()
+
+    def check_settings(self) -> None:
+        '''
+        Saves the signature settings the first time, and after that makes sure they match.
+        The bands that were picked when the file was made are kept even if the threshold
+        changes, so the saved buckets still work (the threshold is only used for filtering).
+        '''
+        settings = {"num_permutations": self.num_permutations, "shingle_size": self.shingle_size,
+                    "seed": MINHASH_SEED, "tokenizer_version": TOKENIZER_VERSION}
+        saved_settings = {name: json.loads(value) for name, value in
+                          self.conn.execute("SELECT name, value FROM settings")}
+
+        if not saved_settings:
+            with self.conn:
+                self.conn.executemany("INSERT INTO settings VALUES (?, ?)",
+                                      [(name, json.dumps(value)) for name, value in
+                                       {**settings, "bands": self.bands, "rows": self.rows}.items()])
+            return
+
+        self.bands, self.rows = saved_settings.pop("bands"), saved_settings.pop("rows")
+        if saved_settings != settings:
+            self.conn.close()
+            raise ValueError(f"{self.db_filename} was made with {saved_settings}, not {settings}, "
+                             f"so its signatures can't be compared. Use the same settings or make a new file.")
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+    def __contains__(self, transcript_id: str) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM signatures WHERE transcript_id = ?",
+                                     (transcript_id,)).fetchone() is not None
+
+    def compute_signature(self, text: str) -> tuple[np.ndarray, int]:
+        '''
+        Returns: tuple --> (MinHash signature of some text, how many unique shingles it has).
+        Text with no words has no signature (None).
+        '''
+        shingle_hashes = get_shingle_hashes(list(SHINGLE_TOKENIZER.tokenize(text)), self.shingle_size)
+        if not len(shingle_hashes):
+            return None, 0
+        return compute_minhash(shingle_hashes, self.num_permutations), len(shingle_hashes)
+
+    def find_duplicates_of_signature(self, signature: np.ndarray, exclude_id: str = None) -> list[tuple[str, float]]:
+        band_keys = get_band_keys(signature, self.bands, self.rows).tolist()
+        with self.lock:
+            candidates = self.conn.execute(
+                f"SELECT DISTINCT signatures.transcript_id, signatures.signature FROM buckets "
+                f"JOIN signatures ON signatures.transcript_id = buckets.transcript_id "
+                f"WHERE buckets.bucket IN ({', '.join('?' * len(band_keys))}) AND buckets.transcript_id != ?",
+                band_keys + [exclude_id or '']).fetchall()
+
+        if not candidates:
+            return []
+
+        candidate_signatures = np.frombuffer(b''.join(blob for _, blob in candidates), dtype=np.uint32)
+        similarities = estimate_similarity(signature, candidate_signatures.reshape(len(candidates), -1))
+        duplicates = [(transcript_id, float(similarity))
+                      for (transcript_id, _), similarity in zip(candidates, similarities)
+                      if similarity >= self.threshold]
+        return sorted(duplicates, key=lambda duplicate: duplicate[1], reverse=True)
+
+    def find_duplicates(self, text: str, exclude_id: str = None) -> list[tuple[str, float]]:
+        '''
+        This function looks up the transcripts that some text is a near duplicate of,
+        without adding it.
+
+        Parameters:
+        text: the transcript text
+        exclude_id: optional transcript ID to leave out, so a transcript that's already
+        in here doesn't find itself
+
+        Returns: list of (transcript ID, estimated similarity) tuples, most similar first
+        '''
+        signature, _ = self.compute_signature(text)
+        if signature is None:
+            return []
+        return self.find_duplicates_of_signature(signature, exclude_id)
+
+    def add_signature(self, transcript_id: str, signature: np.ndarray, shingle_count: int) -> None:
+        band_keys = get_band_keys(signature, self.bands, self.rows).tolist()
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM buckets WHERE transcript_id = ?", (transcript_id,))
+            self.conn.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?)",
+                              (transcript_id, signature.astype(np.uint32).tobytes(), shingle_count, time.time()))
+            self.conn.executemany("INSERT INTO buckets VALUES (?, ?)",
+                                  [(band_key, transcript_id) for band_key in band_keys])
+
+    def add(self, transcript_id: str, text: str) -> bool:
+        '''
+        Saves the signature of a transcript (replacing any old one with the same ID).
+
+        Returns: True if it was added, False if the text had no words to add
+        '''
+        signature, shingle_count = self.compute_signature(text)
+        if signature is None:
+            return False
+        self.add_signature(transcript_id, signature, shingle_count)
+        return True
+
+    def check_and_add(self, transcript_id: str, text: str) -> list[tuple[str, float]]:
+        '''
+        This is the check to run before storing a new transcript: if it's a near duplicate
+        of one we already have, those are returned and it isn't added. Otherwise it's
+        added and an empty list comes back. Two threads can't both let the same new
+        transcript through, since the check and the add happen together.
+
+        The signature is added before the transcript is stored anywhere, so if storing it
+        fails, take it back out with remove, or a later copy of it will look like a duplicate.
+
+        Parameters:
+        transcript_id: the ID to save it under, like the video ID
+        text: the transcript text
+
+        Returns: list of (transcript ID, estimated similarity) tuples it duplicates, most similar first
+        '''
+        signature, shingle_count = self.compute_signature(text)
+        if signature is None:
+            return []
+
+        # the lock is reentrant, so holding it here makes the lookup and the add one step
+        with self.lock:
+            duplicates = self.find_duplicates_of_signature(signature, exclude_id=transcript_id)
+            if not duplicates:
+                self.add_signature(transcript_id, signature, shingle_count)
+        return duplicates
+
+    def remove(self, transcript_id: str) -> None:
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM buckets WHERE transcript_id = ?", (transcript_id,))
+            self.conn.execute("DELETE FROM signatures WHERE transcript_id = ?", (transcript_id,))
+
+    def find_all_pairs(self) -> list[tuple[str, str, float]]:
+        '''
+        This function finds every pair of near duplicates already in here. Only pairs
+        that share a bucket are compared, which is what keeps it from being every
+        transcript against every other one.
+
+        Returns: list of (transcript ID, transcript ID, estimated similarity) tuples, most similar first
+        '''
+        with self.lock:
+            candidate_pairs = self.conn.execute(
+                "SELECT DISTINCT first.transcript_id, second.transcript_id FROM buckets AS first "
+                "JOIN buckets AS second ON first.bucket = second.bucket "
+                "AND first.transcript_id < second.transcript_id").fetchall()
+            signatures = {transcript_id: np.frombuffer(blob, dtype=np.uint32) for transcript_id, blob in
+                          self.conn.execute("SELECT transcript_id, signature FROM signatures")}
+
+        if not candidate_pairs:
+            return []
+
+        first_signatures = np.stack([signatures[first_id] for first_id, _ in candidate_pairs])
+        second_signatures = np.stack([signatures[second_id] for _, second_id in candidate_pairs])
+        similarities = (first_signatures == second_signatures).mean(axis=1)
+
+        pairs = [(first_id, second_id, float(similarity))
+                 for (first_id, second_id), similarity in zip(candidate_pairs, similarities)
+                 if similarity >= self.threshold]
+        return sorted(pairs, key=lambda pair: pair[2], reverse=True)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> 'NearDuplicateIndex':
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+
+def main():
+    from corpus_analytics import find_transcript_files
+
+    parser = argparse.ArgumentParser(description="Find near duplicate transcripts with MinHash and LSH.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="add transcripts, reporting the ones that are near duplicates")
+    add_parser.add_argument("db_file", help="SQLite file to keep the signatures in")
+    add_parser.add_argument("paths", nargs="+", help="transcript files (txt or json), folders or glob patterns")
+    add_parser.add_argument("--keep-duplicates", action="store_true",
+                            help="add near duplicates too, instead of only reporting them")
+
+    check_parser = subparsers.add_parser("check", help="check transcripts without adding them")
+    check_parser.add_argument("db_file", help="SQLite file the signatures are in")
+    check_parser.add_argument("paths", nargs="+", help="transcript files (txt or json)")
+
+    pairs_parser = subparsers.add_parser("pairs", help="list every near duplicate pair already added")
+    pairs_parser.add_argument("db_file", help="SQLite file the signatures are in")
+
+    for subparser in (add_parser, check_parser, pairs_parser):
+        subparser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                               help="how similar (0 to 1) transcripts have to be to count as near duplicates")
+    args = parser.parse_args()
+
+    with NearDuplicateIndex(args.db_file, threshold=args.threshold) as index:
+        if args.command == "pairs":
+            for first_id, second_id, similarity in index.find_all_pairs():
+                print(f'{similarity:.2f}  {first_id}  {second_id}')
+            return
+
+        filenames = []
+        for path in args.paths:
+            filenames.extend([path] if os.path.isfile(path) else
+                             find_transcript_files(path, extensions=(".txt", ".json")))
+
+        start_time = time.perf_counter()
+        duplicate_count = 0
+        for filename in filenames:
+            text = get_transcript_text(filename)
+            if args.command == "check":
+                duplicates = index.find_duplicates(text, exclude_id=filename)
+            elif args.keep_duplicates:
+                duplicates = index.find_duplicates(text, exclude_id=filename)
+                index.add(filename, text)
+            else:
+                duplicates = index.check_and_add(filename, text)
+
+            if duplicates:
+                duplicate_count += 1
+                print(f'[duplicate] {filename}')
+                for transcript_id, similarity in duplicates:
+                    print(f'    {similarity:.2f}  {transcript_id}')
+
+        print(f'\n{duplicate_count} of {len(filenames)} transcripts are near duplicates '
+              f'({len(index)} kept, {time.perf_counter() - start_time:.2f}s)')
+
+
+if __name__ == "__main__":
+    main()
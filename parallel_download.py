@@ -0,0 +1,428 @@
+'''
+This module downloads big files (like YT video streams) in parallel pieces instead of
+one long transfer. The file is split into chunks, and a pool of threads each asks the
+server for one chunk at a time with an HTTP range request and writes it straight into
+its spot in a file that was made full size up front.
+
+While it's downloading, the file is saved as <filename>.part, and a little state file
+(<filename>.part.json) keeps track of which chunks are done. If the download dies
+halfway, running it again picks up where it left off instead of starting over. Once
+every chunk is in, the size is checked and the .part file is renamed to the real name.
+
+Servers that don't do range requests still work, they just get downloaded in one go.
+
+There's also a little local server with range support in here, so this can all be tried
+out (or benchmarked) without touching the internet.
+
+Usage:
+python parallel_download.py <url> video.mp4 --workers 8
+python parallel_download.py --serve path/to/folder --port 8000
+'''
+import argparse
+import http.server
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import metrics
+
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT_SECONDS = 30
+READ_SIZE = 256 * 1024
+
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+# what a 416 (range not satisfiable) answer says, like for an empty file that has no byte 0
+UNSATISFIED_RANGE_PATTERN = re.compile(r'bytes \*/(\d+)')
+
+
+class DownloadError(Exception):
+    '''
+    Raised when a download can't be finished, like when the server sends back the
+    wrong bytes or the finished file isn't the size it should be.
+    '''
+
+
+def get_remote_file_info(url: str, timeout: float = DEFAULT_TIMEOUT_SECONDS) -> tuple[int, bool]:
+    '''
+    This function asks the server for the first byte of the file, which tells us how big
+    the whole file is and whether the server does range requests at all. An empty file
+    has no first byte, so the server answers with a 416 instead, which still has the
+    size in it (or if it doesn't, a HEAD request is used to get it).
+
+    Parameters:
+    url: str of the file's url
+    timeout: how many seconds to wait on the server
+
+    Returns: tuple --> (size of the file in bytes, True if the server supports range requests)
+    '''
+    request = urllib.request.Request(url, headers={"Range": "bytes=0-0"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            if response.status == 206:
+                content_range = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+                if content_range and content_range.group(3) != '*':
+                    return int(content_range.group(3)), True
+
+            content_length = response.headers.get("Content-Length")
+    except urllib.error.HTTPError as error:
+        if error.code != 416:
+            raise
+        unsatisfied_range = UNSATISFIED_RANGE_PATTERN.match(error.headers.get("Content-Range", ""))
+        error.close()
+        if unsatisfied_range:
+            return int(unsatisfied_range.group(1)), True
+
+        head_request = urllib.request.Request(url, method="HEAD")
+        with urllib.request.urlopen(head_request, timeout=timeout) as response:
+            content_length = response.headers.get("Content-Length")
+
+    if content_length is None:
+        raise DownloadError(f"{url} didn't say how big it is")
+    return int(content_length), False
+
+
+def plan_chunks(total_size: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list[tuple[int, int]]:
+    '''
+    Splits a file into chunks.
+
+    Parameters:
+    total_size: size of the file in bytes
+    chunk_size: how many bytes each chunk should be (the last one can be smaller)
+
+    Returns: list of (first byte, last byte) tuples, both inclusive like HTTP ranges are
+    '''
+    return [(start, min(start + chunk_size, total_size) - 1) for start in range(0, total_size, chunk_size)]
+
+
+def get_part_filenames(filename: str) -> tuple[str, str]:
+    '''
+    Returns: tuple --> (the .part file the data goes into, the .part.json state file)
+    '''
+    return filename + ".part", filename + ".part.json"
+
+
+class DownloadState:
+    '''
+    Keeps track of which chunks of a download are done, and saves that to the state
+    file every time a chunk finishes so a crashed download can be resumed.
+
+    Parameters:
+    state_filename: str of the .part.json file
+    total_size: size of the whole file in bytes
+    chunk_size: size of each chunk in bytes
+    '''
+
+    def __init__(self, state_filename: str, total_size: int, chunk_size: int) -> None:
+        self.state_filename = state_filename
+        self.total_size = total_size
+        self.chunk_size = chunk_size
+        self.completed_chunks = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, state_filename: str, total_size: int, chunk_size: int) -> 'DownloadState':
+        '''
+        Loads the state file if there is one for a download of this same file. If the
+        state file is missing, broken, or was for a different size file or chunk size,
+        you get a fresh state with nothing done.
+        '''
+        state = cls(state_filename, total_size, chunk_size)
+
+        try:
+            with open(state_filename, 'r', encoding='utf-8') as state_file:
+                saved_state = json.load(state_file)
+        except (OSError, ValueError):
+            return state
+
+        if saved_state.get("total_size") == total_size and saved_state.get("chunk_size") == chunk_size:
+            state.completed_chunks = set(saved_state.get("completed_chunks", []))
+        return state
+
+    def mark_completed(self, chunk_number: int) -> None:
+        with self.lock:
+            self.completed_chunks.add(chunk_number)
+            self.save()
+
+    def save(self) -> None:
+        temp_filename = f'{self.state_filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_filename, 'w', encoding='utf-8') as state_file:
+            json.dump({"total_size": self.total_size, "chunk_size": self.chunk_size,
+                       "completed_chunks": sorted(self.completed_chunks)}, state_file)
+        os.replace(temp_filename, self.state_filename)
+
+
+def preallocate_file(filename: str, total_size: int) -> None:
+    '''
+    Makes sure the .part file exists and is the full size of the download, without
+    touching whatever chunks were already written to it.
+    '''
+    with open(filename, 'ab') as part_file:
+        if os.fstat(part_file.fileno()).st_size != total_size:
+            part_file.truncate(total_size)
+
+
+def download_chunk(url: str, part_filename: str, first_byte: int, last_byte: int,
+                   timeout: float = DEFAULT_TIMEOUT_SECONDS) -> int:
+    '''
+    This function downloads one chunk with a range request and writes it into its spot
+    in the .part file.
+
+    Parameters:
+    url: str of the file's url
+    part_filename: str of the preallocated .part file
+    first_byte: first byte of the chunk
+    last_byte: last byte of the chunk (inclusive)
+    timeout: how many seconds to wait on the server
+
+    Returns: int of how many bytes were written
+    '''
+    request = urllib.request.Request(url, headers={"Range": f"bytes={first_byte}-{last_byte}"})
+    expected_bytes = last_byte - first_byte + 1
+    bytes_written = 0
+
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        content_range = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+        if response.status != 206 or not content_range or int(content_range.group(1)) != first_byte:
+            raise DownloadError(f"the server didn't send back bytes {first_byte}-{last_byte}")
+
+        with open(part_filename, 'r+b') as part_file:
+            part_file.seek(first_byte)
+            while bytes_written < expected_bytes:
+                data = response.read(min(READ_SIZE, expected_bytes - bytes_written))
+                if not data:
+                    break
+                part_file.write(data)
+                bytes_written += len(data)
+
+    if bytes_written != expected_bytes:
+        raise DownloadError(f"only got {bytes_written} of the {expected_bytes} bytes in {first_byte}-{last_byte}")
+
+    metrics.increment("bytes_downloaded", bytes_written)
+    return bytes_written
+
+
+def download_chunk_with_retries(url: str, part_filename: str, first_byte: int, last_byte: int,
+                                retries: int = DEFAULT_RETRIES, timeout: float = DEFAULT_TIMEOUT_SECONDS) -> int:
+    '''
+    Same as download_chunk, but tries again (waiting a little longer each time) if the
+    connection drops or the server sends back something wrong.
+    '''
+    for attempt in range(retries + 1):
+        try:
+            with metrics.stage("download_chunk"):
+                return download_chunk(url, part_filename, first_byte, last_byte, timeout=timeout)
+        except (OSError, DownloadError):
+            if attempt == retries:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+
+def download_whole_file(url: str, part_filename: str, timeout: float = DEFAULT_TIMEOUT_SECONDS) -> int:
+    '''
+    Downloads the file in one go, for servers that don't do range requests.
+
+    Returns: int of how many bytes were written
+    '''
+    with urllib.request.urlopen(url, timeout=timeout) as response, open(part_filename, 'wb') as part_file:
+        shutil.copyfileobj(response, part_file, READ_SIZE)
+        bytes_written = part_file.tell()
+
+    metrics.increment("bytes_downloaded", bytes_written)
+    return bytes_written
+
+
+def download_file(url: str, filename: str, workers: int = DEFAULT_WORKERS, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  retries: int = DEFAULT_RETRIES, timeout: float = DEFAULT_TIMEOUT_SECONDS,
+                  expected_size: int = None) -> dict:
+    '''
+    This function downloads a file with parallel range requests, resuming from the
+    .part.json state file if an earlier download of it was interrupted.
+
+    Parameters:
+    url: str of the file's url (for YT videos, the stream's url from pytube)
+    filename: str of where to save the file
+    workers: how many chunks to download at the same time
+    chunk_size: how many bytes to ask for in each range request
+    retries: how many times to retry a chunk before giving up on the download
+    timeout: how many seconds to wait on the server for each request
+    expected_size: optional size the file should be (like pytube's stream.filesize), it's
+    checked against what the server says before anything is downloaded
+
+    Returns: dictionary with the "filename", "bytes" (size of the file), "downloaded_bytes"
+    (how much was downloaded this time), "resumed_bytes" (how much was already there from
+    last time), "chunks", "seconds" and "megabytes_per_second"
+    '''
+    start_time = time.perf_counter()
+    part_filename, state_filename = get_part_filenames(filename)
+
+    total_size, supports_ranges = get_remote_file_info(url, timeout=timeout)
+    if expected_size is not None and expected_size != total_size:
+        raise DownloadError(f"expected {expected_size} bytes but the server says the file is {total_size} bytes")
+
+    if supports_ranges and total_size > 0:
+        chunks = plan_chunks(total_size, chunk_size)
+        state = DownloadState.load(state_filename, total_size, chunk_size)
+        if not os.path.exists(part_filename):
+            state.completed_chunks = set()
+        preallocate_file(part_filename, total_size)
+
+        remaining_chunks = [chunk_number for chunk_number in range(len(chunks))
+                            if chunk_number not in state.completed_chunks]
+        resumed_bytes = total_size - sum(chunks[chunk_number][1] - chunks[chunk_number][0] + 1
+                                         for chunk_number in remaining_chunks)
+
+        def download_and_record(chunk_number):
+            first_byte, last_byte = chunks[chunk_number]
+            bytes_written = download_chunk_with_retries(url, part_filename, first_byte, last_byte,
+                                                        retries=retries, timeout=timeout)
+            state.mark_completed(chunk_number)
+            return bytes_written
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            downloaded_bytes = sum(executor.map(download_and_record, remaining_chunks))
+
+    elif total_size == 0:
+        # there's nothing to ask the server for, and a range request for an empty file would fail
+        chunks = []
+        resumed_bytes = downloaded_bytes = 0
+        open(part_filename, 'wb').close()
+
+    else:
+        chunks = [(0, total_size - 1)]
+        resumed_bytes = 0
+        downloaded_bytes = download_whole_file(url, part_filename, timeout=timeout)
+
+    with open(part_filename, 'rb+') as part_file:
+        os.fsync(part_file.fileno())
+        actual_size = os.fstat(part_file.fileno()).st_size
+    if actual_size != total_size:
+        raise DownloadError(f"{part_filename} is {actual_size} bytes but it should be {total_size} bytes")
+
+    os.replace(part_filename, filename)
+    if os.path.exists(state_filename):
+        os.remove(state_filename)
+
+    elapsed_seconds = time.perf_counter() - start_time
+    return {
+        "filename": filename,
+        "bytes": total_size,
+        "downloaded_bytes": downloaded_bytes,
+        "resumed_bytes": resumed_bytes,
+        "chunks": len(chunks),
+        "seconds": elapsed_seconds,
+        "megabytes_per_second": downloaded_bytes / 1_000_000 / elapsed_seconds if elapsed_seconds else 0.0,
+    }
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    '''
+    Python's built in file server, plus support for single "Range: bytes=first-last"
+    requests, so downloads can be tested against a local server.
+    '''
+
+    def send_head(self):
+        range_header = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if not range_header or not os.path.isfile(path):
+            return super().send_head()
+
+        range_match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header.strip())
+        file_size = os.path.getsize(path)
+        if not range_match or not any(range_match.groups()):
+            self.send_error(416, "Bad range")
+            return None
+
+        if range_match.group(1):
+            first_byte = int(range_match.group(1))
+            last_byte = min(int(range_match.group(2)), file_size - 1) if range_match.group(2) else file_size - 1
+        else:
+            first_byte = max(file_size - int(range_match.group(2)), 0)
+            last_byte = file_size - 1
+
+        if first_byte > last_byte or first_byte >= file_size:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{file_size}")
+            self.end_headers()
+            return None
+
+        served_file = open(path, 'rb')
+        served_file.seek(first_byte)
+        self.range_bytes_left = last_byte - first_byte + 1
+
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Range", f"bytes {first_byte}-{last_byte}/{file_size}")
+        self.send_header("Content-Length", str(self.range_bytes_left))
+        self.end_headers()
+        return served_file
+
+    def copyfile(self, source, outputfile):
+        bytes_left = getattr(self, "range_bytes_left", None)
+        if bytes_left is None:
+            return super().copyfile(source, outputfile)
+
+        self.range_bytes_left = None
+        while bytes_left > 0:
+            data = source.read(min(READ_SIZE, bytes_left))
+            if not data:
+                break
+            outputfile.write(data)
+            bytes_left -= len(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(folder: str, port: int = 8000, host: str = "127.0.0.1") -> http.server.ThreadingHTTPServer:
+    '''
+    Makes (but doesn't start) a local file server with range support for a folder.
+    Call serve_forever() on it, or run it in a thread.
+
+    Returns: the ThreadingHTTPServer
+    '''
+    def make_handler(*args, **kwargs):
+        return RangeRequestHandler(*args, directory=folder, **kwargs)
+
+    return http.server.ThreadingHTTPServer((host, port), make_handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download a file with parallel, resumable range requests.")
+    parser.add_argument("url", nargs="?", help="url of the file to download")
+    parser.add_argument("filename", nargs="?", help="where to save it")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="how many chunks to download at once")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="bytes per range request")
+    parser.add_argument("--serve", metavar="FOLDER", help="instead of downloading, serve this folder with range support")
+    parser.add_argument("--port", type=int, default=8000, help="port for --serve")
+    args = parser.parse_args()
+
+    if args.serve:
+        server = serve_directory(args.serve, port=args.port)
+        print(f"Serving {args.serve} at http://127.0.0.1:{args.port}/ (ctrl+c to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        return
+
+    if not args.url or not args.filename:
+        parser.error("a url and a filename are needed to download")
+
+    report = download_file(args.url, args.filename, workers=args.workers, chunk_size=args.chunk_size)
+    print(f'Saved {report["bytes"]:,} bytes to {report["filename"]} in {report["seconds"]:.2f}s '
+          f'({report["megabytes_per_second"]:.1f} MB/s, {report["resumed_bytes"]:,} bytes resumed '
+          f'from an earlier run)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+'''
+This module stores transcript segments in a compact binary file instead of as a json
+list of dicts. Every column gets its own packed array: float32 start times, float32
+durations, and all the segment text glued into one UTF-8 buffer with an array of
+offsets saying where each segment's text starts and ends.
+
+The files are read back with memory mapping, so opening even a 10 hour livestream is
+basically instant, and nothing is copied until you actually look at a segment. Since
+segments are in time order, getting every segment between two times is a binary search.
+
+File layout (native byte order):
+header    -> magic, segment count, text buffer length in bytes
+starts    -> segment count float32s
+durations -> segment count float32s
+offsets   -> segment count + 1 uint32s, segment i's text is text[offsets[i]:offsets[i+1]]
+text      -> every segment's text encoded as UTF-8, back to back
+'''
+import bisect
+import json
+import mmap
+import os
+import struct
+from array import array
+from typing import Iterable, Iterator
+
+
+SEGMENT_STORE_MAGIC = b'SEGS0001'
+SEGMENT_STORE_HEADER = struct.Struct('=8sQQ')
+FLOAT32 = struct.Struct('=f')
+
+
+def round_float32(value: float) -> float:
+    '''
+    The columns are float32, so 1.23 comes back out as 1.2300000190734863. This gives
+    back the shortest float that's stored as the same float32, so 1.23 comes out as 1.23.
+
+    Parameters:
+    value: float read out of one of the float32 columns
+
+    Returns: float with no more digits than the float32 actually holds
+    '''
+    packed_value = FLOAT32.pack(value)
+    for digits in range(1, 10):
+        rounded_value = float(f'{value:.{digits}g}')
+        if FLOAT32.pack(rounded_value) == packed_value:
+            return rounded_value
+    return value
+
+
+class Segment:
+    '''
+    One transcript segment. It only holds on to the store and its position in it, and
+    reads its values out of the store when you ask for them.
+    '''
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store: 'SegmentStore', index: int) -> None:
+        self.store = store
+        self.index = index
+
+    @property
+    def start(self) -> float:
+        return self.store.starts[self.index]
+
+    @property
+    def duration(self) -> float:
+        return self.store.durations[self.index]
+
+    @property
+    def text(self) -> str:
+        return self.store.get_text(self.index)
+
+    def to_dict(self) -> dict:
+        '''
+        Returns: the segment as a {"text", "start", "duration"} dict, like youtube_transcript_api gives us.
+        start and duration are rounded to what the float32 columns hold, so 1.23 stays 1.23.
+        '''
+        return {"text": self.text, "start": round_float32(self.start), "duration": round_float32(self.duration)}
+
+    def __repr__(self) -> str:
+        return f'Segment(start={self.start:.2f}, duration={self.duration:.2f}, text={self.text!r})'
+
+
+class SegmentStore:
+    '''
+    A read only, memory mapped segment file. Use len() and indexing like a list,
+    or slice_by_time to get the segments in a time range.
+
+    Parameters:
+    filename: str of the segment file to open
+    '''
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+
+        with open(filename, 'rb') as segment_file:
+            self.mapped_file = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, self.segment_count, text_length = SEGMENT_STORE_HEADER.unpack_from(self.mapped_file, 0)
+        except struct.error:
+            magic = None
+        if magic != SEGMENT_STORE_MAGIC:
+            self.mapped_file.close()
+            raise ValueError(f"{filename} is not a segment store file")
+
+        column_bytes = self.segment_count * 4
+        if len(self.mapped_file) < SEGMENT_STORE_HEADER.size + column_bytes * 3 + 4 + text_length:
+            self.mapped_file.close()
+            raise ValueError(f"{filename} is cut short, save it again")
+
+        memory = memoryview(self.mapped_file)
+        position = SEGMENT_STORE_HEADER.size
+
+        self.starts = memory[position:position + column_bytes].cast('f')
+        position += column_bytes
+        self.durations = memory[position:position + column_bytes].cast('f')
+        position += column_bytes
+        self.offsets = memory[position:position + column_bytes + 4].cast('I')
+        position += column_bytes + 4
+        self.text = memory[position:position + text_length]
+
+        if self.offsets[self.segment_count] != text_length:
+            self.close()
+            raise ValueError(f"{filename} has text offsets that don't match its text, save it again")
+
+    def __len__(self) -> int:
+        return self.segment_count
+
+    def __getitem__(self, index: int) -> Segment:
+        if index < 0:
+            index += self.segment_count
+        if not 0 <= index < self.segment_count:
+            raise IndexError("segment index out of range")
+        return Segment(self, index)
+
+    def __iter__(self) -> Iterator[Segment]:
+        return (Segment(self, index) for index in range(self.segment_count))
+
+    def get_text(self, index: int) -> str:
+        return str(self.text[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+    def get_index_range(self, start_seconds: float, end_seconds: float) -> range:
+        '''
+        Returns: range of the indexes of the segments that start between start_seconds
+        (inclusive) and end_seconds (exclusive).
+        '''
+        first = bisect.bisect_left(self.starts, start_seconds)
+        last = bisect.bisect_left(self.starts, end_seconds, lo=first)
+        return range(first, last)
+
+    def slice_by_time(self, start_seconds: float, end_seconds: float) -> list[Segment]:
+        '''
+        Returns: list of the segments that start between start_seconds (inclusive) and
+        end_seconds (exclusive). Only the matching segments are ever read from the file.
+        '''
+        return [Segment(self, index) for index in self.get_index_range(start_seconds, end_seconds)]
+
+    def get_text_buffer(self, start_seconds: float, end_seconds: float) -> memoryview:
+        '''
+        Returns: memoryview of the raw UTF-8 text of every segment in the time range, back
+        to back. This is a view straight into the file, nothing gets copied.
+        '''
+        index_range = self.get_index_range(start_seconds, end_seconds)
+        if not index_range:
+            return self.text[0:0]
+        return self.text[self.offsets[index_range.start]:self.offsets[index_range.stop]]
+
+    def get_text_between(self, start_seconds: float, end_seconds: float, separator: str = '\n') -> str:
+        '''
+        Returns: str of the text of every segment in the time range, joined with separator.
+        '''
+        return separator.join(self.get_text(index) for index in self.get_index_range(start_seconds, end_seconds))
+
+    def to_segments(self) -> list[dict]:
+        '''
+        Returns: list of all the segments as dicts, the same shape JSONFormatter works with.
+        '''
+        return [segment.to_dict() for segment in self]
+
+    def to_json(self) -> str:
+        '''
+        Returns: json str of all the segments. This is the same as JSONFormatter's output for
+        YT's millisecond times up to about 4.5 hours in, past that a float32 can't hold every
+        millisecond and times can come back off by one.
+        '''
+        return json.dumps(self.to_segments())
+
+    def close(self) -> None:
+        for view in (self.starts, self.durations, self.offsets, self.text):
+            view.release()
+        self.mapped_file.close()
+
+    def __enter__(self) -> 'SegmentStore':
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        self.close()
+
+
+def write_segment_store(filename: str, segments: Iterable[dict]) -> int:
+    '''
+    This function saves transcript segments to a segment store file (through a temp file,
+    so it's never half written). Segments should be in time order, like YT gives them.
+
+    Parameters:
+    filename: str of the file to save the segments to
+    segments: any iterable of {"text", "start", "duration"} segment dicts
+
+    Returns: int of how many segments were saved
+    '''
+    starts = array('f')
+    durations = array('f')
+    offsets = array('I', [0])
+    encoded_texts = []
+
+    for segment in segments:
+        encoded_text = segment["text"].encode()
+        starts.append(segment["start"])
+        durations.append(segment["duration"])
+        offsets.append(offsets[-1] + len(encoded_text))
+        encoded_texts.append(encoded_text)
+
+    temp_filename = f'{filename}.{os.getpid()}.tmp'
+    with open(temp_filename, 'wb') as segment_file:
+        segment_file.write(SEGMENT_STORE_HEADER.pack(SEGMENT_STORE_MAGIC, len(starts), offsets[-1]))
+        starts.tofile(segment_file)
+        durations.tofile(segment_file)
+        offsets.tofile(segment_file)
+        segment_file.write(b''.join(encoded_texts))
+
+    os.replace(temp_filename, filename)
+    return len(starts)
+
+
+def convert_json_to_segment_store(json_string: str, filename: str) -> int:
+    '''
+    Converts JSONFormatter output (or a transcription_text jsonb value) to a segment store file.
+
+    Parameters:
+    json_string: json str of a list of segment dicts
+    filename: str of the file to save the segments to
+
+    Returns: int of how many segments were saved
+    '''
+    return write_segment_store(filename, json.loads(json_string))
@@ -0,0 +1,145 @@
+'''
+This module is a SQLite stand-in for the PostgreSQL Database class in database.py. It
+has the same methods, so anything that logs rows (like db_writer.DatabaseWriter) can
+be tried out and tested without a PostgreSQL server, or without psycopg2 installed.
+
+PostgreSQL only column types are stored as plain SQLite types: jsonb and arrays like
+text[] become TEXT, which is what the json strings we log already are, and list values
+(like a video's tags) are saved as json text too.
+'''
+import json
+import sqlite3
+
+import utils
+from instrumentation import metrics
+
+
+def parse_dictionary_for_sqlite_columns(columns_dict: dict[str, str]) -> str:
+    '''
+    Like utils.parse_dictionary_for_column_data, but for SQLite: the "table_name" key is
+    skipped and PostgreSQL types SQLite doesn't have are changed to TEXT.
+
+    Returns: str like "(id text, part_number integer, transcription_text TEXT)"
+    '''
+    columns = []
+    for column_name, column_type in columns_dict.items():
+        if column_name == "table_name":
+            continue
+        if column_type.endswith("[]") or column_type in ("json", "jsonb"):
+            column_type = "TEXT"
+        columns.append(f"{column_name} {column_type}")
+    return "(" + ", ".join(columns) + ")"
+
+
+def adapt_row(row: tuple) -> tuple:
+    '''
+    Returns: the row with any lists or dicts (like the tags column) turned into json text,
+    since SQLite has no array or json types.
+    '''
+    return tuple(json.dumps(value) if isinstance(value, (list, dict)) else value for value in row)
+
+
+class SQLiteDatabase:
+    '''
+    Parameters:
+    filename: str of the SQLite file to use, or ":memory:" for a database that only
+    lives as long as this object
+    '''
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        # the writer thread uses the connection, not the thread that made it
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+
+    def build_database_table(self, table_name: str, column_dict: dict) -> None:
+        self.cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} {parse_dictionary_for_sqlite_columns(column_dict)}")
+        self.conn.commit()
+
+    def log_to_DB(self, formatted_tuple: tuple, table_to_add_values_to: str):
+        """
+        Logs one row and commits it, like Database.log_to_DB.
+        """
+        if formatted_tuple:
+            formatted_string = utils.format_tuple_into_string(formatted_tuple, placeholder="?")
+            with metrics.stage("db_insert"):
+                self.cursor.execute(f'INSERT INTO {table_to_add_values_to} VALUES {formatted_string}',
+                                    adapt_row(formatted_tuple))
+                self.conn.commit()
+            metrics.increment("db_rows")
+
+    def log_many_to_DB(self, rows, table_to_add_values_to: str, batch_size: int = 1000) -> int:
+        """
+        Logs rows in batches of batch_size with one commit per batch, like Database.log_many_to_DB.
+
+        Returns: int of how many rows were logged.
+        """
+        rows_logged = 0
+        batch = []
+
+        for row in rows:
+            if not row:
+                continue
+
+            batch.append(row)
+            if len(batch) >= batch_size:
+                rows_logged += self.log_batch_to_DB(batch, table_to_add_values_to)
+                batch = []
+
+        if batch:
+            rows_logged += self.log_batch_to_DB(batch, table_to_add_values_to)
+
+        return rows_logged
+
+    def log_batch_to_DB(self, batch: list[tuple], table_to_add_values_to: str) -> int:
+        """
+        Inserts one batch of rows in a single transaction. If anything goes wrong the
+        batch is rolled back, like Database.log_batch_to_DB.
+
+        Returns: int of how many rows were logged.
+        """
+        formatted_string = utils.format_tuple_into_string(batch[0], placeholder="?")
+        try:
+            with metrics.stage("db_insert"):
+                self.cursor.executemany(f'INSERT INTO {table_to_add_values_to} VALUES {formatted_string}',
+                                        map(adapt_row, batch))
+                self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+        metrics.increment("db_rows", len(batch))
+        return len(batch)
+
+    def log_batches_to_DB(self, batches: dict[str, list[tuple]]) -> int:
+        """
+        Logs rows to more than one table in a single transaction, like Database.log_batches_to_DB.
+
+        Returns: int of how many rows were logged.
+        """
+        try:
+            with metrics.stage("db_insert"):
+                for table_name, batch in batches.items():
+                    if batch:
+                        formatted_string = utils.format_tuple_into_string(batch[0], placeholder="?")
+                        self.cursor.executemany(f'INSERT INTO {table_name} VALUES {formatted_string}',
+                                                map(adapt_row, batch))
+                self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+        row_count = sum(len(batch) for batch in batches.values())
+        metrics.increment("db_rows", row_count)
+        return row_count
+
+    def get_existing_ids(self, table_name: str, id_column: str = "id") -> set[str]:
+        """
+        Returns: set of every id already in a table, like Database.get_existing_ids.
+        """
+        self.cursor.execute(f'SELECT DISTINCT {id_column} FROM {table_name}')
+        return {row[0] for row in self.cursor.fetchall()}
+
+    def close(self) -> None:
+        self.cursor.close()
+        self.conn.close()
@@ -0,0 +1,298 @@
+'''
+This module picks which of a video's streams to download, so we don't always grab the
+highest resolution when we only need the audio (to transcribe videos that have no
+captions) or a small preview.
+
+The policies are:
+highest_resolution         -> the biggest video + audio stream, what download_video always did
+audio_only                 -> the smallest audio only stream, plenty for transcribing
+smallest_above_resolution  -> the smallest video + audio stream that's at least min_resolution
+max_bytes                  -> the highest resolution video + audio stream that fits in max_bytes
+
+Stream sizes are estimated from pytube's stream info (bitrate x duration) whenever it can,
+so a whole batch can be planned, and held to a total byte budget, before anything is
+downloaded.
+
+Usage:
+python stream_selection.py urls.txt --policy audio_only --budget 2000000000 --plan-only
+python stream_selection.py urls.txt --policy smallest_above_resolution --min-resolution 360 --output-dir videos
+'''
+import argparse
+import os
+import re
+
+from batch_transcription import read_urls_from_file
+from parallel_download import DEFAULT_WORKERS, download_file, get_remote_file_info
+from text_normalization import remove_special_characters_from_string
+
+
+STREAM_POLICIES = ("highest_resolution", "audio_only", "smallest_above_resolution", "max_bytes")
+DEFAULT_MIN_RESOLUTION = 360
+
+RESOLUTION_PATTERN = re.compile(r'(\d+)p')
+BITRATE_PATTERN = re.compile(r'(\d+)kbps')
+
+
+def parse_resolution(resolution: str) -> int:
+    '''
+    Returns: int of the lines in a pytube resolution like "720p" (0 if there isn't one)
+    '''
+    match = RESOLUTION_PATTERN.match(resolution or '')
+    return int(match.group(1)) if match else 0
+
+
+def parse_bitrate(bitrate: str) -> int:
+    '''
+    Returns: int of the kbps in a pytube audio bitrate like "128kbps" (0 if there isn't one)
+    '''
+    match = BITRATE_PATTERN.match(bitrate or '')
+    return int(match.group(1)) if match else 0
+
+
+def estimate_stream_bytes(stream) -> int:
+    '''
+    This function guesses how big a stream is without downloading it. pytube's
+    filesize_approx works it out from the bitrate and video length with no network
+    call, so that's used when it's there. Otherwise we fall back to filesize, which
+    asks YT.
+
+    Parameters:
+    stream: a pytube Stream (or anything with the same attributes)
+
+    Returns: int of the estimated size in bytes
+    '''
+    approximate_size = getattr(stream, "filesize_approx", None)
+    if approximate_size:
+        return int(approximate_size)
+    return int(stream.filesize)
+
+
+def is_audio_only(stream) -> bool:
+    return stream.includes_audio_track and not stream.includes_video_track
+
+
+def is_video_with_audio(stream) -> bool:
+    return stream.includes_audio_track and stream.includes_video_track
+
+
+def select_stream(streams, policy: str = "highest_resolution", min_resolution: int = DEFAULT_MIN_RESOLUTION,
+                  max_bytes: int = None):
+    '''
+    This function picks one stream out of a video's streams with the given policy.
+
+    Parameters:
+    streams: the video's streams, like YouTube(url).streams
+    policy: one of STREAM_POLICIES
+    min_resolution: lowest resolution (like 360 for 360p) for smallest_above_resolution.
+    If no stream is that good, the highest resolution one there is gets picked instead.
+    max_bytes: biggest stream size allowed, for the max_bytes policy
+
+    Returns: the picked stream, or None if there's no stream that fits the policy
+    '''
+    if policy not in STREAM_POLICIES:
+        raise ValueError(f"I don't know the stream policy {policy}, please use one of these: "
+                         f"{', '.join(STREAM_POLICIES)}")
+
+    if policy == "audio_only":
+        audio_streams = [stream for stream in streams if is_audio_only(stream)]
+        return min(audio_streams, key=lambda stream: (estimate_stream_bytes(stream), parse_bitrate(stream.abr)),
+                   default=None)
+
+    video_streams = [stream for stream in streams if is_video_with_audio(stream)]
+    if not video_streams:
+        return None
+
+    def by_resolution_then_smallest(stream):
+        return parse_resolution(stream.resolution), -estimate_stream_bytes(stream)
+
+    if policy == "highest_resolution":
+        return max(video_streams, key=by_resolution_then_smallest)
+
+    if policy == "smallest_above_resolution":
+        good_enough_streams = [stream for stream in video_streams
+                               if parse_resolution(stream.resolution) >= min_resolution]
+        if not good_enough_streams:
+            return max(video_streams, key=by_resolution_then_smallest)
+        return min(good_enough_streams, key=estimate_stream_bytes)
+
+    if max_bytes is None:
+        raise ValueError("the max_bytes policy needs max_bytes")
+    fitting_streams = [stream for stream in video_streams if estimate_stream_bytes(stream) <= max_bytes]
+    return max(fitting_streams, key=by_resolution_then_smallest, default=None)
+
+
+def get_file_extension(stream) -> str:
+    '''
+    Returns: the file extension for a stream, like ".mp4", ".webm", or ".m4a" for mp4 audio
+    '''
+    if is_audio_only(stream) and stream.subtype == "mp4":
+        return ".m4a"
+    return "." + stream.subtype
+
+
+def get_video(video_url: str):
+    '''
+    Returns: pytube YouTube object for a url. pytube is only imported once it's needed.
+    '''
+    from pytube import YouTube
+
+    return YouTube(video_url)
+
+
+def plan_downloads(video_urls: list[str], policy: str = "highest_resolution",
+                   min_resolution: int = DEFAULT_MIN_RESOLUTION, max_bytes: int = None,
+                   byte_budget: int = None, get_video=get_video) -> dict:
+    '''
+    This function picks a stream for every video and adds up how many bytes the whole
+    batch will be, before anything is downloaded. If there's a byte budget, videos are
+    taken in order until the next one wouldn't fit, and that one is skipped (smaller
+    ones after it can still fit).
+
+    Parameters:
+    video_urls: list of YT video urls
+    policy: one of STREAM_POLICIES
+    min_resolution: lowest resolution for the smallest_above_resolution policy
+    max_bytes: biggest size allowed for any one stream, for the max_bytes policy
+    byte_budget: optional most bytes the whole batch is allowed to download
+    get_video: function that takes a url and returns a pytube YouTube object (or
+    anything with .title, .video_id and .streams)
+
+    Returns: dictionary with "videos" (one dict per url with "url", "video_id", "title",
+    "stream", "itag", "resolution", "abr", "estimated_bytes", "selected" and "reason"),
+    "planned_bytes" (total of the selected videos) and "byte_budget"
+    '''
+    planned_videos = []
+    planned_bytes = 0
+
+    for video_url in video_urls:
+        planned_video = {"url": video_url, "video_id": None, "title": None, "stream": None, "itag": None,
+                         "resolution": None, "abr": None, "estimated_bytes": 0, "selected": False, "reason": None}
+        planned_videos.append(planned_video)
+
+        try:
+            video = get_video(video_url)
+            planned_video["video_id"] = video.video_id
+            planned_video["title"] = video.title
+            stream = select_stream(video.streams, policy, min_resolution=min_resolution, max_bytes=max_bytes)
+        except Exception as error:
+            planned_video["reason"] = f"{type(error).__name__}: {error}"
+            continue
+
+        if stream is None:
+            planned_video["reason"] = f"no stream fits the {policy} policy"
+            continue
+
+        estimated_bytes = estimate_stream_bytes(stream)
+        planned_video.update(stream=stream, itag=stream.itag, resolution=stream.resolution, abr=stream.abr,
+                             estimated_bytes=estimated_bytes)
+
+        if byte_budget is not None and planned_bytes + estimated_bytes > byte_budget:
+            planned_video["reason"] = "over the byte budget"
+            continue
+
+        planned_video["selected"] = True
+        planned_bytes += estimated_bytes
+
+    return {"videos": planned_videos, "planned_bytes": planned_bytes, "byte_budget": byte_budget}
+
+
+def download_planned_videos(plan: dict, output_dir: str, workers: int = DEFAULT_WORKERS, on_result=None) -> dict:
+    '''
+    This function downloads every selected video in a plan from plan_downloads. Since
+    the estimates can be a little off, the real size of each stream is asked for right
+    before it's downloaded, and anything that would go over the byte budget is skipped.
+
+    Parameters:
+    plan: dictionary from plan_downloads
+    output_dir: str of the folder to save the videos in (it's created if needed)
+    workers: how many chunks of each video to download at the same time
+    on_result: optional function that gets called with each video's result as soon as it's done
+
+    Returns: dictionary with "results" (one dict per selected video with "url", "filename",
+    "bytes", "success", "skipped" and "error"), "downloaded_bytes" and "byte_budget"
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    byte_budget = plan["byte_budget"]
+    downloaded_bytes = 0
+    results = []
+
+    for planned_video in plan["videos"]:
+        if not planned_video["selected"]:
+            continue
+
+        stream = planned_video["stream"]
+        file_friendly_title = remove_special_characters_from_string(planned_video["title"])
+        filename = os.path.join(output_dir, f'{file_friendly_title}_{planned_video["video_id"]}'
+                                            f'{get_file_extension(stream)}')
+        result = {"url": planned_video["url"], "filename": filename, "bytes": 0,
+                  "success": False, "skipped": False, "error": None}
+
+        try:
+            stream_bytes = get_remote_file_info(stream.url)[0] if byte_budget is not None else None
+
+            if stream_bytes is not None and downloaded_bytes + stream_bytes > byte_budget:
+                result["skipped"] = True
+                result["error"] = "over the byte budget"
+            else:
+                report = download_file(stream.url, filename, workers=workers, expected_size=stream_bytes)
+                result["bytes"] = report["bytes"]
+                result["success"] = True
+                downloaded_bytes += report["bytes"]
+
+        except Exception as error:
+            result["error"] = f"{type(error).__name__}: {error}"
+
+        results.append(result)
+        if on_result:
+            on_result(result)
+
+    return {"results": results, "downloaded_bytes": downloaded_bytes, "byte_budget": byte_budget}
+
+
+def print_plan(plan: dict) -> None:
+    for planned_video in plan["videos"]:
+        quality = planned_video["resolution"] or planned_video["abr"] or '-'
+        status = "download" if planned_video["selected"] else "skip"
+        print(f'[{status:<8}] {planned_video["url"]} {quality:>8} {planned_video["estimated_bytes"] / 1_000_000:>9.1f} MB'
+              + (f' ({planned_video["reason"]})' if planned_video["reason"] else ''))
+
+    budget = f' of a {plan["byte_budget"] / 1_000_000:.1f} MB budget' if plan["byte_budget"] is not None else ''
+    print(f'\nPlanned {plan["planned_bytes"] / 1_000_000:.1f} MB{budget}')
+
+
+def print_download_result(result: dict) -> None:
+    if result["skipped"]:
+        print(f'[skip]   {result["url"]}: {result["error"]}')
+    elif result["success"]:
+        print(f'[ok]     {result["url"]} -> {result["filename"]} ({result["bytes"] / 1_000_000:.1f} MB)')
+    else:
+        print(f'[failed] {result["url"]}: {result["error"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download a batch of YT videos, picking streams by policy.")
+    parser.add_argument("source", help="txt file with one url per line, or a single video url")
+    parser.add_argument("--policy", choices=STREAM_POLICIES, default="highest_resolution")
+    parser.add_argument("--min-resolution", type=int, default=DEFAULT_MIN_RESOLUTION,
+                        help="lowest resolution for smallest_above_resolution, like 360")
+    parser.add_argument("--max-bytes", type=int, default=None, help="biggest stream allowed for the max_bytes policy")
+    parser.add_argument("--budget", type=int, default=None, help="most bytes to download for the whole batch")
+    parser.add_argument("--output-dir", default="videos", help="where to save the videos")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="chunks to download at once per video")
+    parser.add_argument("--plan-only", action="store_true", help="just print the plan and estimated bytes")
+    args = parser.parse_args()
+
+    video_urls = read_urls_from_file(args.source) if os.path.isfile(args.source) else [args.source]
+    plan = plan_downloads(video_urls, policy=args.policy, min_resolution=args.min_resolution,
+                          max_bytes=args.max_bytes, byte_budget=args.budget)
+    print_plan(plan)
+    if args.plan_only:
+        return
+
+    print()
+    report = download_planned_videos(plan, args.output_dir, workers=args.workers, on_result=print_download_result)
+    print(f'\nDownloaded {report["downloaded_bytes"] / 1_000_000:.1f} MB')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import sqlite3
+
+import cli
+
+
+def test_rerun_with_existing_skip_logs_each_transcript_once(tmp_path):
+    sqlite_db = str(tmp_path / "transcripts.sqlite3")
+    arguments = ["transcribe", "AAAAAAAAAAA", "BBBBBBBBBBB", "--output-dir", str(tmp_path / "transcripts"),
+                 "--format", "json", "--existing", "skip", "--fake-latency", "0", "--sqlite-db", sqlite_db,
+                 "--create-tables"]
+
+    assert cli.main(arguments) == 0
+    assert cli.main(arguments) == 0
+
+    conn = sqlite3.connect(sqlite_db)
+    rows = conn.execute("SELECT id, COUNT(*) FROM transcription_data GROUP BY id ORDER BY id").fetchall()
+    conn.close()
+    assert rows == [("AAAAAAAAAAA", 1), ("BBBBBBBBBBB", 1)]
@@ -0,0 +1,82 @@
+'''
+Makes sure cli.py keeps starting up fast, since cron jobs spawn thousands of these. For
+each command it checks two things, in a fresh python process:
+1. it finishes within its time budget (best of a few runs)
+2. it doesn't import any of the heavy libraries it has no business importing
+
+On a slow machine, set STARTUP_BUDGET_SCALE (like 2) to multiply every budget.
+'''
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI_FILENAME = os.path.join(REPO_FOLDER, "cli.py")
+SAMPLE_TRANSCRIPT = os.path.join(REPO_FOLDER, "ISTA 130 Intro to Python Midterm Review.txt")
+
+BUDGET_SCALE = float(os.environ.get("STARTUP_BUDGET_SCALE", "1"))
+RUNS = 5
+
+HEAVY_MODULES = ("pytube", "youtube_transcript_api", "matplotlib", "psycopg2", "numpy", "config")
+
+# (cli arguments, time budget in seconds, heavy modules it's allowed to import)
+STARTUP_CASES = {
+    "--help": (["--help"], 0.3, ()),
+    "analyze --help": (["analyze", "--help"], 0.3, ()),
+    "analyze file": (["analyze", SAMPLE_TRANSCRIPT, "--top", "5"], 0.6, ()),
+}
+
+# runs cli.py in this process and then prints which heavy modules ended up imported
+MODULE_CHECK_CODE = '''
+import runpy, sys
+sys.argv = {argv!r}
+try:
+    runpy.run_path({cli!r}, run_name="__main__")
+except SystemExit:
+    pass
+heavy_modules = {heavy!r}
+print(",".join(name for name in heavy_modules if name in sys.modules), file=sys.stderr)
+'''
+
+
+def time_command(cli_arguments: list[str], runs: int) -> float:
+    '''
+    Returns: the fastest wall clock time (in seconds) of running cli.py with these arguments
+    '''
+    best_time = float('inf')
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, CLI_FILENAME, *cli_arguments], cwd=REPO_FOLDER,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time
+
+
+def get_heavy_imports(cli_arguments: list[str]) -> list[str]:
+    '''
+    Returns: list of the heavy modules that got imported while running cli.py with these arguments
+    '''
+    code = MODULE_CHECK_CODE.format(argv=[CLI_FILENAME, *cli_arguments], cli=CLI_FILENAME, heavy=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=REPO_FOLDER, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.PIPE, text=True, check=True)
+    last_line = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else ''
+    return [name for name in last_line.split(',') if name]
+
+
+@pytest.mark.parametrize("name", STARTUP_CASES)
+def test_command_starts_within_its_budget(name):
+    cli_arguments, budget_seconds, _ = STARTUP_CASES[name]
+    budget_seconds *= BUDGET_SCALE
+    best_time = time_command(cli_arguments, RUNS)
+    assert best_time <= budget_seconds, f"{name} took {best_time * 1000:.0f}ms (budget {budget_seconds * 1000:.0f}ms)"
+
+
+@pytest.mark.parametrize("name", STARTUP_CASES)
+def test_command_does_not_import_heavy_modules(name):
+    cli_arguments, _, allowed_modules = STARTUP_CASES[name]
+    unexpected_modules = [module for module in get_heavy_imports(cli_arguments) if module not in allowed_modules]
+    assert not unexpected_modules, f"{name} imported {', '.join(unexpected_modules)}"
@@ -0,0 +1,20 @@
+from corpus_analytics import find_transcript_files, read_word_table, update_corpus
+
+
+def test_same_named_transcripts_in_different_folders_keep_separate_tables(tmp_path):
+    corpus = tmp_path / "corpus"
+    (corpus / "a").mkdir(parents=True)
+    (corpus / "b").mkdir()
+    (corpus / "a" / "t.txt").write_text("apple apple apple ")
+    (corpus / "b" / "t.txt").write_text("banana ")
+    output_dir = str(tmp_path / "tables")
+
+    report = update_corpus(find_transcript_files(str(corpus)), output_dir, workers=1)
+    assert report["word_counts"] == {"apple": 3, "banana": 1}
+
+    (corpus / "b" / "t.txt").unlink()
+    (corpus / "a" / "t.txt").write_text("cherry ")
+    report = update_corpus(find_transcript_files(str(corpus)), output_dir, workers=1)
+
+    assert report["word_counts"] == {"cherry": 1}
+    assert read_word_table(str(tmp_path / "tables" / "corpus_word_counts.csv")) == {"cherry": 1}
@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+
+import pytest
+
+import db_dictionaries
+from db_writer import DatabaseWriter
+from sqlite_database import SQLiteDatabase
+
+
+TABLE_NAME = db_dictionaries.video_transcription_data["table_name"]
+
+
+class RecordingDatabase(SQLiteDatabase):
+    '''
+    Remembers the size of every batch it's sent, and waits for release before writing
+    anything, so a test can hold the writer thread up.
+    '''
+
+    def __init__(self, filename: str) -> None:
+        super().__init__(filename)
+        self.build_database_table(table_name=TABLE_NAME, column_dict=db_dictionaries.video_transcription_data)
+        self.batch_sizes = []
+        self.release = threading.Event()
+        self.release.set()
+        self.waiting = threading.Event()
+
+    def log_batch_to_DB(self, batch: list[tuple], table_to_add_values_to: str) -> int:
+        self.waiting.set()
+        self.release.wait()
+        self.batch_sizes.append(len(batch))
+        return super().log_batch_to_DB(batch, table_to_add_values_to)
+
+    def count_rows(self) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0]
+
+
+def make_row(number: int) -> tuple:
+    return (f"vid{number:08d}", 1, '[{"text": "hi", "start": 0.0, "duration": 1.0}]')
+
+
+def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def database(tmp_path):
+    return RecordingDatabase(str(tmp_path / "transcripts.sqlite3"))
+
+
+def test_full_batches_are_sent_as_soon_as_they_fill_up(database):
+    writer = DatabaseWriter(database, TABLE_NAME, batch_size=10, flush_interval_seconds=60,
+                            close_database=False)
+    writer.write_many(make_row(number) for number in range(25))
+    wait_for(lambda: writer.report()["rows_written"] == 20)
+    assert database.batch_sizes == [10, 10]
+
+    report = writer.close()
+    assert database.batch_sizes == [10, 10, 5]
+    assert report["rows_queued"] == report["rows_written"] == database.count_rows() == 25
+    assert report["rows_failed"] == report["rows_pending"] == 0
+    assert report["transactions"] == 3
+
+
+def test_a_partial_batch_is_sent_once_its_oldest_row_has_waited_long_enough(database):
+    writer = DatabaseWriter(database, TABLE_NAME, batch_size=100, flush_interval_seconds=0.05,
+                            close_database=False)
+    start_time = time.monotonic()
+    writer.write_many(make_row(number) for number in range(3))
+
+    wait_for(lambda: writer.report()["rows_written"] == 3)
+    assert time.monotonic() - start_time >= 0.05
+    assert database.batch_sizes == [3]
+    writer.close()
+
+
+def test_write_waits_for_room_and_gives_up_after_its_timeout(database):
+    database.release.clear()
+    writer = DatabaseWriter(database, TABLE_NAME, batch_size=1, max_queue_size=2, close_database=False)
+
+    # the first row gets taken off the queue and held up in the database, the next two fill the queue
+    writer.write(make_row(0))
+    database.waiting.wait(timeout=5)
+    writer.write(make_row(1))
+    writer.write(make_row(2))
+
+    with pytest.raises(queue.Full):
+        writer.write(make_row(3), timeout=0.05)
+
+    blocked_write = threading.Thread(target=writer.write, args=(make_row(4),))
+    blocked_write.start()
+    blocked_write.join(timeout=0.1)
+    assert blocked_write.is_alive()
+
+    database.release.set()
+    blocked_write.join(timeout=5)
+    assert not blocked_write.is_alive()
+
+    report = writer.close()
+    assert report["rows_queued"] == report["rows_written"] == database.count_rows() == 4
+    assert report["blocked_writes"] == 2
+    assert report["blocked_seconds"] > 0
+
+
+def test_a_bad_row_fails_alone_and_the_rest_of_its_batch_is_committed(database):
+    committed = {}
+    writer = DatabaseWriter(database, TABLE_NAME, batch_size=5, flush_interval_seconds=60, close_database=False)
+    for number in range(5):
+        # one value short of the table's columns
+        row = ("broken", 1) if number == 2 else make_row(number)
+        writer.write(row, on_done=lambda was_committed, number=number: committed.setdefault(number, was_committed))
+
+    report = writer.close()
+    assert report["rows_queued"] == 5
+    assert report["rows_written"] == database.count_rows() == 4
+    assert report["rows_failed"] == 1
+    assert report["rows_pending"] == 0
+    assert len(report["errors"]) == 1 and report["errors"][0].startswith(TABLE_NAME)
+    assert committed == {0: True, 1: True, 2: False, 3: True, 4: True}
+
+
+def test_close_writes_what_is_left_and_can_be_called_again(tmp_path):
+    database = RecordingDatabase(str(tmp_path / "transcripts.sqlite3"))
+    writer = DatabaseWriter(database, TABLE_NAME, batch_size=1000, flush_interval_seconds=60)
+    writer.write_many(make_row(number) for number in range(7))
+
+    report = writer.close()
+    assert report["rows_written"] == 7
+    assert writer.close()["rows_written"] == 7
+    with pytest.raises(RuntimeError):
+        writer.write(make_row(8))
+
+    reopened = SQLiteDatabase(database.filename)
+    assert reopened.conn.execute(f"SELECT COUNT(*) FROM {TABLE_NAME}").fetchone()[0] == 7
+    reopened.close()
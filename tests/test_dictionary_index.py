@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from dictionary_index import DictionaryIndex, build_dictionary_index, load_dictionary_index
+
+
+@pytest.fixture
+def word_list(tmp_path):
+    source_filename = tmp_path / 'words.txt'
+    source_filename.write_text('apple\nbanana\ncherry\n')
+    return str(source_filename)
+
+
+@pytest.mark.parametrize('kept_bytes', [0, 10, 40, 45, -3])
+def test_cut_short_index_is_rebuilt(word_list, kept_bytes):
+    index_filename = build_dictionary_index(word_list)
+    with open(index_filename, 'rb') as index_file:
+        index_bytes = index_file.read()
+    with open(index_filename, 'wb') as index_file:
+        index_file.write(index_bytes[:kept_bytes])
+
+    if kept_bytes:
+        with pytest.raises(ValueError):
+            DictionaryIndex(index_filename)
+
+    index = load_dictionary_index(word_list)
+    try:
+        assert 'banana' in index
+        assert 'durian' not in index
+        assert os.path.getsize(index_filename) == len(index_bytes)
+    finally:
+        index.close()
@@ -0,0 +1,137 @@
+import collections
+import threading
+
+import pytest
+
+import db_dictionaries
+from batch_transcription import FakeProvider
+from ingest_queue import FAILED, STORED, TRANSCRIBED, IngestQueue, run_ingest_queue
+from sqlite_database import SQLiteDatabase
+
+
+VIDEO_IDS = [f"vid{number:08d}" for number in range(30)]
+
+
+class SimulatedCrash(BaseException):
+    '''
+    Not an Exception, so nothing in the queue catches it, like the process getting killed.
+    '''
+
+
+class CountingProvider(FakeProvider):
+    '''
+    Counts every call, and crashes once crash_after transcripts have been fetched.
+    '''
+
+    def __init__(self, crash_after: int = None, failing_video_ids: set[str] = None) -> None:
+        super().__init__(latency_seconds=0, segment_count=5, failing_video_ids=failing_video_ids)
+        self.crash_after = crash_after
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+
+    def get_video_info(self, video_id: str) -> dict:
+        with self.lock:
+            self.calls["info", video_id] += 1
+        return super().get_video_info(video_id)
+
+    def get_transcript(self, video_id: str, language: str = "en") -> list[dict]:
+        with self.lock:
+            self.calls["transcript", video_id] += 1
+            if self.crash_after is not None and sum(count for (kind, _), count in self.calls.items()
+                                                    if kind == "transcript") > self.crash_after:
+                raise SimulatedCrash()
+        return super().get_transcript(video_id)
+
+
+class CrashAfterCommitDatabase(SQLiteDatabase):
+    '''
+    Commits the first batch and then crashes, before the queue hears that it was stored.
+    '''
+
+    crashed = False
+
+    def log_batches_to_DB(self, batches: dict[str, list[tuple]]) -> int:
+        row_count = super().log_batches_to_DB(batches)
+        if not self.crashed:
+            self.crashed = True
+            raise SimulatedCrash()
+        return row_count
+
+
+def open_database(filename: str, database_class=SQLiteDatabase) -> SQLiteDatabase:
+    database = database_class(filename)
+    for column_dict in (db_dictionaries.video_metadata, db_dictionaries.video_transcription_data):
+        database.build_database_table(table_name=column_dict["table_name"], column_dict=column_dict)
+    return database
+
+
+def get_row_counts(database: SQLiteDatabase) -> dict[str, tuple[int, int]]:
+    return {table_name: database.conn.execute(f"SELECT COUNT(*), COUNT(DISTINCT id) FROM {table_name}").fetchone()
+            for table_name in ("video_info", "transcription_data")}
+
+
+def test_resume_after_crash_finishes_without_refetching_or_duplicates(tmp_path):
+    queue_filename = str(tmp_path / "jobs.sqlite3")
+    database = open_database(str(tmp_path / "transcripts.sqlite3"))
+
+    with IngestQueue(queue_filename) as job_queue:
+        job_queue.add(VIDEO_IDS)
+        crashing_provider = CountingProvider(crash_after=12)
+        with pytest.raises(SimulatedCrash):
+            run_ingest_queue(job_queue, crashing_provider, database, workers=4, store_batch_size=5)
+        counts_at_crash = job_queue.counts()
+        fetched_before_crash = {video_id for video_id in VIDEO_IDS
+                                if job_queue.get_job(video_id)["state"] in (TRANSCRIBED, STORED)}
+
+    assert 0 < counts_at_crash[STORED] < len(VIDEO_IDS)
+
+    with IngestQueue(queue_filename) as job_queue:
+        provider = CountingProvider()
+        summary = run_ingest_queue(job_queue, provider, database, workers=4, store_batch_size=5)
+
+    assert summary["counts"][STORED] == len(VIDEO_IDS)
+    assert get_row_counts(database) == {"video_info": (30, 30), "transcription_data": (30, 30)}
+
+    # nothing that was already fetched before the crash is fetched again
+    for video_id in fetched_before_crash:
+        assert provider.calls["info", video_id] == 0
+        assert provider.calls["transcript", video_id] == 0
+    for video_id in set(VIDEO_IDS) - fetched_before_crash:
+        assert provider.calls["transcript", video_id] == 1
+    database.close()
+
+
+def test_crash_between_commit_and_mark_stored_is_skipped_on_resume(tmp_path):
+    queue_filename = str(tmp_path / "jobs.sqlite3")
+    database_filename = str(tmp_path / "transcripts.sqlite3")
+
+    crashing_database = open_database(database_filename, CrashAfterCommitDatabase)
+    with IngestQueue(queue_filename) as job_queue:
+        job_queue.add(VIDEO_IDS)
+        with pytest.raises(SimulatedCrash):
+            run_ingest_queue(job_queue, CountingProvider(), crashing_database, workers=4, store_batch_size=5)
+        assert job_queue.counts()[STORED] == 0
+        assert job_queue.counts()[TRANSCRIBED] > 0
+    crashing_database.close()
+
+    database = open_database(database_filename)
+    with IngestQueue(queue_filename) as job_queue:
+        summary = run_ingest_queue(job_queue, CountingProvider(), database, workers=4, store_batch_size=5)
+
+    assert summary["already_stored"] == 5
+    assert summary["counts"][STORED] == len(VIDEO_IDS)
+    assert get_row_counts(database) == {"video_info": (30, 30), "transcription_data": (30, 30)}
+    database.close()
+
+
+def test_failures_back_off_and_end_up_failed(tmp_path):
+    database = open_database(str(tmp_path / "transcripts.sqlite3"))
+    with IngestQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=3, base_delay_seconds=0.01) as job_queue:
+        job_queue.add(VIDEO_IDS[:4])
+        provider = CountingProvider(failing_video_ids={VIDEO_IDS[0]})
+        summary = run_ingest_queue(job_queue, provider, database, workers=2)
+
+        assert summary["counts"][STORED] == 3 and summary["counts"][FAILED] == 1
+        assert provider.calls["transcript", VIDEO_IDS[0]] == 3
+        assert job_queue.get_failed_jobs()[0]["attempts"] == 3
+    database.close()
@@ -0,0 +1,86 @@
+import json
+import sqlite3
+
+import pytest
+
+import cli
+from batch_transcription import FakeProvider, transcribe_one_video
+from near_duplicates import NearDuplicateIndex
+
+
+SAME_TRANSCRIPT = [{"text": f"the same lecture about sorting algorithms part {i} of the course", "start": i * 2.5,
+                    "duration": 2.5} for i in range(50)]
+
+
+class SameTranscriptProvider(FakeProvider):
+    '''
+    Every video has the same transcript, and getting the title of the videos in
+    failing_title_ids fails.
+    '''
+
+    def __init__(self, failing_title_ids: set[str] = ()) -> None:
+        super().__init__(latency_seconds=0)
+        self.failing_title_ids = set(failing_title_ids)
+
+    def get_video_title(self, video_id: str) -> str:
+        if video_id in self.failing_title_ids:
+            raise RuntimeError(f"no title for {video_id}")
+        return super().get_video_title(video_id)
+
+    def get_transcript(self, video_id: str, language: str = "en") -> list[dict]:
+        return [dict(segment) for segment in SAME_TRANSCRIPT]
+
+
+def test_failed_write_does_not_leave_a_signature_behind(tmp_path):
+    provider = SameTranscriptProvider(failing_title_ids={"AAAAAAAAAAA"})
+    with NearDuplicateIndex(str(tmp_path / "signatures.db")) as index:
+        first = transcribe_one_video(provider, "AAAAAAAAAAA", str(tmp_path), dedup_index=index)
+        assert not first["success"]
+        assert "AAAAAAAAAAA" not in index
+
+        second = transcribe_one_video(provider, "BBBBBBBBBBB", str(tmp_path), dedup_index=index)
+        assert second["success"] and not second["skipped"]
+        assert second["duplicate_of"] is None
+        assert "BBBBBBBBBBB" in index
+
+        third = transcribe_one_video(provider, "CCCCCCCCCCC", str(tmp_path), dedup_index=index)
+        assert third["duplicate_of"] == "BBBBBBBBBBB"
+        assert third["filename"] is None
+
+
+def test_ingest_rollback_removes_the_batch_signatures(tmp_path):
+    json_filename = tmp_path / "AAAAAAAAAAA.json"
+    json_filename.write_text(json.dumps(SAME_TRANSCRIPT))
+    dedup_db = str(tmp_path / "signatures.db")
+    sqlite_db = str(tmp_path / "transcripts.sqlite3")
+
+    # no --create-tables, so the insert fails
+    with pytest.raises(sqlite3.OperationalError):
+        cli.main(["ingest", str(json_filename), "--sqlite-db", sqlite_db, "--dedup-db", dedup_db])
+    with NearDuplicateIndex(dedup_db) as index:
+        assert "AAAAAAAAAAA" not in index
+
+    assert cli.main(["ingest", str(json_filename), "--sqlite-db", sqlite_db, "--dedup-db", dedup_db,
+                     "--create-tables"]) == 0
+    with NearDuplicateIndex(dedup_db) as index:
+        assert "AAAAAAAAAAA" in index
+
+
+def test_failed_database_row_takes_its_signature_back_out(tmp_path):
+    from db_writer import DatabaseWriter
+    from sqlite_database import SQLiteDatabase
+
+    provider = SameTranscriptProvider()
+    # the table is never made, so every row fails on the writer thread
+    writer = DatabaseWriter(SQLiteDatabase(str(tmp_path / "transcripts.sqlite3")), "transcription_data")
+    with NearDuplicateIndex(str(tmp_path / "signatures.db")) as index:
+        first = transcribe_one_video(provider, "AAAAAAAAAAA", str(tmp_path), formatted_type="json",
+                                     dedup_index=index, db_writer=writer)
+        assert first["success"]
+        assert writer.close()["rows_failed"] == 1
+        assert "AAAAAAAAAAA" not in index
+
+        second = transcribe_one_video(provider, "BBBBBBBBBBB", str(tmp_path), formatted_type="json",
+                                      dedup_index=index)
+        assert second["duplicate_of"] is None
+        assert "BBBBBBBBBBB" in index
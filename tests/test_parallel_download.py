@@ -0,0 +1,86 @@
+import os
+import threading
+
+import pytest
+
+import parallel_download
+from parallel_download import DownloadError, download_file, get_part_filenames, serve_directory
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+@pytest.fixture
+def server_folder(tmp_path):
+    folder = tmp_path / "served"
+    folder.mkdir()
+    (folder / "video.mp4").write_bytes(os.urandom(CHUNK_SIZE * 10 + 123))
+    (folder / "empty.mp4").write_bytes(b'')
+    return folder
+
+
+@pytest.fixture
+def base_url(server_folder):
+    server = serve_directory(str(server_folder), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_parallel_download_matches_the_served_file(server_folder, base_url, tmp_path):
+    filename = str(tmp_path / "video.mp4")
+    report = download_file(f"{base_url}/video.mp4", filename, workers=4, chunk_size=CHUNK_SIZE)
+
+    with open(filename, 'rb') as downloaded_file:
+        assert downloaded_file.read() == (server_folder / "video.mp4").read_bytes()
+    assert report["chunks"] == 11
+    assert report["downloaded_bytes"] == report["bytes"] == CHUNK_SIZE * 10 + 123
+    assert report["resumed_bytes"] == 0
+    assert not any(os.path.exists(part) for part in get_part_filenames(filename))
+
+
+def test_interrupted_download_resumes_from_the_state_file(server_folder, base_url, tmp_path, monkeypatch):
+    filename = str(tmp_path / "video.mp4")
+    real_download_chunk = parallel_download.download_chunk
+    chunks_left = [4]
+    lock = threading.Lock()
+
+    def download_chunk_then_die(*args, **kwargs):
+        with lock:
+            if not chunks_left[0]:
+                raise DownloadError("connection dropped")
+            chunks_left[0] -= 1
+        return real_download_chunk(*args, **kwargs)
+
+    monkeypatch.setattr(parallel_download, "download_chunk", download_chunk_then_die)
+    with pytest.raises(DownloadError):
+        download_file(f"{base_url}/video.mp4", filename, workers=4, chunk_size=CHUNK_SIZE, retries=0)
+    part_filename, state_filename = get_part_filenames(filename)
+    assert os.path.exists(part_filename) and os.path.exists(state_filename)
+    assert not os.path.exists(filename)
+
+    monkeypatch.setattr(parallel_download, "download_chunk", real_download_chunk)
+    report = download_file(f"{base_url}/video.mp4", filename, workers=4, chunk_size=CHUNK_SIZE)
+
+    with open(filename, 'rb') as downloaded_file:
+        assert downloaded_file.read() == (server_folder / "video.mp4").read_bytes()
+    assert report["resumed_bytes"] == 4 * CHUNK_SIZE
+    assert report["downloaded_bytes"] == report["bytes"] - 4 * CHUNK_SIZE
+    assert not os.path.exists(state_filename)
+
+
+def test_wrong_expected_size_is_caught_before_downloading(base_url, tmp_path):
+    filename = str(tmp_path / "video.mp4")
+    with pytest.raises(DownloadError):
+        download_file(f"{base_url}/video.mp4", filename, chunk_size=CHUNK_SIZE, expected_size=CHUNK_SIZE)
+    assert not os.path.exists(filename)
+    assert not os.path.exists(get_part_filenames(filename)[0])
+
+
+def test_empty_file_downloads_as_zero_bytes(base_url, tmp_path):
+    filename = str(tmp_path / "empty.mp4")
+    report = download_file(f"{base_url}/empty.mp4", filename, expected_size=0)
+    assert report["bytes"] == report["downloaded_bytes"] == 0
+    assert os.path.getsize(filename) == 0
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from segment_store import SegmentStore, convert_json_to_segment_store
+
+
+def test_to_json_round_trips_the_original_times(tmp_path):
+    segments = [
+        {"text": "hello there", "start": 1.23, "duration": 2.5},
+        {"text": "general kenobi", "start": 3.73, "duration": 0.1},
+        {"text": "long stream", "start": 16012.345, "duration": 4.567},
+    ]
+    filename = str(tmp_path / 'video.segs')
+    convert_json_to_segment_store(json.dumps(segments), filename)
+
+    with SegmentStore(filename) as store:
+        assert store.to_json() == json.dumps(segments)
+
+
+@pytest.mark.parametrize('kept_bytes', [0, 10, 30, 50, -1])
+def test_cut_short_file_raises_a_clear_error(tmp_path, kept_bytes):
+    segments = [{"text": f"segment number {i}", "start": i * 2.0, "duration": 2.0} for i in range(5)]
+    filename = str(tmp_path / 'video.segs')
+    convert_json_to_segment_store(json.dumps(segments), filename)
+    with open(filename, 'rb') as segment_file:
+        file_bytes = segment_file.read()
+    with open(filename, 'wb') as segment_file:
+        segment_file.write(file_bytes[:kept_bytes])
+
+    with pytest.raises(ValueError):
+        SegmentStore(filename)
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+from stream_selection import plan_downloads, select_stream
+
+
+def make_stream(itag: int, size: int, resolution: str = None, abr: str = None, audio: bool = True,
+                video: bool = True, subtype: str = "mp4"):
+    return SimpleNamespace(itag=itag, filesize_approx=size, filesize=size, resolution=resolution, abr=abr,
+                           includes_audio_track=audio, includes_video_track=video, subtype=subtype,
+                           url=f"http://example.com/{itag}")
+
+
+STREAMS = [
+    make_stream(18, 30_000_000, resolution="360p"),
+    make_stream(22, 90_000_000, resolution="720p"),
+    make_stream(17, 10_000_000, resolution="144p"),
+    make_stream(43, 25_000_000, resolution="360p", subtype="webm"),
+    # video only and audio only streams
+    make_stream(137, 200_000_000, resolution="1080p", audio=False),
+    make_stream(140, 4_000_000, abr="128kbps", video=False),
+    make_stream(139, 1_500_000, abr="48kbps", video=False),
+]
+
+
+@pytest.mark.parametrize("policy, options, expected_itag", [
+    ("highest_resolution", {}, 22),
+    ("audio_only", {}, 139),
+    # both 360p streams are good enough, 43 is the smaller one
+    ("smallest_above_resolution", {"min_resolution": 360}, 43),
+    ("smallest_above_resolution", {"min_resolution": 144}, 17),
+    # nothing is 1080p with audio, so the best there is gets picked
+    ("smallest_above_resolution", {"min_resolution": 1080}, 22),
+    ("max_bytes", {"max_bytes": 50_000_000}, 43),
+    ("max_bytes", {"max_bytes": 100_000_000}, 22),
+])
+def test_each_policy_picks_the_right_stream(policy, options, expected_itag):
+    assert select_stream(STREAMS, policy, **options).itag == expected_itag
+
+
+def test_max_bytes_with_nothing_small_enough_picks_nothing():
+    assert select_stream(STREAMS, "max_bytes", max_bytes=5_000_000) is None
+
+
+def test_max_bytes_policy_needs_max_bytes():
+    with pytest.raises(ValueError):
+        select_stream(STREAMS, "max_bytes")
+
+
+def test_unknown_policy_is_an_error():
+    with pytest.raises(ValueError):
+        select_stream(STREAMS, "lowest_resolution")
+
+
+def test_no_matching_streams():
+    audio_only = [stream for stream in STREAMS if not stream.includes_video_track]
+    assert select_stream(audio_only, "highest_resolution") is None
+    assert select_stream([stream for stream in STREAMS if stream not in audio_only], "audio_only") is None
+
+
+def test_filesize_is_used_when_there_is_no_estimate():
+    streams = [make_stream(1, 0, resolution="360p"), make_stream(2, 0, resolution="360p")]
+    streams[0].filesize, streams[1].filesize = 5_000, 3_000
+    assert select_stream(streams, "smallest_above_resolution").itag == 2
+
+
+def test_plan_skips_videos_over_the_byte_budget():
+    video_sizes = {"https://youtu.be/AAAAAAAAAAA": 40_000_000, "https://youtu.be/BBBBBBBBBBB": 70_000_000,
+                   "https://youtu.be/CCCCCCCCCCC": 20_000_000, "https://youtu.be/DDDDDDDDDDD": None}
+
+    def get_video(video_url):
+        if video_sizes[video_url] is None:
+            raise RuntimeError("video unavailable")
+        return SimpleNamespace(video_id=video_url[-11:], title=f"Video {video_url[-11:]}",
+                               streams=[make_stream(18, video_sizes[video_url], resolution="360p")])
+
+    plan = plan_downloads(list(video_sizes), policy="highest_resolution", byte_budget=100_000_000,
+                          get_video=get_video)
+
+    assert [video["selected"] for video in plan["videos"]] == [True, False, True, False]
+    assert plan["videos"][1]["reason"] == "over the byte budget"
+    assert plan["videos"][1]["estimated_bytes"] == 70_000_000
+    assert plan["videos"][3]["reason"] == "RuntimeError: video unavailable"
+    assert plan["planned_bytes"] == 60_000_000
+    assert plan["byte_budget"] == 100_000_000
+
+
+def test_plan_reports_videos_with_no_fitting_stream():
+    def get_video(video_url):
+        return SimpleNamespace(video_id="AAAAAAAAAAA", title="A video", streams=STREAMS)
+
+    plan = plan_downloads(["https://youtu.be/AAAAAAAAAAA"], policy="max_bytes", max_bytes=1_000,
+                          get_video=get_video)
+    assert not plan["videos"][0]["selected"]
+    assert plan["videos"][0]["reason"] == "no stream fits the max_bytes policy"
+    assert plan["planned_bytes"] == 0
@@ -0,0 +1,11 @@
+from text_normalization import clean_text_for_storage, normalize_text
+
+
+def test_storage_cleanup_keeps_quotes_and_dashes():
+    text = "He said “don’t” — ok"
+    assert clean_text_for_storage(text + "\x00") == text
+    assert clean_text_for_storage("café") == "café"
+
+
+def test_normalize_text_still_folds_punctuation_by_default():
+    assert normalize_text("don’t — ok") == "don't - ok"
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from timeline_analytics import analyze_timeline, segments_to_arrays
+
+
+# B overlaps A and C sits inside B, like auto generated captions do
+SEGMENTS = [
+    {"text": "Python is fun fun", "start": 0.0, "duration": 4.0},
+    {"text": "loops loops python", "start": 2.0, "duration": 10.0},
+    {"text": "short caption", "start": 5.0, "duration": 2.0},
+    {"text": "python again", "start": 20.0, "duration": 4.0},
+    {"text": "done", "start": 70.0, "duration": 2.0},
+]
+
+
+@pytest.fixture
+def report():
+    # out of order on purpose, analyze_timeline sorts them by start time
+    return analyze_timeline(*segments_to_arrays(SEGMENTS[::-1]), bin_seconds=60,
+                            terms=["Python", "loops", "missing"])
+
+
+def test_words_per_minute_per_bin(report):
+    assert report["duration_seconds"] == 72.0
+    assert report["bin_starts"].tolist() == [0.0, 60.0]
+    assert report["words_per_bin"].tolist() == [11, 1]
+    # the last bin is only 12 seconds long
+    np.testing.assert_allclose(report["words_per_minute"], [11.0, 5.0])
+    assert report["total_words"] == 12
+
+
+def test_silence_gaps_start_when_the_overlapping_captions_end(report):
+    # C ends at 7, but B is still going until 12
+    assert report["silence_gaps"] == [{"start": 12.0, "end": 20.0, "seconds": 8.0},
+                                      {"start": 24.0, "end": 70.0, "seconds": 46.0}]
+    assert report["silence_seconds"] == 54.0
+    assert report["speaking_seconds"] == 18.0
+    assert report["average_words_per_minute"] == pytest.approx(12 * 60 / 18)
+
+
+def test_tracked_terms_first_and_last_times(report):
+    python, loops, missing = report["terms"]
+
+    # "python" is the 3rd of 3 words in the segment from 2 to 12, so it's at 2 + 10 * 2 / 3
+    assert python == {"term": "python", "count": 3, "first_seconds": 0.0, "last_seconds": 20.0}
+    assert loops["count"] == 2
+    assert loops["first_seconds"] == 2.0
+    assert loops["last_seconds"] == pytest.approx(2 + 10 / 3)
+    assert missing == {"term": "missing", "count": 0, "first_seconds": None, "last_seconds": None}
+    assert report["term_counts"].tolist() == [[3, 0], [2, 0], [0, 0]]
+
+
+def test_top_words_are_tracked_when_no_terms_are_given():
+    report = analyze_timeline(*segments_to_arrays(SEGMENTS), bin_seconds=30, top_k=3)
+    # ties are broken alphabetically
+    assert [term["term"] for term in report["terms"]] == ["python", "fun", "loops"]
+    assert report["term_counts"].shape == (3, 3)
+    assert report["term_counts"].sum(axis=1).tolist() == [3, 2, 2]
+
+
+def test_empty_transcript():
+    report = analyze_timeline(*segments_to_arrays([]), terms=["python"])
+    assert report["total_words"] == 0
+    assert report["silence_gaps"] == []
+    assert report["terms"] == [{"term": "python", "count": 0, "first_seconds": None, "last_seconds": None}]
@@ -0,0 +1,92 @@
+import random
+from collections import Counter
+
+import pytest
+
+from top_k import SpaceSaving, exact_top_k, get_top_words
+
+
+def make_words(seed: int, length: int = 20_000) -> list[str]:
+    '''
+    Zipf-ish made up words, so a few of them are common and most of them are rare.
+    '''
+    generator = random.Random(seed)
+    return [f"word{int(generator.paretovariate(1.2))}" for _ in range(length)]
+
+
+def check_bounds(counter: SpaceSaving, true_counts: Counter) -> None:
+    for word, count in counter.counts.items():
+        error = counter.errors[word]
+        assert count - error <= true_counts[word] <= count
+        assert error <= counter.error_bound
+
+    # anything said more often than the error bound has to be in there
+    for word, true_count in true_counts.items():
+        if true_count > counter.error_bound:
+            assert word in counter
+
+
+def test_exact_top_k_matches_sorting():
+    word_counts = Counter(make_words(seed=1))
+    assert exact_top_k(word_counts, 10) == sorted(word_counts.items(), key=lambda item: item[1], reverse=True)[:10]
+    assert get_top_words(word_counts, 10) == exact_top_k(word_counts, 10)
+
+
+def test_space_saving_counts_stay_within_their_errors():
+    words = make_words(seed=2)
+    counter = SpaceSaving(max_counters=50)
+    counter.update_many(words)
+
+    assert len(counter) == 50
+    assert counter.total == len(words)
+    check_bounds(counter, Counter(words))
+    assert [word for word, _ in counter.top(3)] == [word for word, _ in Counter(words).most_common(3)]
+
+
+def test_update_many_takes_a_counter_too():
+    words = make_words(seed=3)
+    counter = SpaceSaving(max_counters=1000)
+    counter.update_many(Counter(words))
+    assert counter.counts == Counter(words)
+    assert set(counter.errors.values()) == {0}
+
+
+@pytest.mark.parametrize("max_counters", [5, 50])
+def test_merge_keeps_the_error_bounds(max_counters):
+    left_words, right_words = make_words(seed=4), make_words(seed=5)
+    # words only one side has, so each side is missing words the other one tracks
+    left_words += [f"left{number % 40}" for number in range(4000)]
+    right_words += [f"right{number % 40}" for number in range(4000)]
+
+    left, right = SpaceSaving(max_counters), SpaceSaving(max_counters)
+    left.update_many(left_words)
+    right.update_many(right_words)
+    left.merge(right)
+
+    assert left.total == len(left_words) + len(right_words)
+    assert len(left) <= max_counters
+    check_bounds(left, Counter(left_words) + Counter(right_words))
+
+
+def test_heap_never_grows_past_twice_the_counters():
+    counter = SpaceSaving(max_counters=20)
+    for word in make_words(seed=6):
+        counter.update(word)
+        assert len(counter.heap) < 2 * counter.max_counters
+    check_bounds(counter, Counter(make_words(seed=6)))
+
+
+def test_merge_counts_what_the_other_side_dropped():
+    left_words = ["x"] * 10
+    # the other side sees x 3 times, then drops it to make room for b
+    right_words = ["x"] * 3 + ["a"] * 5 + ["b"] * 5
+
+    left, right = SpaceSaving(max_counters=2), SpaceSaving(max_counters=2)
+    left.update_many(left_words)
+    right.update_many(right_words)
+    assert "x" not in right
+    left.merge(right)
+
+    check_bounds(left, Counter(left_words) + Counter(right_words))
+    count, error = left.counts["x"], left.errors["x"]
+    assert count - error <= 13 <= count
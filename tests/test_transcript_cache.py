@@ -0,0 +1,103 @@
+import json
+import os
+
+import transcript_cache
+from batch_transcription import CachingProvider, FakeProvider
+from transcript_cache import TranscriptCache
+
+
+def make_segments(video_id: str, count: int = 20) -> list[dict]:
+    return [{"text": f"segment {i} of {video_id}", "start": i * 2.5, "duration": 2.5} for i in range(count)]
+
+
+class LanguageProvider(FakeProvider):
+    '''
+    Counts the transcript fetches, and puts the language in the text so it's easy to tell apart.
+    '''
+
+    def __init__(self) -> None:
+        super().__init__(latency_seconds=0, segment_count=3)
+        self.fetches = []
+
+    def get_transcript(self, video_id: str, language: str = "en") -> list[dict]:
+        self.fetches.append((video_id, language))
+        return [dict(segment, text=f"{language}: {segment['text']}")
+                for segment in super().get_transcript(video_id, language)]
+
+
+class UpperFormatter:
+    def format_transcript(self, transcript: list[dict]) -> str:
+        return '\n'.join(segment["text"].upper() for segment in transcript)
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = TranscriptCache(str(tmp_path))
+    fetches = []
+
+    def fetch_segments(video_id):
+        fetches.append(video_id)
+        return make_segments(video_id)
+
+    assert cache.get_or_fetch_segments("AAAAAAAAAAA", fetch_segments) == make_segments("AAAAAAAAAAA")
+    assert cache.get_or_fetch_segments("AAAAAAAAAAA", fetch_segments) == make_segments("AAAAAAAAAAA")
+    assert cache.get_or_fetch_formatted("AAAAAAAAAAA", UpperFormatter(), fetch_segments).startswith("SEGMENT 0")
+    cache.get_or_fetch_formatted("AAAAAAAAAAA", UpperFormatter(), fetch_segments)
+    assert cache.get_metadata("AAAAAAAAAAA") is None
+
+    assert fetches == ["AAAAAAAAAAA"]
+    stats = cache.stats()
+    assert stats["hits"] == {"transcript": 2, "metadata": 0, "formatted": 1}
+    assert stats["misses"] == {"transcript": 1, "metadata": 1, "formatted": 1}
+
+    # a new cache on the same folder still has the transcript on disk
+    assert TranscriptCache(str(tmp_path)).get_segments("AAAAAAAAAAA") == make_segments("AAAAAAAAAAA")
+
+
+def test_metadata_expires_after_its_ttl(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(transcript_cache.time, "time", lambda: now[0])
+
+    cache = TranscriptCache(str(tmp_path), metadata_ttl_seconds=60)
+    cache.put_metadata("AAAAAAAAAAA", {"title": "a title"})
+
+    now[0] += 59
+    assert cache.get_metadata("AAAAAAAAAAA") == {"title": "a title"}
+    now[0] += 2
+    assert cache.get_metadata("AAAAAAAAAAA") is None
+    assert cache.stats()["hits"]["metadata"] == 1
+    assert cache.stats()["misses"]["metadata"] == 1
+
+
+def test_least_recently_used_files_are_evicted_past_the_size_limit(tmp_path):
+    file_size = len(json.dumps(make_segments("AAAAAAAAAAA")))
+    cache = TranscriptCache(str(tmp_path / "cache"), max_bytes=file_size * 3)
+
+    for video_id in ("AAAAAAAAAAA", "BBBBBBBBBBB", "CCCCCCCCCCC"):
+        cache.put_segments(video_id, make_segments(video_id))
+    # reading A makes B the least recently used one
+    assert cache.get_segments("AAAAAAAAAAA") is not None
+    cache.put_segments("DDDDDDDDDDD", make_segments("DDDDDDDDDDD"))
+
+    assert cache.get_segments("BBBBBBBBBBB") is None
+    assert not os.path.exists(cache.get_transcript_path("BBBBBBBBBBB", "en"))
+    for video_id in ("AAAAAAAAAAA", "CCCCCCCCCCC", "DDDDDDDDDDD"):
+        assert cache.get_segments(video_id) == make_segments(video_id)
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["files"] == 3
+    assert stats["bytes"] <= cache.max_bytes
+
+
+def test_caching_provider_keys_transcripts_by_language(tmp_path):
+    provider = LanguageProvider()
+    caching_provider = CachingProvider(provider, TranscriptCache(str(tmp_path)))
+
+    english = caching_provider.get_transcript("AAAAAAAAAAA")
+    spanish = caching_provider.get_transcript("AAAAAAAAAAA", language="es")
+    assert english[0]["text"].startswith("en: ")
+    assert spanish[0]["text"].startswith("es: ")
+
+    assert caching_provider.get_transcript("AAAAAAAAAAA", language="es") == spanish
+    assert caching_provider.get_transcript("AAAAAAAAAAA", language="en") == english
+    assert provider.fetches == [("AAAAAAAAAAA", "en"), ("AAAAAAAAAAA", "es")]
@@ -0,0 +1,72 @@
+import json
+
+from transcript_index import TranscriptIndex, build_index_from_json_files, update_index_from_json_files
+
+
+def write_transcripts(folder, transcripts: dict[str, str]) -> list[str]:
+    filenames = []
+    for video_id, text in transcripts.items():
+        filename = folder / f"{video_id}.json"
+        filename.write_text(json.dumps([{"text": text, "start": 0.0, "duration": 2.0}]))
+        filenames.append(str(filename))
+    return sorted(filenames)
+
+
+def get_index_contents(index_filename: str) -> tuple[list[str], list]:
+    index = TranscriptIndex(index_filename)
+    try:
+        return [index.get_video_id(number) for number in range(len(index))], index.search("loop")
+    finally:
+        index.close()
+
+
+def test_incremental_build_after_full_build_does_not_duplicate(tmp_path):
+    json_filenames = write_transcripts(tmp_path, {"aaaaaaaaaaa": "a for loop", "bbbbbbbbbbb": "a while loop"})
+    index_filename = str(tmp_path / "idx.tidx")
+
+    build_index_from_json_files(json_filenames, index_filename)
+    changes = update_index_from_json_files(json_filenames, index_filename)
+
+    assert changes["unchanged"] == 2 and changes["added"] == 0
+    video_ids, results = get_index_contents(index_filename)
+    assert video_ids == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+    assert results == [("aaaaaaaaaaa", 0.0), ("bbbbbbbbbbb", 0.0)]
+
+
+def test_incremental_build_without_manifest_rebuilds(tmp_path):
+    json_filenames = write_transcripts(tmp_path, {"aaaaaaaaaaa": "a for loop", "bbbbbbbbbbb": "a while loop"})
+    index_filename = str(tmp_path / "idx.tidx")
+
+    build_index_from_json_files(json_filenames, index_filename)
+    (tmp_path / "idx.tidx.manifest.json").unlink()
+    update_index_from_json_files(json_filenames, index_filename)
+
+    assert get_index_contents(index_filename)[0] == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+
+
+def test_full_build_after_incremental_build_keeps_manifest_in_sync(tmp_path):
+    json_filenames = write_transcripts(tmp_path, {"aaaaaaaaaaa": "a for loop"})
+    index_filename = str(tmp_path / "idx.tidx")
+    update_index_from_json_files(json_filenames, index_filename)
+
+    json_filenames = write_transcripts(tmp_path, {"aaaaaaaaaaa": "a for loop", "bbbbbbbbbbb": "a while loop"})
+    build_index_from_json_files(json_filenames, index_filename)
+    update_index_from_json_files(json_filenames, index_filename)
+
+    assert get_index_contents(index_filename)[0] == ["aaaaaaaaaaa", "bbbbbbbbbbb"]
+
+
+def test_search_finds_words_and_phrases_with_binary_search(tmp_path):
+    json_filenames = write_transcripts(tmp_path, {"aaaaaaaaaaa": "über naïve for loop", "bbbbbbbbbbb": "zeta loop"})
+    index_filename = str(tmp_path / "idx.tidx")
+    build_index_from_json_files(json_filenames, index_filename)
+
+    index = TranscriptIndex(index_filename)
+    try:
+        assert index.search("naïve for loop") == [("aaaaaaaaaaa", 0.0)]
+        assert index.search("über") == [("aaaaaaaaaaa", 0.0)]
+        assert index.search("zeta") == [("bbbbbbbbbbb", 0.0)]
+        assert index.search("missing") == []
+        assert index.find_word("loop") >= 0 and index.find_word("loo") == -1
+    finally:
+        index.close()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from vector_analytics import Vocabulary, build_term_matrix, compute_idf, compute_tfidf, count_tokens, find_similar
+
+
+DOCUMENTS = [
+    "python lists and loops and more python loops",
+    "python loops and lists for the midterm",
+    "sorting algorithms merge sort and quick sort",
+    "merge sort versus quick sort and heap sort",
+    "cooking pasta with tomato sauce",
+    "python dictionaries and sets and lists",
+    "tomato sauce pasta for dinner",
+]
+
+
+@pytest.fixture
+def counts_and_vocabulary():
+    return build_term_matrix(count_tokens(document.split()) for document in DOCUMENTS)
+
+
+def test_term_matrix_matches_the_word_counts(counts_and_vocabulary):
+    counts, vocabulary = counts_and_vocabulary
+    dense = counts.to_dense()
+
+    assert counts.shape == (len(DOCUMENTS), len(vocabulary))
+    for row, document in enumerate(DOCUMENTS):
+        words = document.split()
+        assert dense[row].sum() == len(words)
+        for word in set(words):
+            assert dense[row, vocabulary.word_ids[word]] == words.count(word)
+        # each row's word IDs are sorted
+        assert np.all(np.diff(counts.get_row(row)[0]) > 0)
+
+
+def test_vocabulary_is_shared_between_matrices(counts_and_vocabulary):
+    _, vocabulary = counts_and_vocabulary
+    word_count = len(vocabulary)
+    more_counts, same_vocabulary = build_term_matrix([count_tokens("python pasta brand new".split())], vocabulary)
+
+    assert same_vocabulary is vocabulary
+    assert len(vocabulary) == word_count + 2
+    assert set(vocabulary.decode(more_counts.get_row(0)[0].tolist())) == {"python", "pasta", "brand", "new"}
+
+
+def test_tfidf_matches_the_dense_formula(counts_and_vocabulary):
+    counts, _ = counts_and_vocabulary
+    dense_counts = counts.to_dense().astype(np.float64)
+
+    document_frequency = (dense_counts > 0).sum(axis=0)
+    idf = np.log((1 + len(DOCUMENTS)) / (1 + document_frequency)) + 1
+    expected = np.where(dense_counts > 0, 1 + np.log(np.maximum(dense_counts, 1)), 0) * idf
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+
+    np.testing.assert_allclose(compute_idf(counts), idf)
+    np.testing.assert_allclose(compute_tfidf(counts).to_dense(), expected, rtol=1e-6, atol=1e-7)
+
+
+@pytest.mark.parametrize("max_dense_bytes", [0, 1_000_000])
+@pytest.mark.parametrize("max_products", [1, 10_000_000])
+def test_find_similar_matches_the_dense_similarities(counts_and_vocabulary, max_dense_bytes, max_products):
+    counts, _ = counts_and_vocabulary
+    tfidf = compute_tfidf(counts)
+    dense = tfidf.to_dense().astype(np.float64)
+    expected_similarities = dense @ dense.T
+    np.fill_diagonal(expected_similarities, -np.inf)
+
+    k = 3
+    neighbors, similarities = find_similar(tfidf, k=k, batch_size=2, max_products=max_products,
+                                           max_dense_bytes=max_dense_bytes)
+
+    for row in range(len(DOCUMENTS)):
+        expected_order = np.argsort(-expected_similarities[row], kind='stable')[:k]
+        expected_scores = expected_similarities[row, expected_order]
+        np.testing.assert_allclose(similarities[row], np.where(expected_scores > 1e-9, expected_scores, 0),
+                                   rtol=1e-5, atol=1e-6)
+        for neighbor, similarity in zip(neighbors[row], similarities[row]):
+            if neighbor >= 0:
+                assert expected_similarities[row, neighbor] == pytest.approx(similarity, rel=1e-5)
+
+
+def test_videos_with_no_shared_words_are_not_neighbors(counts_and_vocabulary):
+    counts, _ = counts_and_vocabulary
+    neighbors, similarities = find_similar(compute_tfidf(counts), k=6)
+
+    # the pasta videos only share words with each other
+    assert neighbors[4].tolist() == [6, -1, -1, -1, -1, -1]
+    assert similarities[4, 0] > 0
+    assert similarities[4, 1:].tolist() == [0, 0, 0, 0, 0]
+    assert (similarities[neighbors >= 0] > 0).all()
@@ -0,0 +1,66 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from instrumentation import metrics
+from youtube_urls import LazyVideoInfo, extract_video_id
+
+
+@pytest.mark.parametrize("video_url", [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "http://youtube.com/watch?v=dQw4w9WgXcQ",
+    "www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL1234567890&index=3&t=42s",
+    "https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+    "https://m.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://music.youtube.com/watch?v=dQw4w9WgXcQ&si=abc",
+    "https://youtu.be/dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ?t=42&si=abc",
+    "youtu.be/dQw4w9WgXcQ",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+    "https://youtube.com/shorts/dQw4w9WgXcQ?feature=share",
+    "https://www.youtube.com/live/dQw4w9WgXcQ?si=abc",
+    "https://www.youtube.com/embed/dQw4w9WgXcQ",
+    "https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ?start=10",
+    "https://www.youtube.com/v/dQw4w9WgXcQ",
+    "HTTPS://WWW.YOUTUBE.COM/watch?v=dQw4w9WgXcQ",
+    "  https://youtu.be/dQw4w9WgXcQ \n",
+    "dQw4w9WgXcQ",
+])
+def test_extract_video_id(video_url):
+    assert extract_video_id(video_url) == "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("video_url", [
+    "https://www.youtube.com/",
+    "https://www.youtube.com/watch",
+    "https://www.youtube.com/watch?v=tooshort",
+    "https://www.youtube.com/channel/UCabcdefghijk",
+    "https://www.youtube.com/playlist?list=PL1234567890",
+    "https://youtu.be/",
+    "https://example.com/watch?v=dQw4w9WgXcQ",
+    "https://vimeo.com/dQw4w9WgXcQ",
+    "",
+])
+def test_urls_without_a_video_id_raise_value_error(video_url):
+    with pytest.raises(ValueError):
+        extract_video_id(video_url)
+
+
+def test_video_info_is_only_timed_when_it_is_fetched():
+    video_info = LazyVideoInfo('https://youtu.be/dQw4w9WgXcQ')
+    video_info.youtube = SimpleNamespace(title='a title', publish_date=datetime(2023, 10, 18))
+
+    metrics.reset()
+    metrics.enable()
+    try:
+        for _ in range(3):
+            assert video_info.title == 'a title'
+            assert video_info.publish_date == datetime(2023, 10, 18)
+        stages = metrics.snapshot()["stages"]
+    finally:
+        metrics.disable()
+        metrics.reset()
+
+    assert stages["get_video_info"]["count"] == 2
@@ -0,0 +1,211 @@
+'''
+This module is the one place we clean up text, so filenames, word counting and the
+database all agree on what a "clean" string or a "word" is. It used to be a copy of
+remove_special_characters_from_string in every script, each one building a new string
+one character at a time.
+
+Everything here uses regexes and str.translate tables that are built once, so the
+work happens in C instead of a Python loop over every character.
+
+Unicode normalization (NFKC by default) turns things like full width letters and
+ligatures into plain ones, fancy quotes and dashes are turned into plain ' and -, and
+words can be case folded, so "Python", "PYTHON" and "ｐｙｔｈｏｎ" can all count as the
+same word. How hyphens and apostrophes are handled is up to you: keep them, remove them,
+or split the word on them.
+'''
+import re
+import unicodedata
+from collections import Counter
+from typing import Iterable, Iterator
+
+
+# anything that isn't a letter, number or whitespace (str.isalnum and str.isspace, same
+# as the old character loop did). \w also matches _, so that's added back in on purpose.
+SPECIAL_CHARACTERS = re.compile(r'[^\w\s]|_')
+
+# control characters (like \x00, which PostgreSQL won't store) other than tabs and newlines
+CONTROL_CHARACTERS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+
+# every kind of apostrophe and hyphen / dash we've seen in titles and transcripts
+APOSTROPHE_CHARACTERS = "'‘’‛ʼʹ`´＇"
+HYPHEN_CHARACTERS = "-‐‑‒–—―−﹣－"
+
+# turns all of those into a plain ' or -
+PUNCTUATION_TRANSLATION = str.maketrans({
+    **{character: "'" for character in APOSTROPHE_CHARACTERS},
+    **{character: "-" for character in HYPHEN_CHARACTERS},
+})
+
+# single letter "words" that are actually words
+SINGLE_LETTER_WORDS = frozenset(['a', 'i'])
+
+# what Tokenizer can do with hyphens and apostrophes inside a word
+PUNCTUATION_RULES = ("keep", "remove", "split")
+
+# bump this whenever the default word rules change, so saved word counts get rebuilt
+TOKENIZER_VERSION = 2
+
+
+def remove_special_characters_from_string(input_string: str) -> str:
+    '''
+    This function takes a given input string and removes all characters that aren't
+    alpha-numeric or spaces.
+
+    Parameters:
+    input_string: str you wish to format
+
+    Returns: str - copy of input string with only its letters, numbers, and spaces.
+    '''
+    return SPECIAL_CHARACTERS.sub('', input_string)
+
+
+def format_filename(video_title: str, extension: str = ".txt", spaces_to_underscores: bool = False) -> str:
+    '''
+    This function turns a video title into a filename with only letters, numbers and
+    spaces (or underscores) in it.
+
+    Parameters:
+    video_title: str of a video title you wish to format into a filename
+    extension: the file extension to put on the end, like ".txt" or ".mp4"
+    spaces_to_underscores: if True, spaces are changed to underscores
+
+    Returns: formatted str
+    '''
+    filename = remove_special_characters_from_string(video_title)
+    if spaces_to_underscores:
+        filename = filename.replace(" ", "_")
+    return filename + extension
+
+
+def normalize_text(text: str, unicode_form: str = "NFKC", casefold: bool = False,
+                   remove_control_characters: bool = True, fold_punctuation: bool = True) -> str:
+    '''
+    This function cleans up a whole string without taking anything meaningful out of it:
+    Unicode normalization, fancy quotes and dashes turned into plain ones, and optionally
+    case folding. Plain ASCII text skips the Unicode steps since they wouldn't change it.
+
+    Parameters:
+    text: str to normalize
+    unicode_form: "NFC", "NFKC", "NFD" or "NFKD", or None to skip Unicode normalization
+    casefold: if True, the text is case folded (like lower(), but also handles things like ß)
+    remove_control_characters: if True, control characters other than tabs and newlines are removed
+    fold_punctuation: if True, fancy quotes and dashes are turned into plain ' and -
+
+    Returns: the normalized str
+    '''
+    if not text.isascii():
+        if unicode_form:
+            text = unicodedata.normalize(unicode_form, text)
+        if fold_punctuation:
+            text = text.translate(PUNCTUATION_TRANSLATION)
+
+    if remove_control_characters:
+        text = CONTROL_CHARACTERS.sub('', text)
+
+    if casefold:
+        text = text.casefold()
+
+    return text
+
+
+def clean_text_for_storage(text: str) -> str:
+    '''
+    This is the cleanup for text we save (like transcripts going into the database): NFC
+    only joins up characters that were split into pieces, so the text reads exactly the
+    same, and control characters are removed since PostgreSQL won't store \\u0000 in jsonb.
+    Quotes and dashes are left just how they were.
+
+    Returns: the cleaned up str
+    '''
+    return normalize_text(text, unicode_form="NFC", fold_punctuation=False)
+
+
+class Tokenizer:
+    '''
+    Splits text into words and cleans them up. With the default settings a word loses
+    everything that isn't a letter or a hyphen, and single letter words other than
+    "a" and "i" are dropped (they're usually transcription noise), which is how the word
+    counts in txt_file_analytics have always worked.
+
+    Parameters:
+    hyphens: "keep" ("well-known"), "remove" ("wellknown") or "split" ("well", "known")
+    apostrophes: "keep" ("don't"), "remove" ("dont") or "split" ("don", "t")
+    casefold: if True, every word is case folded, so "The" and "the" are the same word
+    unicode_form: Unicode normalization for words with non ASCII characters in them,
+    or None to leave them alone
+    keep_digits: if True, numbers are kept as part of words instead of being removed
+    single_letter_words: the one letter words that are allowed
+    '''
+
+    def __init__(self, hyphens: str = "keep", apostrophes: str = "remove", casefold: bool = False,
+                 unicode_form: str = None, keep_digits: bool = False,
+                 single_letter_words: frozenset[str] = SINGLE_LETTER_WORDS) -> None:
+        if hyphens not in PUNCTUATION_RULES or apostrophes not in PUNCTUATION_RULES:
+            raise ValueError(f"hyphens and apostrophes have to be one of {PUNCTUATION_RULES}")
+
+        self.hyphens = hyphens
+        self.apostrophes = apostrophes
+        self.casefold = casefold
+        self.unicode_form = unicode_form
+        self.keep_digits = keep_digits
+        self.single_letter_words = single_letter_words
+
+        kept_characters = ("-" if hyphens == "keep" else "") + ("'" if apostrophes == "keep" else "")
+        removed_characters = "_" if keep_digits else r"\d_"
+        self.strip_pattern = re.compile(rf"[^\w{re.escape(kept_characters)}]|[{removed_characters}]")
+
+        split_characters = ("-" if hyphens == "split" else "") + ("'" if apostrophes == "split" else "")
+        self.split_pattern = re.compile(f"[{re.escape(split_characters)}]+") if split_characters else None
+
+    def normalize_word(self, word: str) -> str:
+        if self.unicode_form:
+            word = unicodedata.normalize(self.unicode_form, word)
+        return word.translate(PUNCTUATION_TRANSLATION)
+
+    def clean_words(self, raw_words: Iterable[str]) -> Iterator[str]:
+        '''
+        This function yields each word cleaned up with this tokenizer's rules.
+
+        Parameters:
+        raw_words: any iterable of words split on whitespace
+
+        Returns: generator of cleaned up words, in the order they were given.
+        '''
+        strip = self.strip_pattern.sub
+        split = self.split_pattern.split if self.split_pattern else None
+        single_letter_words = self.single_letter_words
+        casefold = self.casefold
+
+        for word in raw_words:
+            # most words are plain ASCII letters already, so they skip all the regex work
+            if not word.isascii():
+                word = self.normalize_word(word)
+
+            if casefold:
+                word = word.casefold()
+
+            if word.isalpha():
+                if len(word) > 1 or word in single_letter_words:
+                    yield word
+                continue
+
+            for piece in (split(word) if split else (word,)):
+                piece = strip('', piece)
+                if piece and (len(piece) > 1 or piece in single_letter_words):
+                    yield piece
+
+    def tokenize(self, text: str) -> Iterator[str]:
+        '''
+        Returns: generator of the cleaned up words in a string, in the order they appear.
+        '''
+        return self.clean_words(text.split())
+
+    def count(self, text: str) -> Counter:
+        '''
+        Returns: Counter of every cleaned up word in a string.
+        '''
+        return Counter(self.tokenize(text))
+
+
+# the tokenizer txt_file_analytics and corpus_analytics count words with
+DEFAULT_TOKENIZER = Tokenizer()
@@ -0,0 +1,378 @@
+'''
+This module looks at when things were said instead of just what was said. The json
+transcripts (and segment store files) keep every segment's start time and duration,
+so from those we can work out:
+
+- words per minute over time, in bins of however many seconds you want
+- how often the top words were said in each bin
+- the silent gaps where nobody was talking
+- the first and last time each top word was said
+
+Each word's time is estimated by spreading a segment's words evenly across the
+segment. Everything after tokenizing is done with numpy on whole arrays (bincount for
+the bins, maximum.accumulate for the silences), so even a 12 hour livestream takes a
+fraction of a second.
+
+Usage:
+python timeline_analytics.py transcript.json --bin-seconds 60 --top 10
+python timeline_analytics.py livestream.segs --terms python loop --chart timeline.png
+'''
+import argparse
+import json
+import os
+import time
+from typing import Iterable
+
+import numpy as np
+
+from segment_store import SEGMENT_STORE_MAGIC, SegmentStore
+from text_normalization import Tokenizer
+from transcript_index import format_timestamp
+
+
+# words are case folded so "Python" and "python" are counted together over time
+TIMELINE_TOKENIZER = Tokenizer(casefold=True, unicode_form="NFKC")
+
+DEFAULT_BIN_SECONDS = 60.0
+DEFAULT_MIN_SILENCE_SECONDS = 2.0
+
+
+def segments_to_arrays(segments: Iterable[dict]) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    '''
+    Returns: tuple --> (float64 array of start times, float64 array of durations, list of
+    texts) for some {"text", "start", "duration"} segment dicts
+    '''
+    segments = list(segments)
+    starts = np.fromiter((segment["start"] for segment in segments), dtype=np.float64, count=len(segments))
+    durations = np.fromiter((segment["duration"] for segment in segments), dtype=np.float64, count=len(segments))
+    return starts, durations, [segment["text"] for segment in segments]
+
+
+def load_segment_arrays(filename: str) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    '''
+    This function reads a transcript's segments from either a json transcript (a list of
+    segment dicts, like JSONFormatter makes) or a segment store file.
+
+    Returns: tuple --> (start times, durations, texts), like segments_to_arrays
+    '''
+    with open(filename, 'rb') as transcript_file:
+        is_segment_store = transcript_file.read(len(SEGMENT_STORE_MAGIC)) == SEGMENT_STORE_MAGIC
+
+    if not is_segment_store:
+        with open(filename, 'r', encoding='utf-8') as json_file:
+            return segments_to_arrays(json.load(json_file))
+
+    with SegmentStore(filename) as store:
+        starts = np.array(store.starts, dtype=np.float64)
+        durations = np.array(store.durations, dtype=np.float64)
+        texts = [store.get_text(index) for index in range(len(store))]
+    return starts, durations, texts
+
+
+def tokenize_segments(texts: list[str], tokenizer: Tokenizer = TIMELINE_TOKENIZER) -> tuple[list[str], np.ndarray]:
+    '''
+    Returns: tuple --> (list of every word in order, int64 array of how many words each segment has)
+    '''
+    clean_words = tokenizer.clean_words
+    words = []
+    word_counts = np.zeros(len(texts), dtype=np.int64)
+
+    for segment_number, text in enumerate(texts):
+        word_count = len(words)
+        words.extend(clean_words(text.split()))
+        word_counts[segment_number] = len(words) - word_count
+
+    return words, word_counts
+
+
+def get_word_times(starts: np.ndarray, durations: np.ndarray, word_counts: np.ndarray) -> np.ndarray:
+    '''
+    This function estimates when every word was said by spreading each segment's words
+    evenly over the segment, so word j of n starts at start + duration * j / n.
+
+    Returns: float64 array with the time of every word, in the same order as the words
+    '''
+    total_words = int(word_counts.sum())
+    positions_in_segment = np.arange(total_words) - np.repeat(np.cumsum(word_counts) - word_counts, word_counts)
+    seconds_per_word = np.divide(durations, word_counts, out=np.zeros_like(durations), where=word_counts > 0)
+    return np.repeat(starts, word_counts) + np.repeat(seconds_per_word, word_counts) * positions_in_segment
+
+
+def find_silence_gaps(starts: np.ndarray, durations: np.ndarray,
+                      min_silence_seconds: float = DEFAULT_MIN_SILENCE_SECONDS) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    This function finds the gaps where no segment is being said. Auto generated captions
+    overlap a lot, so a gap starts when the latest ending segment so far ends, not when
+    the one right before it does.
+
+    Parameters:
+    starts: sorted start times of the segments
+    durations: durations of the segments
+    min_silence_seconds: shortest gap that counts as a silence
+
+    Returns: tuple --> (array of the start time of every gap, array of its end time)
+    '''
+    if not len(starts):
+        return np.array([], dtype=np.float64), np.array([], dtype=np.float64)
+
+    # the time everything said so far is finished, with 0 in front for a quiet start to the video
+    spoken_until = np.concatenate(([0.0], np.maximum.accumulate(starts + durations)))[:-1]
+    is_gap = starts - spoken_until >= min_silence_seconds
+    return spoken_until[is_gap], starts[is_gap]
+
+
+def normalize_terms(terms: Iterable[str], tokenizer: Tokenizer = TIMELINE_TOKENIZER) -> list[str]:
+    '''
+    Returns: list of some search terms cleaned up the same way the transcript words are
+    '''
+    normalized_terms = []
+    for term in terms:
+        for word in tokenizer.clean_words(term.split()):
+            if word not in normalized_terms:
+                normalized_terms.append(word)
+    return normalized_terms
+
+
+def analyze_timeline(starts: np.ndarray, durations: np.ndarray, texts: list[str],
+                     bin_seconds: float = DEFAULT_BIN_SECONDS, top_k: int = 10, terms: Iterable[str] = None,
+                     min_silence_seconds: float = DEFAULT_MIN_SILENCE_SECONDS,
+                     tokenizer: Tokenizer = TIMELINE_TOKENIZER) -> dict:
+    '''
+    This function works out the speaking pace, the term frequencies over time and the
+    silent gaps of one transcript.
+
+    Parameters:
+    starts: start time of every segment in seconds, like from segments_to_arrays
+    durations: duration of every segment in seconds
+    texts: text of every segment
+    bin_seconds: how many seconds of video go in each time bin
+    top_k: how many of the most said words to track, if terms isn't given
+    terms: optional words to track instead of the top_k most said ones
+    min_silence_seconds: shortest gap that counts as a silence
+    tokenizer: the Tokenizer that splits the text into words
+
+    Returns: dictionary with:
+    "bin_seconds", "bin_starts" (start time of each bin), "words_per_bin" and
+    "words_per_minute" (one value per bin), "total_words", "duration_seconds",
+    "speaking_seconds", "average_words_per_minute" (over the time someone was talking),
+    "silence_gaps" (list of {"start", "end", "seconds"} dicts), "silence_seconds",
+    "terms" (list of {"term", "count", "first_seconds", "last_seconds"} dicts, the times
+    are None for words that were never said) and "term_counts" (array shaped
+    (terms, bins) of how many times each term was said in each bin)
+    '''
+    if bin_seconds <= 0:
+        raise ValueError("bin_seconds has to be more than 0")
+
+    starts = np.asarray(starts, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    order = np.argsort(starts, kind='stable')
+    if np.any(order != np.arange(len(order))):
+        starts, durations, texts = starts[order], durations[order], [texts[index] for index in order]
+
+    words, word_counts = tokenize_segments(texts, tokenizer)
+    word_times = get_word_times(starts, durations, word_counts)
+
+    duration_seconds = float((starts + durations).max()) if len(starts) else 0.0
+    bin_count = max(1, int(np.ceil(duration_seconds / bin_seconds)))
+    bin_starts = np.arange(bin_count) * bin_seconds
+    bin_lengths = np.clip(duration_seconds - bin_starts, 0.0, bin_seconds)
+    word_bins = np.minimum((word_times // bin_seconds).astype(np.int64), bin_count - 1)
+
+    words_per_bin = np.bincount(word_bins, minlength=bin_count)
+    words_per_minute = np.divide(words_per_bin * 60.0, bin_lengths, out=np.zeros(bin_count),
+                                 where=bin_lengths > 0)
+
+    silence_starts, silence_ends = find_silence_gaps(starts, durations, min_silence_seconds)
+    covered_seconds = np.concatenate(([0.0], np.maximum.accumulate(starts + durations)))
+    # everything up to the end of the video that wasn't a gap between segments (of any length)
+    speaking_seconds = duration_seconds - float(np.clip(starts - covered_seconds[:-1], 0.0, None).sum())
+
+    # give every unique word an ID (numbered with a dict, which is faster than np.unique on
+    # strings), then renumber them alphabetically so ties in the top words always come out
+    # in the same order, and pick out the words we're tracking
+    word_numbers = {}
+    first_seen_ids = np.fromiter((word_numbers.setdefault(word, len(word_numbers)) for word in words),
+                                 dtype=np.int64, count=len(words))
+    unique_words = sorted(word_numbers)
+    alphabetical_ids = np.empty(len(unique_words), dtype=np.int64)
+    alphabetical_ids[[word_numbers[word] for word in unique_words]] = np.arange(len(unique_words))
+    word_ids = alphabetical_ids[first_seen_ids]
+    word_totals = np.bincount(word_ids, minlength=len(unique_words))
+
+    if terms is None:
+        tracked_ids = np.argsort(-word_totals, kind='stable')[:top_k]
+        tracked_terms = [unique_words[word_id] for word_id in tracked_ids.tolist()]
+    else:
+        tracked_terms = normalize_terms(terms, tokenizer)
+        # words that were never said get an ID nothing has
+        tracked_ids = np.array([alphabetical_ids[word_numbers[term]] if term in word_numbers else len(unique_words)
+                                for term in tracked_terms], dtype=np.int64)
+
+    term_count = len(tracked_terms)
+    term_rows = np.full(len(unique_words) + 1, -1, dtype=np.int64)
+    term_rows[tracked_ids] = np.arange(term_count)
+    word_rows = term_rows[word_ids]
+    is_tracked = word_rows >= 0
+    tracked_rows, tracked_times = word_rows[is_tracked], word_times[is_tracked]
+
+    term_counts = np.bincount(tracked_rows * bin_count + word_bins[is_tracked],
+                              minlength=term_count * bin_count).reshape(term_count, bin_count)
+    first_seconds = np.full(term_count, np.inf)
+    last_seconds = np.full(term_count, -np.inf)
+    np.minimum.at(first_seconds, tracked_rows, tracked_times)
+    np.maximum.at(last_seconds, tracked_rows, tracked_times)
+
+    term_totals = term_counts.sum(axis=1)
+    return {
+        "bin_seconds": bin_seconds,
+        "bin_starts": bin_starts,
+        "words_per_bin": words_per_bin,
+        "words_per_minute": words_per_minute,
+        "total_words": len(words),
+        "duration_seconds": duration_seconds,
+        "speaking_seconds": speaking_seconds,
+        "average_words_per_minute": len(words) * 60.0 / speaking_seconds if speaking_seconds > 0 else 0.0,
+        "silence_gaps": [{"start": start, "end": end, "seconds": end - start}
+                         for start, end in zip(silence_starts.tolist(), silence_ends.tolist())],
+        "silence_seconds": float((silence_ends - silence_starts).sum()),
+        "terms": [{"term": term, "count": int(count),
+                   "first_seconds": float(first) if count else None,
+                   "last_seconds": float(last) if count else None}
+                  for term, count, first, last in zip(tracked_terms, term_totals, first_seconds, last_seconds)],
+        "term_counts": term_counts,
+    }
+
+
+def analyze_timeline_file(filename: str, **kwargs) -> dict:
+    '''
+    Runs analyze_timeline on a json transcript or segment store file. Takes the same
+    keyword arguments as analyze_timeline.
+    '''
+    return analyze_timeline(*load_segment_arrays(filename), **kwargs)
+
+
+def report_to_json(report: dict) -> str:
+    '''
+    Returns: json str of a report from analyze_timeline (numpy arrays become lists)
+    '''
+    return json.dumps({key: value.tolist() if isinstance(value, np.ndarray) else value
+                       for key, value in report.items()})
+
+
+def draw_timeline(figure, report: dict, filename: str) -> None:
+    '''
+    Draws the words per minute (with the silent gaps shaded in) over a heatmap of the
+    tracked terms per time bin onto a matplotlib figure. This is shared by plot_timeline
+    and the headless chart rendering.
+
+    Parameters:
+    figure: the matplotlib Figure to draw on
+    report: dictionary from analyze_timeline
+    filename: name of the transcript file, used for the chart title
+
+    Returns: None
+    '''
+    pace_axes, terms_axes = figure.subplots(2, 1, sharex=True)
+    bin_minutes = report["bin_seconds"] / 60
+    end_minutes = max(report["duration_seconds"] / 60, bin_minutes)
+
+    pace_axes.step(report["bin_starts"] / 60, report["words_per_minute"], where='post')
+    pace_axes.axhline(report["average_words_per_minute"], linestyle='--', color='gray',
+                      label=f'average: {report["average_words_per_minute"]:.0f} wpm')
+    # one broken_barh call for all the gaps, since a livestream can have thousands of them
+    pace_axes.broken_barh([(gap["start"] / 60, gap["seconds"] / 60) for gap in report["silence_gaps"]],
+                          (0, max(report["words_per_minute"].max(initial=0), 1)), color='red', alpha=0.2)
+    pace_axes.set_title(f'Words per Minute in "{os.path.splitext(os.path.basename(filename))[0]}" '
+                        f'({report["bin_seconds"]:g}s bins, silences in red)')
+    pace_axes.set_ylabel('Words per Minute')
+    pace_axes.legend(loc='upper right')
+
+    terms = [term["term"] for term in report["terms"]]
+    if terms:
+        image = terms_axes.imshow(report["term_counts"], aspect='auto', interpolation='nearest', cmap='viridis',
+                                  extent=(0, report["term_counts"].shape[1] * bin_minutes, len(terms) - 0.5, -0.5))
+        terms_axes.set_yticks(range(len(terms)), terms)
+        figure.colorbar(image, ax=terms_axes, label='Times Said', location='bottom', shrink=0.5)
+    terms_axes.set_xlim(0, end_minutes)
+    terms_axes.set_xlabel('Minutes')
+    terms_axes.set_ylabel('Words')
+
+
+def plot_timeline(report: dict, filename: str) -> None:
+    '''
+    Shows the words per minute and term frequency chart in a window, like
+    txt_file_analytics.plot_words does for the top words.
+
+    Parameters:
+    report: dictionary from analyze_timeline
+    filename: name of the transcript file, used for the chart title
+
+    Returns: None
+    '''
+    import matplotlib.pyplot as plt
+
+    figure = plt.figure(figsize=(16, 10))
+    draw_timeline(figure, report, filename)
+
+    figure.tight_layout()
+    plt.show()
+    plt.close(figure)
+
+
+def print_report(report: dict, longest_gaps: int = 5) -> None:
+    print(f'{report["total_words"]:,} words in {format_timestamp(report["duration_seconds"])}, '
+          f'{format_timestamp(report["speaking_seconds"])} of it talking: '
+          f'{report["average_words_per_minute"]:.0f} words per minute')
+
+    fastest_bin = int(np.argmax(report["words_per_minute"]))
+    print(f'Fastest bin: {report["words_per_minute"][fastest_bin]:.0f} words per minute '
+          f'at {format_timestamp(report["bin_starts"][fastest_bin])}')
+
+    print(f'\n{len(report["silence_gaps"]):,} silences, {report["silence_seconds"]:.0f}s total')
+    for gap in sorted(report["silence_gaps"], key=lambda gap: gap["seconds"], reverse=True)[:longest_gaps]:
+        print(f'  {gap["seconds"]:>7.1f}s at {format_timestamp(gap["start"])}')
+
+    print(f'\n{"word":<20} {"count":>7} {"first":>9} {"last":>9}')
+    for term in report["terms"]:
+        if term["count"]:
+            print(f'{term["term"]:<20} {term["count"]:>7,} {format_timestamp(term["first_seconds"]):>9} '
+                  f'{format_timestamp(term["last_seconds"]):>9}')
+        else:
+            print(f'{term["term"]:<20} {0:>7} {"-":>9} {"-":>9}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Words per minute, words over time and silences in a transcript.")
+    parser.add_argument("transcript", help="json transcript or segment store file")
+    parser.add_argument("--bin-seconds", type=float, default=DEFAULT_BIN_SECONDS, help="seconds in each time bin")
+    parser.add_argument("--top", type=int, default=10, help="how many of the most said words to track")
+    parser.add_argument("--terms", nargs="+", help="track these words instead of the most said ones")
+    parser.add_argument("--min-silence", type=float, default=DEFAULT_MIN_SILENCE_SECONDS,
+                        help="shortest gap in seconds that counts as a silence")
+    parser.add_argument("--json", help="save the whole report to this json file")
+    parser.add_argument("--chart", help="save a chart to this png/svg file")
+    parser.add_argument("--show", action="store_true", help="show the chart in a window")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    report = analyze_timeline_file(args.transcript, bin_seconds=args.bin_seconds, top_k=args.top,
+                                   terms=args.terms, min_silence_seconds=args.min_silence)
+    elapsed_seconds = time.perf_counter() - start_time
+
+    print_report(report)
+    print(f'\nAnalyzed in {elapsed_seconds:.3f}s')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json_file.write(report_to_json(report))
+
+    if args.chart:
+        from chart_rendering import render_timeline_chart
+        render_timeline_chart(report, args.transcript, [args.chart])
+
+    if args.show:
+        plot_timeline(report, args.transcript)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+'''
+This module finds the most common words without having to sort every word we've seen.
+
+For one file, exact_top_k uses a heap to pick the top k straight out of the word counts.
+For the whole archive, where keeping an exact count of every word ever said takes too
+much memory, SpaceSaving keeps a fixed number of counters no matter how many different
+words come through. Its counts can be too high, but never by more than
+total words / number of counters, and any word said more often than that is
+guaranteed to be in it.
+'''
+import heapq
+import math
+from typing import Iterable, Union
+
+
+def exact_top_k(word_counts: dict[str, int], k: int = 50) -> list[tuple[str, int]]:
+    '''
+    This function finds the k most common words with a heap, which is a lot less work
+    than sorting the whole dictionary when k is small.
+
+    Parameters:
+    word_counts: dictionary where the keys are words and the values are their counts
+    k: how many words to return
+
+    Returns: list of (word, count) tuples, most common first
+    '''
+    return heapq.nlargest(k, word_counts.items(), key=lambda item: item[1])
+
+
+class SpaceSaving:
+    '''
+    Approximate word counter that never keeps more than max_counters words. When a new
+    word shows up and all the counters are taken, the word with the smallest count is
+    replaced, and the new word starts at that smallest count (that's its possible error).
+
+    It keeps a count and an error for each of its max_counters words, plus a heap for
+    finding the smallest count fast. The heap has stale entries in it too, and it's
+    rebuilt whenever it gets to 2 * max_counters entries, so that's as big as it gets.
+
+    Parameters:
+    max_counters: how many words to keep track of at most. Use for_error_bound to pick it
+    from the error you can live with instead.
+    '''
+
+    def __init__(self, max_counters: int) -> None:
+        if max_counters < 1:
+            raise ValueError("max_counters has to be at least 1")
+
+        self.max_counters = max_counters
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+
+        # (count, word) pairs. Entries go stale when a word's count changes, and they're
+        # skipped (or cleaned out) when they get to the top.
+        self.heap = []
+
+    @classmethod
+    def for_error_bound(cls, relative_error: float) -> 'SpaceSaving':
+        '''
+        Makes a SpaceSaving counter whose counts are never off by more than
+        relative_error * the total number of words (for example 0.0001 is 0.01%).
+        '''
+        return cls(max_counters=math.ceil(1 / relative_error))
+
+    @property
+    def error_bound(self) -> float:
+        '''
+        Returns: the most any count can be too high by right now.
+        '''
+        return self.total / self.max_counters
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.counts
+
+    def update(self, word: str, count: int = 1) -> None:
+        '''
+        Adds count to a word's count.
+        '''
+        self.total += count
+
+        if word in self.counts:
+            self.counts[word] += count
+
+        elif len(self.counts) < self.max_counters:
+            self.counts[word] = count
+            self.errors[word] = 0
+
+        else:
+            smallest_count, smallest_word = self.pop_smallest()
+            del self.counts[smallest_word]
+            del self.errors[smallest_word]
+            self.counts[word] = smallest_count + count
+            self.errors[word] = smallest_count
+
+        heapq.heappush(self.heap, (self.counts[word], word))
+
+        # stale entries pile up as counts change, so rebuild the heap once in a while
+        if len(self.heap) >= 2 * self.max_counters:
+            self.rebuild_heap()
+
+    def update_many(self, words: Union[Iterable[str], dict[str, int]]) -> None:
+        '''
+        Adds a bunch of words at once, either one word at a time (like from tokenize_words)
+        or a dictionary / Counter of words and counts.
+        '''
+        if isinstance(words, dict):
+            for word, count in words.items():
+                self.update(word, count)
+        else:
+            for word in words:
+                self.update(word)
+
+    def rebuild_heap(self) -> None:
+        self.heap = [(count, word) for word, count in self.counts.items()]
+        heapq.heapify(self.heap)
+
+    def get_smallest_count(self) -> int:
+        '''
+        Returns: the most any word that isn't being tracked could have been seen. That's
+        the smallest count once every counter is taken, and 0 before that (nothing has
+        been dropped yet).
+        '''
+        if len(self.counts) < self.max_counters:
+            return 0
+        return min(self.counts.values())
+
+    def pop_smallest(self) -> tuple[int, str]:
+        while True:
+            count, word = heapq.heappop(self.heap)
+            if self.counts.get(word) == count:
+                return count, word
+
+    def merge(self, other: 'SpaceSaving') -> None:
+        '''
+        Merges another SpaceSaving counter into this one (like from another worker process),
+        keeping the max_counters biggest counts. A word only one side is tracking could
+        still have been seen by the other side up to that side's smallest count, so that
+        gets added to both its count and its error, which keeps the error bounds true.
+        '''
+        self_smallest_count = self.get_smallest_count()
+        other_smallest_count = other.get_smallest_count()
+
+        combined_counts = {}
+        combined_errors = {}
+        for word in [*self.counts, *(word for word in other.counts if word not in self.counts)]:
+            if word in self.counts:
+                count, error = self.counts[word], self.errors[word]
+            else:
+                count, error = self_smallest_count, self_smallest_count
+            if word in other.counts:
+                count, error = count + other.counts[word], error + other.errors[word]
+            else:
+                count, error = count + other_smallest_count, error + other_smallest_count
+            combined_counts[word] = count
+            combined_errors[word] = error
+
+        kept_words = heapq.nlargest(self.max_counters, combined_counts, key=combined_counts.get)
+        self.counts = {word: combined_counts[word] for word in kept_words}
+        self.errors = {word: combined_errors[word] for word in kept_words}
+        self.total += other.total
+        self.rebuild_heap()
+
+    def top(self, k: int = 50) -> list[tuple[str, int]]:
+        '''
+        Returns: list of the k (word, estimated count) tuples with the biggest counts, biggest first
+        '''
+        return exact_top_k(self.counts, k)
+
+    def top_with_errors(self, k: int = 50) -> list[tuple[str, int, int]]:
+        '''
+        Returns: list of (word, estimated count, max overestimate) tuples, biggest count first.
+        The real count is somewhere between estimated count - max overestimate and estimated count.
+        '''
+        return [(word, count, self.errors[word]) for word, count in self.top(k)]
+
+
+def get_top_words(word_counts: Union[dict[str, int], SpaceSaving], k: int = 50) -> list[tuple[str, int]]:
+    '''
+    Returns: the k most common (word, count) tuples from either an exact word count
+    dictionary or a SpaceSaving counter, most common first.
+    '''
+    if isinstance(word_counts, SpaceSaving):
+        return word_counts.top(k)
+    return exact_top_k(word_counts, k)
@@ -9,8 +9,13 @@ text file given the YT url provided from user input.
 from pytube import YouTube
 from youtube_transcript_api import YouTubeTranscriptApi
 from youtube_transcript_api.formatters import TextFormatter, JSONFormatter
+from youtube_urls import extract_video_id
+from transcript_cache import TranscriptCache
+from instrumentation import metrics
+from text_normalization import format_filename
 
 
+@metrics.timed("get_video_info")
 def get_video_info(video_url) -> tuple[str, str]:
         '''
         This function takes a YT url and returns its title and video ID.
@@ -24,29 +29,6 @@ def get_video_info(video_url) -> tuple[str, str]:
         return youtube.title, youtube.video_id, youtube.publish_date
 
 
-'''
-This function is generally only necessary when we are working with file formats that
-don't generally support text encoding of special characters like emojis. So this is 
-really just to help with barebones formatting situations.
-'''
-def remove_special_characters_from_string(input_string: str) -> str:
-    '''
-    This function takes a given input string and removes all characters that aren't
-    alpha-numeric or spaces. 
-
-    Parameters:
-    input_string: str you wish to format
-
-    Returns: formatted str
-    '''
-    new_string = ""
-    for character in input_string:
-        if character.isalnum() or character.isspace():
-            new_string += character
-
-    return new_string
-
-
 def format_filename_txt(video_title) -> str:
     '''
     This function takes a YT video and removes any characters that aren't alphanumeric,
@@ -58,7 +40,7 @@ def format_filename_txt(video_title) -> str:
 
     Returns: formatted str
     '''
-    return remove_special_characters_from_string(video_title).replace(" ", "_") + ".txt"
+    return format_filename(video_title, extension=".txt", spaces_to_underscores=True)
 
 
 def format_text_file_intro(video_title: str, video_url: str) -> str:
@@ -80,7 +62,7 @@ def format_text_file_intro(video_title: str, video_url: str) -> str:
     return text_file_header
 
 
-def get_text_from_video(video_id, formatter) -> str:
+def get_text_from_video(video_id, formatter, cache: TranscriptCache = None, language: str = "en") -> str:
     '''
     This function transcribes a youtube video given a youtube video ID. 
     You can extract the video ID from the url, it's that special character
@@ -88,11 +70,24 @@ def get_text_from_video(video_id, formatter) -> str:
 
     Parameters:
     video_id: str of video id from the YT vid you wish to transcribe
+    formatter: the youtube_transcript_api formatter to format the transcript with
+    cache: optional TranscriptCache, so videos we've already seen aren't fetched again
+    language: str of the transcript language code to get, like "en"
 
     Returns: Str of transcribed text, formatted in plain text for a text file.
     '''
-    transcript = YouTubeTranscriptApi.get_transcript(video_id=video_id)
-    formatted_txt = formatter.format_transcript(transcript=transcript)
+    @metrics.timed("get_transcript")
+    def fetch_segments(video_id):
+        return YouTubeTranscriptApi.get_transcript(video_id=video_id, languages=[language])
+
+    if cache:
+        return cache.get_or_fetch_formatted(video_id=video_id, formatter=formatter,
+                                            fetch_segments=fetch_segments, language=language)
+
+    transcript = fetch_segments(video_id=video_id)
+    metrics.increment("segments", len(transcript))
+    with metrics.stage("format"):
+        formatted_txt = formatter.format_transcript(transcript=transcript)
     
     return formatted_txt
 
@@ -111,23 +106,28 @@ def write_string_to_text_file(txt_filename: str, string_to_write: str) -> None:
         txt_file.write(string_to_write)
 
 
-def transcribe_video(video_url, formatted_type: str):
+def transcribe_video(video_url, formatted_type: str, cache: TranscriptCache = None, language: str = "en"):
     '''
     This function transcribes a video and returns either a json string or plain text.
 
     Parameters:
     formatted_type: a str of the type you want this to be formatted into. Like "json" for
     json strings or "txt" for plain text.
+    cache: optional TranscriptCache, so videos we've already seen aren't fetched again
+    language: str of the transcript language code to get, like "en"
 
     Returns: json str or plain text str
     '''
-    video_id = get_video_info(video_url=video_url)[1]
+    # the video ID is right there in the url, so there's no need to ask YT for it
+    video_id = extract_video_id(video_url)
     
     formatted_type = formatted_type.strip().lower()
     if formatted_type == "json":
-        txt_from_vid = get_text_from_video(video_id=video_id, formatter=JSONFormatter())
+        txt_from_vid = get_text_from_video(video_id=video_id, formatter=JSONFormatter(), cache=cache,
+                                           language=language)
         return txt_from_vid
 
     elif formatted_type == "text":
-        txt_from_vid = get_text_from_video(video_id=video_id, formatter=TextFormatter())
+        txt_from_vid = get_text_from_video(video_id=video_id, formatter=TextFormatter(), cache=cache,
+                                           language=language)
         return txt_from_vid
\ No newline at end of file
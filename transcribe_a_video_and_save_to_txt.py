@@ -8,7 +8,10 @@ text file given the YT url provided from user input.
 '''
 from pytube import YouTube
 from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.formatters import TextFormatter
+from youtube_urls import LazyVideoInfo
+from transcript_writer import TextStreamingFormatter, write_transcript
+from instrumentation import metrics
+import text_normalization
 
 
 def get_video_url_to_transcribe() -> str:
@@ -31,6 +34,7 @@ def get_video_url_to_transcribe() -> str:
             return video_to_transcribe
 
 
+@metrics.timed("get_video_info")
 def get_video_info(video_url) -> tuple[str, str]:
         '''
         This function takes a YT url and returns its title and video ID.
@@ -46,23 +50,6 @@ def get_video_info(video_url) -> tuple[str, str]:
         return title_of_video, video_id
 
 
-def remove_special_characters_from_string(input_string: str) -> str:
-    '''
-    This function takes a given input string and removes all characters that aren't
-    alpha-numeric or spaces. 
-
-    Parameters:
-    input_string: str you wish to format
-
-    Returns: formatted str
-    '''
-    new_string = ""
-    for character in input_string:
-        if character.isalnum() or character.isspace():
-            new_string += character
-    return new_string
-
-
 def format_filename(video_title) -> str:
     '''
     This function takes a YT video and removes any characters that aren't alphanumeric,
@@ -74,7 +61,7 @@ def format_filename(video_title) -> str:
 
     Returns: formatted str
     '''
-    return remove_special_characters_from_string(video_title) + ".txt"
+    return text_normalization.format_filename(video_title, extension=".txt")
 
 
 def format_text_file_intro(video_title: str, video_url: str) -> str:
@@ -96,22 +83,18 @@ def format_text_file_intro(video_title: str, video_url: str) -> str:
     return text_file_header
 
 
-def get_text_from_video(video_id) -> str:
+@metrics.timed("get_transcript")
+def get_transcript_segments(video_id) -> list[dict]:
     '''
-    This function transcribes a youtube video given a youtube video ID. 
-    You can extract the video ID from the url, it's that special character
-    part at the end of the url after the = sign and before any & signs.
+    This function gets the raw transcript of a youtube video given a youtube video ID,
+    without formatting it, so it can be written out one segment at a time.
 
     Parameters:
     video_id: str of video id from the YT vid you wish to transcribe
 
-    Returns: Str of transcribed text, formatted in plain text for a text file.
+    Returns: list of transcript segment dicts with "text", "start" and "duration" keys.
     '''
-    transcript = YouTubeTranscriptApi.get_transcript(video_id=video_id)
-    formatter = TextFormatter()
-    txt_formatted = formatter.format_transcript(transcript=transcript)
-    
-    return txt_formatted
+    return YouTubeTranscriptApi.get_transcript(video_id=video_id)
 
 
 def write_string_to_text_file(txt_filename: str, string_to_write: str) -> None:
@@ -128,21 +111,33 @@ def write_string_to_text_file(txt_filename: str, string_to_write: str) -> None:
         txt_file.write(string_to_write)
 
 
-def transcribe_video():
+def transcribe_video(existing_file_policy: str = "refuse"):
     '''
     This function asks for the user to input a video url, then transcribes that video into text.
     It then saves that text to a txt file in the same directory as this script is in.
+    The file is written a segment at a time and only shows up once it's complete.
+
+    Parameters:
+    existing_file_policy: what to do if the txt file already exists, "refuse" (tell the user and
+    leave it alone), "replace" or "skip". See transcript_writer.write_transcript.
 
     Returns: None
     '''
     video_url = get_video_url_to_transcribe()
-    video_title, video_id = get_video_info(video_url=video_url)
-    video_title = remove_special_characters_from_string(video_title)
+
+    # the video ID comes straight from the url, the title is only fetched when we use it below
+    video_info = LazyVideoInfo(video_url=video_url)
+    transcript_segments = get_transcript_segments(video_id=video_info.video_id)
+    video_title = text_normalization.remove_special_characters_from_string(video_info.title)
     txt_file_header = format_text_file_intro(video_title=video_title, video_url=video_url)
     txt_file_friendly_name = format_filename(video_title=video_title)
-    txt_from_vid = get_text_from_video(video_id=video_id)
-    total_txt_to_write = txt_file_header + txt_from_vid
-    write_string_to_text_file(txt_file_friendly_name, total_txt_to_write)
+    try:
+        write_transcript(filename=txt_file_friendly_name, segments=transcript_segments,
+                         formatter=TextStreamingFormatter(), header=txt_file_header,
+                         existing_file_policy=existing_file_policy)
+    except FileExistsError:
+        print(f"{txt_file_friendly_name} already exists, so it was left alone. "
+              "Delete or rename it if you want to transcribe this video again.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+'''
+This module is a little on-disk cache for transcripts and video info, so if we
+process a video we've already seen we don't have to ask YT for it again.
+
+The raw transcript segments are saved once per video ID + language, and the text
+or json versions are made from those whenever they're asked for (the last few are
+also kept in memory). Video info expires after a while since titles can change.
+When the cache gets bigger than its size limit, the least recently used files are
+deleted until it fits again.
+
+Cache folder layout:
+transcripts/<video_id>.<language>.json -> list of raw transcript segments
+metadata/<video_id>.json               -> video info plus the time it was fetched
+'''
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+DEFAULT_METADATA_TTL_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_FORMATTED_CACHE_SIZE = 128
+
+
+class TranscriptCache:
+    '''
+    Parameters:
+    cache_dir: str of the folder to keep the cache in (it's created if needed)
+    max_bytes: how big the cache folder is allowed to get before old files are deleted
+    metadata_ttl_seconds: how long video info is good for before it's fetched again
+    formatted_cache_size: how many formatted transcripts to keep in memory
+    '''
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 metadata_ttl_seconds: float = DEFAULT_METADATA_TTL_SECONDS,
+                 formatted_cache_size: int = DEFAULT_FORMATTED_CACHE_SIZE) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.metadata_ttl_seconds = metadata_ttl_seconds
+        self.formatted_cache_size = formatted_cache_size
+
+        self.hits = {"transcript": 0, "metadata": 0, "formatted": 0}
+        self.misses = {"transcript": 0, "metadata": 0, "formatted": 0}
+        self.evictions = 0
+
+        self.lock = threading.Lock()
+        self.formatted_transcripts = OrderedDict()
+
+        for folder in ("transcripts", "metadata"):
+            os.makedirs(os.path.join(cache_dir, folder), exist_ok=True)
+
+        # every cached file and its size, oldest access first. The file mtimes are
+        # used as the access times so the LRU order survives between runs.
+        self.files = OrderedDict()
+        self.total_bytes = 0
+        cached_files = []
+        for folder in ("transcripts", "metadata"):
+            for entry in os.scandir(os.path.join(cache_dir, folder)):
+                if entry.is_file() and entry.name.endswith('.json'):
+                    entry_stat = entry.stat()
+                    cached_files.append((entry_stat.st_mtime, entry.path, entry_stat.st_size))
+
+        for _, path, size in sorted(cached_files):
+            self.files[path] = size
+            self.total_bytes += size
+
+    def get_transcript_path(self, video_id: str, language: str) -> str:
+        return os.path.join(self.cache_dir, "transcripts", f"{video_id}.{language}.json")
+
+    def get_metadata_path(self, video_id: str) -> str:
+        return os.path.join(self.cache_dir, "metadata", f"{video_id}.json")
+
+    def read_json(self, path: str):
+        '''
+        Reads a cached file and marks it as just used. Returns None if it isn't cached.
+        '''
+        with self.lock:
+            if path not in self.files:
+                return None
+            self.files.move_to_end(path)
+
+        try:
+            with open(path, 'r', encoding='utf-8') as cached_file:
+                data = json.load(cached_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.remove(path)
+            return None
+
+        return data
+
+    def write_json(self, path: str, data) -> None:
+        '''
+        Saves something to the cache (through a temp file so it's never half written),
+        then deletes the least recently used files if the cache is over its size limit.
+        '''
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as cached_file:
+            json.dump(data, cached_file)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+
+        with self.lock:
+            self.total_bytes += size - self.files.pop(path, 0)
+            self.files[path] = size
+            paths_to_evict = []
+            while self.total_bytes > self.max_bytes and len(self.files) > 1:
+                old_path, old_size = self.files.popitem(last=False)
+                self.total_bytes -= old_size
+                paths_to_evict.append(old_path)
+            self.evictions += len(paths_to_evict)
+
+        for old_path in paths_to_evict:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+
+    def remove(self, path: str) -> None:
+        with self.lock:
+            self.total_bytes -= self.files.pop(path, 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get_segments(self, video_id: str, language: str = "en") -> list[dict]:
+        '''
+        Returns: the cached list of raw transcript segments, or None if we don't have them.
+        '''
+        segments = self.read_json(self.get_transcript_path(video_id, language))
+        self.count("transcript", segments is not None)
+        return segments
+
+    def put_segments(self, video_id: str, segments: list[dict], language: str = "en") -> None:
+        self.write_json(self.get_transcript_path(video_id, language), segments)
+
+    def get_or_fetch_segments(self, video_id: str, fetch_segments, language: str = "en") -> list[dict]:
+        '''
+        Returns the cached transcript segments, or calls fetch_segments(video_id) to
+        get them (and caches them) if we don't have them yet.
+
+        Parameters:
+        video_id: str of the YT video id
+        fetch_segments: function that takes a video id and returns its segments
+        language: str of the transcript language code
+
+        Returns: list of raw transcript segments
+        '''
+        segments = self.get_segments(video_id, language)
+        if segments is None:
+            segments = fetch_segments(video_id)
+            self.put_segments(video_id, segments, language)
+        return segments
+
+    def get_or_fetch_formatted(self, video_id: str, formatter, fetch_segments, language: str = "en") -> str:
+        '''
+        Returns the transcript formatted with the given formatter (like TextFormatter()
+        or JSONFormatter()). It's made from the cached raw segments, so each video only
+        has to be fetched once no matter how many formats we want it in.
+
+        Parameters:
+        video_id: str of the YT video id
+        formatter: any object with a format_transcript(transcript) method
+        fetch_segments: function that takes a video id and returns its segments
+        language: str of the transcript language code
+
+        Returns: formatted str
+        '''
+        key = (video_id, language, type(formatter).__name__)
+
+        with self.lock:
+            formatted = self.formatted_transcripts.get(key)
+            if formatted is not None:
+                self.formatted_transcripts.move_to_end(key)
+        self.count("formatted", formatted is not None)
+
+        if formatted is None:
+            segments = self.get_or_fetch_segments(video_id, fetch_segments, language)
+            formatted = formatter.format_transcript(transcript=segments)
+
+            with self.lock:
+                self.formatted_transcripts[key] = formatted
+                while len(self.formatted_transcripts) > self.formatted_cache_size:
+                    self.formatted_transcripts.popitem(last=False)
+
+        return formatted
+
+    def get_metadata(self, video_id: str) -> dict:
+        '''
+        Returns: the cached video info dictionary, or None if we don't have it or it's expired.
+        '''
+        cached_metadata = self.read_json(self.get_metadata_path(video_id))
+
+        if cached_metadata is not None and time.time() - cached_metadata["fetched_at"] > self.metadata_ttl_seconds:
+            cached_metadata = None
+
+        self.count("metadata", cached_metadata is not None)
+        return cached_metadata["metadata"] if cached_metadata else None
+
+    def put_metadata(self, video_id: str, metadata: dict) -> None:
+        '''
+        Caches the video info for a video. Everything in the dictionary has to be
+        json friendly, so convert dates to strings first.
+        '''
+        self.write_json(self.get_metadata_path(video_id), {"fetched_at": time.time(), "metadata": metadata})
+
+    def count(self, kind: str, hit: bool) -> None:
+        with self.lock:
+            if hit:
+                self.hits[kind] += 1
+            else:
+                self.misses[kind] += 1
+
+    def stats(self) -> dict:
+        '''
+        Returns: dictionary with the hit and miss counts, evictions, and how big the cache is.
+        '''
+        with self.lock:
+            return {
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+                "evictions": self.evictions,
+                "files": len(self.files),
+                "bytes": self.total_bytes,
+            }
@@ -0,0 +1,507 @@
+'''
+This module builds a searchable index out of the json transcripts (the ones you get
+from transcribe_a_video.transcribe_video(..., "json")), so we can answer "which videos
+said X, and at what second?" without re-reading every transcript.
+
+For every word we keep a list of (video number, word position in that video) pairs,
+called postings. Word positions run across segment boundaries, so phrase searches
+work even when a phrase is split between two segments. Each video also keeps the
+start time of every segment and the position of the first word in every segment,
+which is how a word position gets turned back into a time.
+
+Opening an index only maps the file and reads the small fixed size header, nothing is
+parsed up front no matter how many videos or words are in it. Words are found with a
+binary search through the sorted word block (the same way dictionary_index does it),
+and only the postings of the words being searched for are read.
+
+Index file layout (native byte order, every section starts 4 byte aligned):
+header            -> magic, video count, word count, total segments, total postings
+                     values, video id bytes, word bytes (8 bytes each)
+segment_indptr    -> video count + 1 uint64s, video i's segments are [indptr[i], indptr[i + 1])
+postings_indptr   -> word count + 1 uint64s, word i's postings are [indptr[i], indptr[i + 1])
+video_id_offsets  -> video count + 1 uint32s into the video id bytes
+word_offsets      -> word count + 1 uint32s into the word bytes
+segment starts    -> float32 start time of every segment of every video
+segment offsets   -> uint32 position of the first word of every segment of every video
+postings          -> uint32 (video number, position) pairs for every word
+video id bytes    -> every video id encoded as UTF-8, with nothing in between them
+word bytes        -> every word encoded as UTF-8, sorted, with nothing in between them
+
+Usage:
+python transcript_index.py build path/to/json/transcripts transcripts.tidx
+python transcript_index.py build path/to/json/transcripts transcripts.tidx --incremental
+python transcript_index.py search transcripts.tidx "for loop"
+'''
+import argparse
+import bisect
+import glob
+import json
+import mmap
+import os
+import re
+import operator
+import struct
+import sys
+from array import array
+from itertools import accumulate, repeat
+
+from manifest import Manifest
+
+
+INDEX_MAGIC = b'TIDX0002'
+INDEX_HEADER = struct.Struct('=8s6Q')
+MANIFEST_EXTENSION = '.manifest.json'
+
+# a word is letters, optionally joined by apostrophes or hyphens (like "don't" or "x-ray")
+SEARCH_WORD_PATTERN = re.compile(r"[^\W\d_]+(?:['-][^\W\d_]+)*")
+
+
+def tokenize_for_search(text: str) -> list[str]:
+    '''
+    Splits text into lowercase words for indexing and searching.
+
+    Parameters:
+    text: any string
+
+    Returns: list of lowercase words
+    '''
+    return SEARCH_WORD_PATTERN.findall(text.lower())
+
+
+class TranscriptIndexBuilder:
+    '''
+    Collects transcripts in memory and then saves them as an index file.
+    '''
+
+    def __init__(self) -> None:
+        self.video_ids = []
+        self.segment_starts = []
+        self.segment_word_offsets = []
+        self.postings = {}
+
+    def add_video(self, video_id: str, segments: list[dict]) -> None:
+        '''
+        Adds one video's transcript to the index.
+
+        Parameters:
+        video_id: str of the YT video id
+        segments: list of transcript segment dicts with "text" and "start" keys
+
+        Returns: None
+        '''
+        video_number = len(self.video_ids)
+        starts = array('f')
+        word_offsets = array('I')
+        position = 0
+
+        for segment in segments:
+            starts.append(segment["start"])
+            word_offsets.append(position)
+
+            for word in tokenize_for_search(segment["text"]):
+                word_postings = self.postings.get(word)
+                if word_postings is None:
+                    word_postings = self.postings[word] = array('I')
+                word_postings.append(video_number)
+                word_postings.append(position)
+                position += 1
+
+        self.video_ids.append(video_id)
+        self.segment_starts.append(starts)
+        self.segment_word_offsets.append(word_offsets)
+
+    def add_from_index(self, index: 'TranscriptIndex', video_ids_to_drop: set[str] = frozenset()) -> None:
+        '''
+        Copies everything from an existing index into this builder, except for the videos
+        in video_ids_to_drop. This reuses the saved postings, so none of the transcripts
+        have to be read or tokenized again.
+
+        Parameters:
+        index: the TranscriptIndex to copy from
+        video_ids_to_drop: video ids that should be left out (deleted or changed videos)
+
+        Returns: None
+        '''
+        new_video_numbers = {}
+        for old_video_number in range(len(index)):
+            video_id = index.get_video_id(old_video_number)
+            if video_id in video_ids_to_drop:
+                continue
+            new_video_numbers[old_video_number] = len(self.video_ids)
+            starts, word_offsets = index.get_segments(old_video_number)
+            self.video_ids.append(video_id)
+            self.segment_starts.append(starts)
+            self.segment_word_offsets.append(word_offsets)
+
+        # if the video numbers didn't move, the postings can be copied over as they are
+        numbers_unchanged = all(old == new for old, new in new_video_numbers.items()) \
+            and len(new_video_numbers) == len(index)
+
+        for word_number, word in index.iter_words():
+            old_postings = index.get_postings_by_number(word_number)
+
+            if not numbers_unchanged:
+                remapped_postings = array('I')
+                for i in range(0, len(old_postings), 2):
+                    new_video_number = new_video_numbers.get(old_postings[i])
+                    if new_video_number is not None:
+                        remapped_postings.append(new_video_number)
+                        remapped_postings.append(old_postings[i + 1])
+                old_postings = remapped_postings
+
+            if old_postings:
+                self.postings.setdefault(word, array('I')).extend(old_postings)
+
+    def save(self, index_filename: str) -> None:
+        '''
+        Saves the index to a file (through a temp file, so it's never half written).
+
+        Parameters:
+        index_filename: str of the file to save the index to
+
+        Returns: None
+        '''
+        encoded_video_ids = [video_id.encode() for video_id in self.video_ids]
+        sorted_words = sorted(self.postings, key=str.encode)
+        encoded_words = [word.encode() for word in sorted_words]
+
+        segment_indptr = array('Q', [0])
+        segment_indptr.extend(accumulate(len(starts) for starts in self.segment_starts))
+        postings_indptr = array('Q', [0])
+        postings_indptr.extend(accumulate(len(self.postings[word]) for word in sorted_words))
+        video_id_offsets = array('I', [0])
+        video_id_offsets.extend(accumulate(map(len, encoded_video_ids)))
+        word_offsets = array('I', [0])
+        word_offsets.extend(accumulate(map(len, encoded_words)))
+
+        header = INDEX_HEADER.pack(INDEX_MAGIC, len(self.video_ids), len(sorted_words), segment_indptr[-1],
+                                   postings_indptr[-1], video_id_offsets[-1], word_offsets[-1])
+
+        temp_filename = f'{index_filename}.{os.getpid()}.tmp'
+        with open(temp_filename, 'wb') as index_file:
+            index_file.write(header)
+            for section in (segment_indptr, postings_indptr, video_id_offsets, word_offsets):
+                section.tofile(index_file)
+            for starts in self.segment_starts:
+                starts.tofile(index_file)
+            for segment_word_offsets in self.segment_word_offsets:
+                segment_word_offsets.tofile(index_file)
+            for word in sorted_words:
+                self.postings[word].tofile(index_file)
+            index_file.write(b''.join(encoded_video_ids))
+            index_file.write(b''.join(encoded_words))
+
+        os.replace(temp_filename, index_filename)
+
+
+class TranscriptIndex:
+    '''
+    A saved transcript index, opened with memory mapping. Only the fixed size header is
+    read up front, words are binary searched for and their postings are read straight
+    out of the file when they're searched for.
+
+    Parameters:
+    index_filename: str of the index file to open
+    '''
+
+    def __init__(self, index_filename: str) -> None:
+        self.index_filename = index_filename
+
+        with open(index_filename, 'rb') as index_file:
+            self.mapped_file = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            (magic, self.video_count, self.word_count, segment_count, postings_count,
+             video_id_bytes, word_bytes) = INDEX_HEADER.unpack_from(self.mapped_file, 0)
+        except struct.error:
+            magic = None
+        if magic != INDEX_MAGIC:
+            self.mapped_file.close()
+            raise ValueError(f"{index_filename} is not a transcript index file (or was made by an older "
+                             f"version, build it again)")
+
+        file_size = (INDEX_HEADER.size + (self.video_count + 1) * 12 + (self.word_count + 1) * 12
+                     + segment_count * 8 + postings_count * 4 + video_id_bytes + word_bytes)
+        if len(self.mapped_file) < file_size:
+            self.mapped_file.close()
+            raise ValueError(f"{index_filename} is cut short, build it again")
+
+        self.views = []
+        position = INDEX_HEADER.size
+
+        def take_section(count: int, typecode: str) -> memoryview:
+            nonlocal position
+            size = count * struct.calcsize(typecode)
+            view = memoryview(self.mapped_file)[position:position + size].cast(typecode)
+            self.views.append(view)
+            position += size
+            return view
+
+        self.segment_indptr = take_section(self.video_count + 1, 'Q')
+        self.postings_indptr = take_section(self.word_count + 1, 'Q')
+        self.video_id_offsets = take_section(self.video_count + 1, 'I')
+        self.word_offsets = take_section(self.word_count + 1, 'I')
+        self.starts_start = position
+        self.segment_offsets_start = self.starts_start + segment_count * 4
+        self.postings_start = self.segment_offsets_start + segment_count * 4
+        self.video_ids_start = self.postings_start + postings_count * 4
+        self.words_start = self.video_ids_start + video_id_bytes
+
+    def __len__(self) -> int:
+        return self.video_count
+
+    def read_array(self, start: int, count: int, typecode: str) -> array:
+        values = array(typecode)
+        values.frombytes(self.mapped_file[start:start + count * values.itemsize])
+        return values
+
+    def get_video_id(self, video_number: int) -> str:
+        start = self.video_ids_start + self.video_id_offsets[video_number]
+        end = self.video_ids_start + self.video_id_offsets[video_number + 1]
+        return self.mapped_file[start:end].decode()
+
+    def get_encoded_word(self, word_number: int) -> bytes:
+        start = self.words_start + self.word_offsets[word_number]
+        end = self.words_start + self.word_offsets[word_number + 1]
+        return self.mapped_file[start:end]
+
+    def find_word(self, word: str) -> int:
+        '''
+        Returns: the word's number (its place in the sorted words), or -1 if it's not in the index.
+        '''
+        encoded_word = word.encode()
+        low, high = 0, self.word_count
+
+        while low < high:
+            middle = (low + high) // 2
+            middle_word = self.get_encoded_word(middle)
+
+            if middle_word < encoded_word:
+                low = middle + 1
+            elif middle_word > encoded_word:
+                high = middle
+            else:
+                return middle
+
+        return -1
+
+    def iter_words(self):
+        '''
+        Returns: generator of every (word number, word) in the index, in sorted order.
+        '''
+        for word_number in range(self.word_count):
+            yield word_number, self.get_encoded_word(word_number).decode()
+
+    def get_postings_count(self, word_number: int) -> int:
+        if word_number < 0:
+            return 0
+        return self.postings_indptr[word_number + 1] - self.postings_indptr[word_number]
+
+    def get_postings_by_number(self, word_number: int) -> array:
+        if word_number < 0:
+            return array('I')
+        start = self.postings_indptr[word_number]
+        return self.read_array(self.postings_start + start * 4, self.get_postings_count(word_number), 'I')
+
+    def get_postings(self, word: str) -> array:
+        '''
+        Returns: array of flattened (video number, position) pairs for a word.
+        '''
+        return self.get_postings_by_number(self.find_word(word))
+
+    def get_segments(self, video_number: int) -> tuple[array, array]:
+        '''
+        Returns: Tuple --> (segment start times, position of the first word of each segment)
+        '''
+        first_segment = self.segment_indptr[video_number]
+        segment_count = self.segment_indptr[video_number + 1] - first_segment
+        return (self.read_array(self.starts_start + first_segment * 4, segment_count, 'f'),
+                self.read_array(self.segment_offsets_start + first_segment * 4, segment_count, 'I'))
+
+    def get_phrase_starts(self, word: str, word_index: int) -> set[tuple[int, int]]:
+        '''
+        Returns: set of (video number, position) pairs where a phrase would have to start
+        for this word to be at word_index in it.
+        '''
+        word_postings = self.get_postings(word)
+        return set(zip(word_postings[0::2], map(operator.sub, word_postings[1::2], repeat(word_index))))
+
+    def search(self, query: str) -> list[tuple[str, float]]:
+        '''
+        Finds every place a word or phrase was said. A query with more than one word
+        is treated as a phrase, so the words have to be said in that order, back to back.
+
+        Parameters:
+        query: str of the word or phrase to look for
+
+        Returns: sorted list of (video_id, segment start time in seconds) tuples, one
+        per segment the word or phrase starts in.
+        '''
+        query_words = tokenize_for_search(query)
+        if not query_words:
+            return []
+
+        # start from the rarest word, it has the fewest postings to check
+        word_numbers = [self.find_word(word) for word in query_words]
+        rarest_index = min(range(len(query_words)), key=lambda i: self.get_postings_count(word_numbers[i]))
+        matches = self.get_phrase_starts(query_words[rarest_index], rarest_index)
+
+        for word_index, word in enumerate(query_words):
+            if word_index == rarest_index or not matches:
+                continue
+            matches &= self.get_phrase_starts(word, word_index)
+
+        results = set()
+        segments_by_video = {}
+        for video_number, position in matches:
+            if video_number not in segments_by_video:
+                segments_by_video[video_number] = self.get_segments(video_number)
+            starts, word_offsets = segments_by_video[video_number]
+            segment_number = bisect.bisect_right(word_offsets, position) - 1
+            results.add((self.get_video_id(video_number), starts[segment_number]))
+
+        return sorted(results)
+
+    def close(self) -> None:
+        for view in self.views:
+            view.release()
+        self.mapped_file.close()
+
+
+def is_current_index_file(index_filename: str) -> bool:
+    '''
+    Returns: True if the file exists and was saved in this version's index layout.
+    '''
+    if not os.path.exists(index_filename):
+        return False
+    with open(index_filename, 'rb') as index_file:
+        return index_file.read(len(INDEX_MAGIC)) == INDEX_MAGIC
+
+
+def build_index_from_json_files(json_filenames: list[str], index_filename: str) -> int:
+    '''
+    Builds an index from json transcript files. The video id is taken from the file
+    name, like the <video_id>.json files batch_transcription.py saves. The manifest is
+    saved too, so a later update_index_from_json_files knows what's already in the index.
+
+    Parameters:
+    json_filenames: list of json transcript files
+    index_filename: str of the file to save the index to
+
+    Returns: int of how many videos were indexed
+    '''
+    builder = TranscriptIndexBuilder()
+    manifest = Manifest(index_filename + MANIFEST_EXTENSION)
+    manifest.entries = {}
+
+    for json_filename in json_filenames:
+        video_id = os.path.splitext(os.path.basename(json_filename))[0]
+        with open(json_filename, 'r', encoding='utf-8') as json_file:
+            builder.add_video(video_id, json.load(json_file))
+        manifest.update(json_filename, video_id=video_id)
+
+    builder.save(index_filename)
+    manifest.save()
+    return len(builder.video_ids)
+
+
+def update_index_from_json_files(json_filenames: list[str], index_filename: str) -> dict[str, int]:
+    '''
+    This is the incremental version of build_index_from_json_files. A manifest saved
+    next to the index remembers which json files went into it, so only new or changed
+    transcripts get read, and deleted ones are taken back out. If nothing changed the
+    index isn't touched at all.
+
+    Parameters:
+    json_filenames: list of every json transcript file that should be in the index
+    index_filename: str of the index file to update. It's built from scratch if it doesn't
+    exist yet, was saved by an older version, or if there's no manifest for it (then
+    there's no way to tell which files are already in it).
+
+    Returns: dictionary with how many files were "added", "changed", "appended", "deleted"
+    and "unchanged"
+    '''
+    manifest = Manifest(index_filename + MANIFEST_EXTENSION)
+    rebuild = not is_current_index_file(index_filename) or not manifest.entries
+    if rebuild:
+        manifest.entries = {}
+
+    changes = manifest.scan(json_filenames)
+    # an appended json file isn't valid json anymore, so treat it like any other change
+    paths_to_read = changes["added"] + changes["changed"] + changes["appended"]
+    paths_to_drop = changes["changed"] + changes["appended"] + changes["deleted"]
+
+    if paths_to_read or paths_to_drop or rebuild:
+        builder = TranscriptIndexBuilder()
+
+        if not rebuild:
+            index = TranscriptIndex(index_filename)
+            builder.add_from_index(index, {manifest.get(path)["video_id"] for path in paths_to_drop})
+            index.close()
+
+        for path in paths_to_read:
+            video_id = os.path.splitext(os.path.basename(path))[0]
+            with open(path, 'r', encoding='utf-8') as json_file:
+                builder.add_video(video_id, json.load(json_file))
+            manifest.update(path, video_id=video_id)
+
+        for path in changes["deleted"]:
+            manifest.remove(path)
+
+        builder.save(index_filename)
+
+    manifest.save()
+    return {change_type: len(paths) for change_type, paths in changes.items()}
+
+
+def format_timestamp(seconds: float) -> str:
+    '''
+    Returns: str like "1:02:03" or "2:03" for a number of seconds
+    '''
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{seconds:02d}' if hours else f'{minutes}:{seconds:02d}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or search a transcript index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="build an index from a folder of json transcripts")
+    build_parser.add_argument("json_dir", help="folder of <video_id>.json transcript files")
+    build_parser.add_argument("index_file", help="where to save the index")
+    build_parser.add_argument("--incremental", action="store_true",
+                              help="only read json files that are new or changed since the last build")
+
+    search_parser = subparsers.add_parser("search", help="search an index for a word or phrase")
+    search_parser.add_argument("index_file", help="the index to search")
+    search_parser.add_argument("query", help="word or phrase to look for")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        json_filenames = sorted(glob.glob(os.path.join(args.json_dir, '*.json')))
+
+        if args.incremental:
+            changes = update_index_from_json_files(json_filenames, args.index_file)
+            print(f'{changes["added"]} added, {changes["changed"] + changes["appended"]} changed, '
+                  f'{changes["deleted"]} deleted, {changes["unchanged"]} unchanged in {args.index_file}')
+        else:
+            video_count = build_index_from_json_files(json_filenames, args.index_file)
+            print(f"Indexed {video_count} videos into {args.index_file}")
+
+    else:
+        index = TranscriptIndex(args.index_file)
+        results = index.search(args.query)
+        index.close()
+
+        if not results:
+            print(f'Nobody said "{args.query}"...')
+            sys.exit(1)
+
+        for video_id, start in results:
+            print(f'https://youtu.be/{video_id}?t={int(start)}  ({format_timestamp(start)})')
+
+
+if __name__ == "__main__":
+    main()
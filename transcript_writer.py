@@ -0,0 +1,201 @@
+'''
+This module writes transcripts to files one segment at a time, so the whole formatted
+transcript never has to be built as one big string first. Everything is written to a
+temp file in the same folder and then renamed into place, so you never end up with a
+half written file, and re-running a transcription can't accidentally double a file
+like appending to it would.
+
+There's a streaming formatter for each output type: plain text (same output as
+youtube_transcript_api's TextFormatter), json (same as JSONFormatter), SRT and WebVTT.
+'''
+import json
+import os
+import tempfile
+from typing import Iterable
+
+from instrumentation import metrics
+
+
+class StreamingFormatter:
+    '''
+    Formats a transcript a piece at a time. The output is header(), then
+    format_segment() for every segment, then footer(). file_extension is the
+    extension files of this type normally use.
+    '''
+    file_extension = ''
+
+    def header(self) -> str:
+        return ''
+
+    def format_segment(self, segment: dict, segment_number: int) -> str:
+        raise NotImplementedError
+
+    def footer(self) -> str:
+        return ''
+
+    def iter_transcript(self, segments: Iterable[dict]):
+        '''
+        Returns: generator of formatted str pieces for the whole transcript.
+        '''
+        yield self.header()
+        for segment_number, segment in enumerate(segments):
+            yield self.format_segment(segment, segment_number)
+        yield self.footer()
+
+
+class TextStreamingFormatter(StreamingFormatter):
+    '''
+    One segment per line, the same as TextFormatter.
+    '''
+    file_extension = '.txt'
+
+    def format_segment(self, segment: dict, segment_number: int) -> str:
+        return segment["text"] if segment_number == 0 else '\n' + segment["text"]
+
+
+class JSONStreamingFormatter(StreamingFormatter):
+    '''
+    A json list of the segment dicts, the same as JSONFormatter.
+    '''
+    file_extension = '.json'
+
+    def header(self) -> str:
+        return '['
+
+    def format_segment(self, segment: dict, segment_number: int) -> str:
+        return json.dumps(segment) if segment_number == 0 else ', ' + json.dumps(segment)
+
+    def footer(self) -> str:
+        return ']'
+
+
+def format_timestamp(seconds: float, milliseconds_separator: str) -> str:
+    '''
+    Returns: str like "01:02:03,456" (SRT) or "01:02:03.456" (VTT) for a number of seconds
+    '''
+    total_milliseconds = round(seconds * 1000)
+    hours, total_milliseconds = divmod(total_milliseconds, 3_600_000)
+    minutes, total_milliseconds = divmod(total_milliseconds, 60_000)
+    seconds, milliseconds = divmod(total_milliseconds, 1000)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}{milliseconds_separator}{milliseconds:03d}'
+
+
+class SRTStreamingFormatter(StreamingFormatter):
+    '''
+    SubRip subtitles (.srt).
+    '''
+    file_extension = '.srt'
+
+    def format_segment(self, segment: dict, segment_number: int) -> str:
+        start = format_timestamp(segment["start"], ',')
+        end = format_timestamp(segment["start"] + segment["duration"], ',')
+        return f'{segment_number + 1}\n{start} --> {end}\n{segment["text"]}\n\n'
+
+
+class VTTStreamingFormatter(StreamingFormatter):
+    '''
+    WebVTT subtitles (.vtt).
+    '''
+    file_extension = '.vtt'
+
+    def header(self) -> str:
+        return 'WEBVTT\n\n'
+
+    def format_segment(self, segment: dict, segment_number: int) -> str:
+        start = format_timestamp(segment["start"], '.')
+        end = format_timestamp(segment["start"] + segment["duration"], '.')
+        return f'{start} --> {end}\n{segment["text"]}\n\n'
+
+
+STREAMING_FORMATTERS = {
+    "text": TextStreamingFormatter,
+    "txt": TextStreamingFormatter,
+    "json": JSONStreamingFormatter,
+    "srt": SRTStreamingFormatter,
+    "vtt": VTTStreamingFormatter,
+}
+
+# what to do if the output file already exists
+EXISTING_FILE_POLICIES = ("refuse", "replace", "skip")
+
+
+def get_streaming_formatter(formatted_type: str) -> StreamingFormatter:
+    '''
+    Returns: a new streaming formatter for "text"/"txt", "json", "srt" or "vtt"
+    '''
+    formatted_type = formatted_type.strip().lower()
+    if formatted_type not in STREAMING_FORMATTERS:
+        raise ValueError(f"I don't know how to format a transcript as {formatted_type}, "
+                         f"please use one of these: {', '.join(STREAMING_FORMATTERS)}")
+    return STREAMING_FORMATTERS[formatted_type]()
+
+
+@metrics.timed("write_transcript")
+def write_transcript(filename: str, segments: Iterable[dict], formatter: StreamingFormatter,
+                     header: str = '', existing_file_policy: str = "refuse") -> bool:
+    '''
+    This function writes a transcript to a file one segment at a time as the segments
+    come in. It writes to a temp file next to the real one and only moves it into
+    place once everything was written, so the real file is either the old one or the
+    complete new one, never something in between.
+
+    Parameters:
+    filename: str of the file to save the transcript to
+    segments: any iterable of transcript segment dicts (a list or a generator)
+    formatter: the StreamingFormatter to format the segments with
+    header: optional str to write before the transcript, like the txt file intro
+    existing_file_policy: what to do if the file already exists. "refuse" raises a
+    FileExistsError, "replace" overwrites it, and "skip" leaves it alone.
+
+    Returns: True if the file was written, False if it was skipped.
+    '''
+    if existing_file_policy not in EXISTING_FILE_POLICIES:
+        raise ValueError(f"existing_file_policy has to be one of {EXISTING_FILE_POLICIES}")
+
+    if existing_file_policy != "replace" and os.path.exists(filename):
+        if existing_file_policy == "skip":
+            return False
+        raise FileExistsError(f"{filename} already exists, not overwriting it")
+
+    folder = os.path.dirname(os.path.abspath(filename))
+    temp_file_descriptor, temp_filename = tempfile.mkstemp(
+        dir=folder, prefix='.' + os.path.basename(filename) + '.', suffix='.tmp')
+
+    try:
+        with open(temp_file_descriptor, 'w', encoding='utf-8', newline='') as temp_file:
+            temp_file.write(header)
+            # only the time spent in the formatter counts as formatting, the writes count as write_transcript
+            for piece in metrics.timed_iterator("format", formatter.iter_transcript(segments)):
+                temp_file.write(piece)
+            temp_file.flush()
+            with metrics.stage("fsync"):
+                os.fsync(temp_file.fileno())
+            if metrics.enabled:
+                metrics.increment("bytes_written", os.fstat(temp_file.fileno()).st_size)
+
+        # mkstemp makes the file private to us, but transcripts should be readable like normal files
+        os.chmod(temp_filename, 0o644)
+
+        if existing_file_policy == "replace":
+            os.replace(temp_filename, filename)
+            return True
+
+        # linking fails if the file showed up while we were writing, so we never clobber it
+        try:
+            os.link(temp_filename, filename)
+        except FileExistsError:
+            if existing_file_policy == "skip":
+                return False
+            raise
+        except OSError:
+            # some file systems can't do hard links, so fall back to a plain rename
+            if os.path.exists(filename):
+                if existing_file_policy == "skip":
+                    return False
+                raise FileExistsError(f"{filename} already exists, not overwriting it")
+            os.replace(temp_filename, filename)
+        return True
+
+    finally:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
@@ -4,8 +4,21 @@ Date: 10/18/2023
 
 Just a collection of functions you can use to analyze the data 
 from those text transcription files.
+
+matplotlib is only imported when you actually plot something, so the word counting
+functions load fast. For saving charts to files without any windows popping up,
+see chart_rendering.py.
 '''
-import matplotlib.pyplot as plt
+import os
+from collections import Counter
+from typing import Container, Iterable, Iterator, Union
+
+from dictionary_index import load_dictionary_index
+from text_normalization import DEFAULT_TOKENIZER
+from top_k import SpaceSaving, get_top_words
+
+# how many characters to read at a time when streaming a file (1 MiB-ish)
+DEFAULT_CHUNK_SIZE = 1 << 20
 
 
 def extract_text_from_file(filename: str) -> str:
@@ -18,56 +31,142 @@ def extract_text_from_file(filename: str) -> str:
     Returns: str containing all the text from the text file unmodified in any way.
     '''
 
-    file_txt = ''
     with open(filename, 'r') as txtfile:
-        for line in txtfile:
-            file_txt += line
+        return txtfile.read()
 
-    return file_txt
+
+def iter_text_chunks(filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE, start_offset: int = 0) -> Iterator[str]:
+    '''
+    This function reads a txt file a chunk at a time instead of all at once, so
+    it only ever holds one chunk of the file in memory no matter how big the file is.
+
+    Parameters:
+    filename: str of the name of txt file you wish to read
+    chunk_size: how many characters to read at a time
+    start_offset: byte offset to start reading from, like the old size of a file that
+    was appended to. It has to be at the start of a character.
+
+    Returns: generator of str chunks of the file, in order.
+    '''
+    with open(filename, 'r') as txtfile:
+        if start_offset:
+            txtfile.seek(start_offset)
+
+        while True:
+            chunk = txtfile.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def split_text_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    '''
+    This function splits chunks of text into words on whitespace. If a chunk ends
+    in the middle of a word, that piece is held onto and glued to the start of the 
+    next chunk, so words are never cut in half at the chunk boundaries.
+
+    Parameters:
+    chunks: any iterable of str chunks, like the generator from iter_text_chunks
+
+    Returns: generator of the raw (not cleaned up) words, in order.
+    '''
+    leftover = ''
+    for chunk in chunks:
+        chunk = leftover + chunk
+        words = chunk.split()
+        
+        if words and not chunk[-1].isspace():
+            leftover = words.pop()
+        else:
+            leftover = ''
+
+        yield from words
+
+    if leftover:
+        yield leftover
 
 
 def strip_words(input_string):
-    return [word.strip() for word in input_string.split()]
+    # split() already drops all the whitespace around each word
+    return input_string.split()
 
 
-def build_word_set(input_string: str) -> set[str]:
+def clean_words(raw_words: Iterable[str]) -> Iterator[str]:
+    '''
+    This function yields each word with all its non-letter characters (other than 
+    hyphens) removed. Single letter "words" that aren't "a" or "i" are skipped since 
+    those are usually transcription noise. See text_normalization.Tokenizer if you
+    want different rules, like case folding or splitting on hyphens.
+
+    Parameters:
+    raw_words: any iterable of words split on whitespace
+
+    Returns: generator of cleaned up words, in the order they were given.
     '''
-    This function takes an input string, splits it, sorts it, converts it 
-    to a set, and then returns that set. It also removes any non-alpha characters.
+    return DEFAULT_TOKENIZER.clean_words(raw_words)
+
+
+def tokenize_words(input_string: str) -> Iterator[str]:
+    '''
+    This function splits a string on whitespace and cleans up each word (see clean_words).
 
     Parameters:
     input_string: any string (preferably with words lol)
 
-    Returns: a sorted set of the string which contains no special chars other than
-    a hyphen symbol and will be only the unique words in that set. 
+    Returns: generator of cleaned up words, in the order they appear in the string.
+    '''
+    return clean_words(input_string.split())
+
+
+def iter_words_from_file(filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE, start_offset: int = 0) -> Iterator[str]:
+    '''
+    This function streams the cleaned up words out of a txt file without ever reading
+    the whole file into memory, so it works the same on an 80 KB transcript or on 
+    several GB of transcripts glued together.
+
+    Parameters:
+    filename: str of the name of txt file you wish to get the words from
+    chunk_size: how many characters to read at a time
+    start_offset: byte offset to start reading from (see iter_text_chunks)
+
+    Returns: generator of cleaned up words, in the order they appear in the file.
     '''
+    return clean_words(split_text_chunks(iter_text_chunks(filename, chunk_size, start_offset)))
 
-    # first let's split the string into a list of words
-    split_string = input_string.split()
 
-    # next let's remove the whitespace from the strings in that list.
-    for word in split_string.copy():
+def count_words(words: Iterable[str]) -> Counter:
+    '''
+    This function counts every word in one pass over the words, so it costs the same
+    no matter how many unique words there are.
 
-        # I noticed a lot of single letter "words" that aren't right, so
-        # let's remove those too while we're at it.
-        if len(word) == 1 and word not in ['a', 'i']:
-            split_string.remove(word)
+    Parameters:
+    words: any iterable of words, like the generator from tokenize_words
 
-        # while we're in here, let's just remove all non letter characters
-        for character in word:
-            if not character.isalpha() and character != "-":
-                character = ''
+    Returns: Counter where the keys are the unique words and the values are how many
+    times each word showed up.
+    '''
+    return Counter(words)
 
-    # now let's sort the list and the convert it to a set. 
-    sorted_set_of_words = set(sorted(split_string))
 
-    return sorted_set_of_words
+def build_word_set(input_string: str) -> set[str]:
+    '''
+    This function takes an input string, splits it into words, and returns only 
+    the unique words. It also removes any non-alpha characters.
+
+    Parameters:
+    input_string: any string (preferably with words lol)
+
+    Returns: a set of the string which contains no special chars other than
+    a hyphen symbol and will be only the unique words in that set. 
+    '''
+    return set(tokenize_words(input_string))
 
 
 def build_unique_word_dictionary(input_string: str) -> dict[str, int]:
     '''
     This function will take a string, identify only the unique words, 
     then count how many times those words appeared in the original string.
+    Only whole words are counted, so "a" isn't counted inside of "cat".
 
     Parameters: 
     input_string: any string you wish to count the unique words in
@@ -75,33 +174,43 @@ def build_unique_word_dictionary(input_string: str) -> dict[str, int]:
     Returns: dictionary where the keys are the unique words and the
     values are the times those words were found in the string. 
     '''
+    return dict(count_words(tokenize_words(input_string)))
 
-    unique_word_set = build_word_set(input_string=input_string)
 
-    unique_word_count_dict = {}
+def build_unique_word_dictionary_from_file(filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict[str, int]:
+    '''
+    Same as build_unique_word_dictionary, but it streams the words out of a file
+    instead of needing the whole text as one string first. Only the word counts
+    are kept in memory.
 
-    for word in unique_word_set:
-        unique_word_count_dict[word] = input_string.count(word)
+    Parameters:
+    filename: str of the name of txt file you wish to count the unique words in
+    chunk_size: how many characters to read at a time
 
-    return unique_word_count_dict
+    Returns: dictionary where the keys are the unique words and the
+    values are the times those words were found in the file.
+    '''
+    return dict(count_words(iter_words_from_file(filename, chunk_size)))
 
 
-def extract_only_actual_words(input_string: str, list_of_actual_words: list[str]) -> str:
+def extract_only_actual_words(input_string: str, list_of_actual_words: Container[str]) -> str:
     '''
     This function takes a word list of known real words and compares it to transcription
     words to make sure the transcription is actually using real words. 
 
     Parameters: 
     input_string: any string you wish to clear non-real words out of.
+    list_of_actual_words: the real words to check against. A set or a DictionaryIndex
+    is a lot faster here than a list.
 
     Returns: input_string with only legit words
     '''
-    return ' '.join([word for word in input_string.strip() if word in list_of_actual_words])
+    return ' '.join([word for word in input_string.split() if word in list_of_actual_words])
 
 
-def word_dictionary_real_word_extraction(word_dict: dict[str, int], valid_words: list[str]) -> dict[str, int]:
+def word_dictionary_real_word_extraction(word_dict: dict[str, int], valid_words: Container[str]) -> dict[str, int]:
     '''
-    This function uses a list comprehension to return a new copy of the word dictionary
+    This function uses a dictionary comprehension to return a new copy of the word dictionary
     with only real legit words in it. (This is necessary for transcription text
     because sometimes the transcription likes to just record sounds that aren't real
     words).
@@ -109,20 +218,40 @@ def word_dictionary_real_word_extraction(word_dict: dict[str, int], valid_words:
     Parameters:
     word_dict: a dictionary where the keys are unique words and the values are
     the number of times those words appear in the original string.
-    valid_words: a list of strings of valid words to check the words against.
+    valid_words: the valid words to check the words against. A set or a DictionaryIndex
+    is a lot faster here than a list.
 
     Returns: a new dictionary with only valid word keys
     '''
-    valid_word_dict = {}
+    return {word: count for word, count in word_dict.items() if word in valid_words}
+
+
+def draw_top_words(axes, top_words: list[tuple[str, int]], filename: str) -> None:
+    '''
+    Draws the horizontal bar chart of the top words onto a set of matplotlib axes.
+    This is shared by plot_words and the headless chart rendering.
+
+    Parameters:
+    axes: the matplotlib Axes to draw on
+    top_words: list of (word, count) tuples, most common first
+    filename: name of the file as a string, this is used for the chart title
+
+    Returns: None
+    '''
+    # flip them so the most spoken word ends up at the top of the chart
+    words, counts = zip(*top_words[::-1])
 
-    for word, count in word_dict.items():
-        if word in valid_words:
-            valid_word_dict[word] = count
+    axes.barh(words, counts)
+    axes.set_title(f'{len(words)} Most Spoken Words in \"{os.path.basename(filename).replace(".txt", "")}\"')
+    axes.set_xlabel('Word Frequency')
+    axes.set_ylabel('Words')
 
-    return valid_word_dict
+    # Add data labels
+    for i, count in enumerate(counts):
+        axes.text(count, i, str(count), va='center', fontsize=10)
 
 
-def plot_words(word_dict: dict[str, int], filename: str) -> None:
+def plot_words(word_dict: Union[dict[str, int], SpaceSaving], filename: str, top_k: int = 50) -> None:
     '''
     The purpose of this function is to plot the unique word counts 
     mainly just for my own amusement. (lol)
@@ -130,33 +259,25 @@ def plot_words(word_dict: dict[str, int], filename: str) -> None:
     Parameters:
     word_dict: a dictionary object of words where the keys are the unique words 
     from a given input_string and the values are the amount of times those words are
-    found in the input_string. 
+    found in the input_string. A top_k.SpaceSaving counter works too, for when the 
+    words came from way too much text to count exactly.
     filename: name of the file as a string, this is used for the chart title
+    top_k: how many of the most spoken words to plot
 
     Returns: None
     '''
-    
-    words = word_dict.keys()
-    counts = word_dict.values()
-    # Sort the dictionary by values (word counts) in descending order and take the top 50
-    top_words = sorted(word_dict.items(), key=lambda item: item[1], reverse=True)[:50][::-1]
+    import matplotlib.pyplot as plt
 
-    # Separate the top words and their counts
-    words, counts = zip(*top_words)
+    # Grab the top words with a heap instead of sorting every word
+    top_words = get_top_words(word_dict, top_k)
 
     # Create a bar chart
-    plt.figure(figsize=(16, 10))  # Adjust the figure size as needed
-    plt.barh(words, counts)
-    plt.title(f'50 Most Spoken Words in \"{filename.replace(".txt", "")}\"')
-    plt.xlabel('Word Frequency')
-    plt.ylabel('Words')
+    figure = plt.figure(figsize=(16, 10))  # Adjust the figure size as needed
+    draw_top_words(figure.gca(), top_words, filename)
 
-    # Add data labels
-    for i, count in enumerate(counts):
-        plt.text(count, i, str(count), va='center', fontsize=10)
-
-    plt.tight_layout()
+    figure.tight_layout()
     plt.show()
+    plt.close(figure)
 
 
 def main():
@@ -169,13 +290,14 @@ def main():
 
     # if you get file not found errors, make sure the file is in the same directory
     # as this python script, or try using absolute filepaths instead.
-    extracted_text = extract_text_from_file(filename=txt_file)
-
-    real_word_list = extract_text_from_file("words_alpha.txt").strip().split()
+    # the file is streamed in chunks so this works on really big files too.
+    word_dict = build_unique_word_dictionary_from_file(filename=txt_file)
 
-    word_dict = build_unique_word_dictionary(extracted_text)
+    # this only reads words_alpha.txt the first time (or when it changes),
+    # after that it just loads the prebuilt index next to it.
+    real_words = load_dictionary_index("words_alpha.txt")
 
-    word_dict = word_dictionary_real_word_extraction(word_dict=word_dict, valid_words=real_word_list)
+    word_dict = word_dictionary_real_word_extraction(word_dict=word_dict, valid_words=real_words)
 
     plot_words(word_dict=word_dict, filename=txt_file)
 
@@ -78,29 +78,22 @@ def format_list_into_sql_array(input_list: list) -> str:
         return formatted_output_string
     
 
-def format_tuple_into_string(formatted_tuple: tuple):
+def format_tuple_into_string(formatted_tuple: tuple, placeholder: str = "%s"):
     """
-    THe purpose of this function is to take a tuple of items in any order and create a (?) or (?, ?), kind of string
+    THe purpose of this function is to take a tuple of items in any order and create a (%s) or (%s, %s), kind of string
     that can be inserted into sql statement strings like the insert into database kind of strings.
+    psycopg2 uses %s for its placeholders, but you can pass in "?" for sqlite3.
     
     Parameters: 
     formatted_tuple: tuple containing the info that the user wishes to log to the database.
-    
+    placeholder: the placeholder the database library expects, "%s" by default.
     
     Returns: Formatted string to be used for the sql insertion string.
     """
 
     # The if is to make sure there is anything in the tuple at all, otherwise don't log anything to the database.
     if formatted_tuple:
-        if len(formatted_tuple) > 1:
-            formatted_string = "("
-            formatted_string += "?, " * (len(formatted_tuple) - 1)
-            formatted_string += "?)"
-            return formatted_string
-
-        elif len(formatted_tuple) == 1:
-            formatted_string = "(?)"
-            return formatted_string
+        return "(" + ", ".join([placeholder] * len(formatted_tuple)) + ")"
 
 
 def format_publish_date_to_str(publish_date: object) -> str:
@@ -0,0 +1,500 @@
+'''
+This module compares videos to each other instead of looking at one transcript at a
+time. Every word gets an integer ID from a vocabulary shared by all the videos, and each
+video becomes one row of a sparse term matrix (word IDs and their counts). From that
+we can work out TF-IDF scores, which find the words that are special to one video, and
+cosine similarity, which finds the videos that talk about the same things.
+
+Tokenizing and counting each transcript's words is plain Python (the tokenizer's regexes
+and a Counter, which beats numpy at counting strings). From there on it's numpy on whole
+arrays at once: the vocabulary only loops over each file's unique words, and the TF-IDF
+and similarity math never loops at all, so it holds up with tens of thousands of transcripts.
+
+The term matrix is stored in CSR form (like scipy.sparse, but without needing scipy):
+indptr  -> row i's entries are at indptr[i]:indptr[i + 1]
+indices -> the word ID of each entry
+data    -> the count (or TF-IDF weight) of each entry
+
+Usage:
+python vector_analytics.py path/to/transcripts --save term_matrix.npz
+python vector_analytics.py path/to/transcripts --video "ISTA 130 Intro to Python Midterm Review.txt" --top 5
+python vector_analytics.py --load term_matrix.npz --terms 10
+'''
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable
+
+import numpy as np
+
+from corpus_analytics import find_transcript_files, split_into_batches
+from text_normalization import Tokenizer
+from txt_file_analytics import iter_text_chunks, split_text_chunks
+
+
+# videos are compared case folded and Unicode normalized, so "Python" and "python" are one word
+SIMILARITY_TOKENIZER = Tokenizer(casefold=True, unicode_form="NFKC")
+
+# about how many word matches find_similar works on at once (each one is ~30 bytes of arrays)
+DEFAULT_MAX_PRODUCTS = 10_000_000
+
+# words in at least this fraction of the videos are scored as a dense block with a matrix
+# multiply instead of through their (long) postings, up to max_dense_bytes of float32s
+DENSE_WORD_MIN_FRACTION = 0.03
+DEFAULT_MAX_DENSE_BYTES = 256_000_000
+
+
+class Vocabulary:
+    '''
+    Gives every word an integer ID, in the order the words are first seen.
+    '''
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self.words = []
+        self.word_ids = {}
+        for word in words:
+            self.add(word)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.word_ids
+
+    def add(self, word: str) -> int:
+        '''
+        Returns: the word's ID, giving it a new one if it hasn't been seen before
+        '''
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = self.word_ids[word] = len(self.words)
+            self.words.append(word)
+        return word_id
+
+    def encode(self, unique_words: Iterable[str]) -> np.ndarray:
+        '''
+        Returns: int32 array of the IDs of some unique words, adding any new ones
+        '''
+        return np.fromiter((self.add(word) for word in unique_words), dtype=np.int32)
+
+    def decode(self, word_ids: Iterable[int]) -> list[str]:
+        '''
+        Returns: list of the words for some word IDs
+        '''
+        return [self.words[word_id] for word_id in word_ids]
+
+
+class TermMatrix:
+    '''
+    A sparse matrix in CSR form with one row per video and one column per word.
+
+    Parameters:
+    indptr: int64 array, row i's entries are at indptr[i]:indptr[i + 1]
+    indices: int32 array of the word ID of each entry
+    data: array of the value of each entry (counts or weights)
+    column_count: number of columns (the vocabulary size)
+    '''
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, column_count: int) -> None:
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.column_count = column_count
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.indptr) - 1, self.column_count
+
+    @property
+    def row_lengths(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def get_row_ids(self) -> np.ndarray:
+        '''
+        Returns: array with the row number of every entry (the CSR version of COO row indexes)
+        '''
+        return np.repeat(np.arange(self.shape[0]), self.row_lengths)
+
+    def get_row(self, row: int) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        Returns: tuple --> (word IDs, values) of one row
+        '''
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def transpose(self) -> 'TermMatrix':
+        '''
+        Returns: the transposed matrix, also in CSR form (so one row per word, listing
+        the videos it's in). This is what makes similarity search fast.
+        '''
+        order = np.argsort(self.indices, kind='stable')
+        indptr = np.zeros(self.column_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=self.column_count), out=indptr[1:])
+        return TermMatrix(indptr, self.get_row_ids()[order].astype(np.int32), self.data[order], self.shape[0])
+
+    def to_dense(self) -> np.ndarray:
+        '''
+        Returns: the whole matrix as a normal numpy array. Only for small matrices!
+        '''
+        dense = np.zeros(self.shape, dtype=self.data.dtype)
+        dense[self.get_row_ids(), self.indices] = self.data
+        return dense
+
+
+def count_tokens(tokens: Iterable[str]) -> tuple[list[str], np.ndarray]:
+    '''
+    This function counts the words in one document. A Counter is about 4x faster than
+    np.unique on strings, and it doesn't need a fixed width string array, where one very
+    long token would make every word in the document take up that much room.
+
+    Parameters:
+    tokens: any iterable of words
+
+    Returns: tuple --> (list of the unique words, int32 array of their counts)
+    '''
+    word_counts = Counter(tokens)
+    return list(word_counts), np.fromiter(word_counts.values(), dtype=np.int32, count=len(word_counts))
+
+
+def count_tokens_in_file(filename: str) -> tuple[list[str], np.ndarray]:
+    '''
+    Streams a transcript file through SIMILARITY_TOKENIZER and counts its words (see count_tokens).
+    '''
+    return count_tokens(SIMILARITY_TOKENIZER.clean_words(split_text_chunks(iter_text_chunks(filename))))
+
+
+def count_tokens_in_files(filenames: list[str]) -> list[tuple[str, list[str], np.ndarray]]:
+    return [(filename, *count_tokens_in_file(filename)) for filename in filenames]
+
+
+def build_term_matrix(documents: Iterable[tuple[list[str], np.ndarray]],
+                      vocabulary: Vocabulary = None) -> tuple[TermMatrix, Vocabulary]:
+    '''
+    This function stacks per document word counts into one sparse term matrix.
+
+    Parameters:
+    documents: iterable of (unique words, counts) tuples, like from count_tokens
+    vocabulary: optional Vocabulary to add to, so matrices built at different times line up
+
+    Returns: tuple --> (the TermMatrix of counts, the Vocabulary)
+    '''
+    vocabulary = vocabulary or Vocabulary()
+    row_indices = []
+    row_counts = []
+
+    for unique_words, counts in documents:
+        word_ids = vocabulary.encode(unique_words)
+        order = np.argsort(word_ids)
+        row_indices.append(word_ids[order])
+        row_counts.append(counts[order])
+
+    indptr = np.zeros(len(row_indices) + 1, dtype=np.int64)
+    np.cumsum([len(word_ids) for word_ids in row_indices], out=indptr[1:])
+    indices = np.concatenate(row_indices) if row_indices else np.array([], dtype=np.int32)
+    data = np.concatenate(row_counts) if row_counts else np.array([], dtype=np.int32)
+
+    return TermMatrix(indptr, indices.astype(np.int32), data.astype(np.int32), len(vocabulary)), vocabulary
+
+
+def build_term_matrix_from_files(filenames: list[str], workers: int = None,
+                                 vocabulary: Vocabulary = None) -> tuple[TermMatrix, Vocabulary]:
+    '''
+    This function counts the words of every transcript in worker processes (in batches
+    of about the same total size) and builds the term matrix, one row per file in the
+    same order as filenames.
+
+    Parameters:
+    filenames: list of transcript txt files
+    workers: how many worker processes to use. Defaults to the number of CPU cores.
+    vocabulary: optional Vocabulary to add to
+
+    Returns: tuple --> (the TermMatrix of counts, the Vocabulary)
+    '''
+    workers = workers or os.cpu_count() or 1
+    batches = [[filename for filename, _ in batch]
+               for batch in split_into_batches([(filename, 0) for filename in filenames], workers * 4)]
+
+    counts_by_filename = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_result in executor.map(count_tokens_in_files, batches):
+            for filename, unique_words, counts in batch_result:
+                counts_by_filename[filename] = (unique_words, counts)
+
+    return build_term_matrix((counts_by_filename[filename] for filename in filenames), vocabulary)
+
+
+def normalize_rows(matrix: TermMatrix) -> TermMatrix:
+    '''
+    Returns: copy of the matrix with every row scaled to length 1 (empty rows stay empty)
+    '''
+    row_ids = matrix.get_row_ids()
+    row_norms = np.sqrt(np.bincount(row_ids, weights=matrix.data.astype(np.float64) ** 2,
+                                    minlength=matrix.shape[0]))
+    row_norms[row_norms == 0] = 1.0
+    return TermMatrix(matrix.indptr, matrix.indices, (matrix.data / row_norms[row_ids]).astype(np.float32),
+                      matrix.column_count)
+
+
+def compute_idf(counts: TermMatrix) -> np.ndarray:
+    '''
+    Returns: float64 array of each word's inverse document frequency, smoothed like
+    scikit-learn does it: log((1 + videos) / (1 + videos with the word)) + 1
+    '''
+    document_frequency = np.bincount(counts.indices, minlength=counts.column_count)
+    return np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1
+
+
+def compute_tfidf(counts: TermMatrix, sublinear_tf: bool = True) -> TermMatrix:
+    '''
+    This function turns a term matrix of counts into TF-IDF weights, with every row
+    normalized to length 1 so cosine similarity is just a dot product.
+
+    Parameters:
+    counts: TermMatrix of word counts
+    sublinear_tf: if True, the term frequency is 1 + log(count), so a word said 100 times
+    doesn't count 100 times as much as a word said once
+
+    Returns: TermMatrix of float32 TF-IDF weights with the same shape as counts
+    '''
+    term_frequency = counts.data.astype(np.float64)
+    if sublinear_tf:
+        term_frequency = 1 + np.log(term_frequency)
+
+    weights = TermMatrix(counts.indptr, counts.indices, term_frequency * compute_idf(counts)[counts.indices],
+                         counts.column_count)
+    return normalize_rows(weights)
+
+
+def get_distinctive_terms(tfidf: TermMatrix, vocabulary: Vocabulary, row: int, k: int = 10) -> list[tuple[str, float]]:
+    '''
+    Returns: list of the k (word, TF-IDF weight) tuples with the biggest weights in one
+    video, which are the words that are most special to that video
+    '''
+    word_ids, weights = tfidf.get_row(row)
+    k = min(k, len(weights))
+    if not k:
+        return []
+
+    best = np.argpartition(-weights, k - 1)[:k]
+    best = best[np.argsort(-weights[best], kind='stable')]
+    return list(zip(vocabulary.decode(word_ids[best].tolist()), weights[best].tolist()))
+
+
+def get_ragged_positions(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    '''
+    Returns: every position in a bunch of ranges glued together, like
+    concatenate([arange(start, start + length) for each range]), without the loop.
+    '''
+    total = int(lengths.sum())
+    range_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.arange(total, dtype=np.int64) - range_starts + np.repeat(starts, lengths)
+
+
+def split_common_words(tfidf: TermMatrix, max_dense_bytes: int = DEFAULT_MAX_DENSE_BYTES) -> tuple[np.ndarray, TermMatrix]:
+    '''
+    This function splits a matrix in two for find_similar: a dense float32 array (one
+    column per common word, in at least DENSE_WORD_MIN_FRACTION of the videos, most common
+    first and only as many as fit in max_dense_bytes) and a TermMatrix of everything
+    else, leaving out words that are only in one video.
+
+    Returns: tuple --> (dense array shaped (rows, common words), TermMatrix of the rest)
+    '''
+    row_count, column_count = tfidf.shape
+    document_frequency = np.bincount(tfidf.indices, minlength=column_count)
+
+    common_words = np.flatnonzero((document_frequency >= DENSE_WORD_MIN_FRACTION * row_count)
+                                  & (document_frequency > 1))
+    common_words = common_words[np.argsort(-document_frequency[common_words], kind='stable')]
+    common_words = common_words[:max_dense_bytes // (4 * max(row_count, 1))]
+
+    dense_columns = np.full(column_count, -1, dtype=np.int64)
+    dense_columns[common_words] = np.arange(len(common_words))
+    entry_columns = dense_columns[tfidf.indices]
+    is_dense = entry_columns >= 0
+    row_ids = tfidf.get_row_ids()
+
+    dense = np.zeros((row_count, len(common_words)), dtype=np.float32)
+    dense[row_ids[is_dense], entry_columns[is_dense]] = tfidf.data[is_dense]
+
+    is_sparse = ~is_dense & (document_frequency[tfidf.indices] > 1)
+    indptr = np.zeros(row_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_ids[is_sparse], minlength=row_count), out=indptr[1:])
+    sparse = TermMatrix(indptr, tfidf.indices[is_sparse], tfidf.data[is_sparse], column_count)
+    return dense, sparse
+
+
+def find_similar(tfidf: TermMatrix, k: int = 5, query_rows: Iterable[int] = None, batch_size: int = 64,
+                 max_products: int = DEFAULT_MAX_PRODUCTS,
+                 max_dense_bytes: int = DEFAULT_MAX_DENSE_BYTES) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    This function finds the k most similar videos (by cosine similarity of their rows)
+    for a bunch of videos at once.
+
+    Instead of multiplying every row by every other row, each query row only follows
+    the words it actually has to the videos that also have them (using the transposed
+    matrix), and the products are added up per video with np.bincount. Queries are done
+    in batches of at most batch_size rows and about max_products word matches, so the
+    memory used stays about the same no matter how big the corpus gets.
+
+    Words that are in only one video are skipped (they can't make two videos similar), and
+    the very common words, whose postings would be most of the work, are put in a small
+    dense matrix and scored with one matrix multiply per batch instead.
+
+    Parameters:
+    tfidf: TermMatrix with rows normalized to length 1, like from compute_tfidf
+    k: how many similar videos to find for each one
+    query_rows: which rows to find similar videos for. Defaults to all of them.
+    batch_size: most query rows to score at a time
+    max_products: about how many (query word, matching video) products to work out at a time
+    max_dense_bytes: most memory to use for the dense matrix of common words (0 turns it off)
+
+    Returns: tuple --> (int array of the similar rows, float array of their similarities),
+    both shaped (number of queries, k) and best first. Videos that share no words with
+    the query aren't similar at all, so if there are fewer than k that do, the extra
+    spots are -1 with a similarity of 0.
+    '''
+    row_count = tfidf.shape[0]
+    query_rows = np.arange(row_count) if query_rows is None else np.asarray(list(query_rows), dtype=np.int64)
+    k = max(0, min(k, row_count - 1))
+
+    neighbors = np.full((len(query_rows), k), -1, dtype=np.int64)
+    similarities = np.zeros((len(query_rows), k), dtype=np.float32)
+    if not k or not len(query_rows):
+        return neighbors, similarities
+
+    dense, sparse = split_common_words(tfidf, max_dense_bytes)
+    postings = sparse.transpose()
+    posting_lengths = postings.row_lengths
+
+    # how many products each query row takes, so batches can be cut by work instead of by rows
+    query_costs = np.bincount(sparse.get_row_ids(), weights=posting_lengths[sparse.indices],
+                              minlength=row_count)[query_rows]
+
+    batch_start = 0
+    while batch_start < len(query_rows):
+        running_costs = np.cumsum(query_costs[batch_start:batch_start + batch_size])
+        batch_count = max(1, int(np.searchsorted(running_costs, max_products, side='right')))
+        batch_rows = query_rows[batch_start:batch_start + batch_count]
+
+        # every (query, word, weight) entry of the queries in this batch
+        query_lengths = sparse.row_lengths[batch_rows]
+        query_positions = get_ragged_positions(sparse.indptr[batch_rows], query_lengths)
+        query_owners = np.repeat(np.arange(batch_count), query_lengths)
+        query_words = sparse.indices[query_positions]
+        query_weights = sparse.data[query_positions]
+
+        # follow each of those words to every video that has it
+        word_posting_lengths = posting_lengths[query_words]
+        posting_positions = get_ragged_positions(postings.indptr[query_words], word_posting_lengths)
+        matched_videos = postings.indices[posting_positions]
+        products = postings.data[posting_positions] * np.repeat(query_weights, word_posting_lengths)
+        owners = np.repeat(query_owners, word_posting_lengths)
+
+        scores = np.bincount(owners * row_count + matched_videos, weights=products,
+                             minlength=batch_count * row_count).astype(np.float64, copy=False)
+        scores = scores.reshape(batch_count, row_count)
+        if dense.shape[1]:
+            scores += dense[batch_rows] @ dense.T
+        scores[np.arange(batch_count), batch_rows] = -np.inf
+
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        no_shared_words = best_scores <= 0
+        best[no_shared_words] = -1
+        best_scores[no_shared_words] = 0
+
+        neighbors[batch_start:batch_start + batch_count] = best
+        similarities[batch_start:batch_start + batch_count] = best_scores
+        batch_start += batch_count
+
+    return neighbors, similarities
+
+
+def save_term_matrix(filename: str, counts: TermMatrix, vocabulary: Vocabulary, row_names: list[str]) -> None:
+    '''
+    Saves a count term matrix, its vocabulary and the name of each row (like the
+    transcript filenames) to one .npz file, so it doesn't have to be rebuilt every time.
+    '''
+    np.savez(filename, indptr=counts.indptr, indices=counts.indices, data=counts.data,
+             words=np.array(vocabulary.words, dtype=str), row_names=np.array(row_names, dtype=str))
+
+
+def load_term_matrix(filename: str) -> tuple[TermMatrix, Vocabulary, list[str]]:
+    '''
+    Returns: tuple --> (the count TermMatrix, its Vocabulary, the row names) saved by save_term_matrix
+    '''
+    with np.load(filename) as saved:
+        vocabulary = Vocabulary(saved["words"].tolist())
+        counts = TermMatrix(saved["indptr"], saved["indices"], saved["data"], len(vocabulary))
+        return counts, vocabulary, saved["row_names"].tolist()
+
+
+def get_row_for_video(filenames: list[str], video: str) -> int:
+    '''
+    Returns: the row of a transcript file by its name (the folder doesn't matter), or -1 if it isn't there
+    '''
+    video_names = [os.path.basename(filename) for filename in filenames]
+    video_name = os.path.basename(video)
+    return video_names.index(video_name) if video_name in video_names else -1
+
+
+def print_similar_videos(counts: TermMatrix, vocabulary: Vocabulary, filenames: list[str],
+                         query_rows: list[int], top: int = 5, terms: int = 10) -> None:
+    '''
+    Prints each query video's most distinctive words and its most similar videos.
+    '''
+    tfidf = compute_tfidf(counts)
+    neighbors, similarities = find_similar(tfidf, k=top, query_rows=query_rows)
+
+    for query_number, row in enumerate(query_rows):
+        print(f'\n{filenames[row]}')
+        distinctive_words = get_distinctive_terms(tfidf, vocabulary, row, k=terms)
+        print('  distinctive words: ' + ', '.join(word for word, _ in distinctive_words))
+        for neighbor, similarity in zip(neighbors[query_number], similarities[query_number]):
+            if neighbor >= 0:
+                print(f'  {similarity:.3f}  {filenames[neighbor]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find distinctive words and similar videos across transcripts.")
+    parser.add_argument("path", nargs="?", help="folder of transcript txt files, or a glob pattern")
+    parser.add_argument("--load", help="load a term matrix saved with --save instead of reading transcripts")
+    parser.add_argument("--save", help="save the term matrix to this .npz file")
+    parser.add_argument("--video", help="only show results for this transcript file")
+    parser.add_argument("--top", type=int, default=5, help="how many similar videos to show")
+    parser.add_argument("--terms", type=int, default=10, help="how many distinctive words to show")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for reading transcripts")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.load:
+        counts, vocabulary, filenames = load_term_matrix(args.load)
+    elif args.path:
+        filenames = find_transcript_files(args.path)
+        counts, vocabulary = build_term_matrix_from_files(filenames, workers=args.workers)
+    else:
+        parser.error("give a folder of transcripts or --load a saved term matrix")
+
+    if args.save:
+        save_term_matrix(args.save, counts, vocabulary, filenames)
+
+    if args.video:
+        query_rows = [get_row_for_video(filenames, args.video)]
+        if query_rows[0] < 0:
+            parser.error(f"{args.video} isn't one of the transcripts")
+    else:
+        query_rows = list(range(len(filenames)))
+
+    print_similar_videos(counts, vocabulary, filenames, query_rows, top=args.top, terms=args.terms)
+    print(f'\n{counts.shape[0]:,} videos, {counts.shape[1]:,} unique words, '
+          f'{len(counts.data):,} entries, {time.perf_counter() - start_time:.2f}s')
+
+
+if __name__ == "__main__":
+    main()
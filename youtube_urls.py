@@ -0,0 +1,100 @@
+'''
+This module pulls the video ID straight out of a YT url without going to YT for it,
+since that's all we need to get a transcript. It also has a little video info class
+that only asks YT for the title and publish date if something actually uses them.
+'''
+import re
+from functools import cached_property
+from urllib.parse import parse_qs, urlparse
+
+from instrumentation import metrics
+
+
+# YT video ids are always 11 characters of letters, numbers, - and _
+VIDEO_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+YOUTUBE_HOSTS = frozenset([
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtube-nocookie.com', 'www.youtube-nocookie.com',
+])
+
+SHORT_LINK_HOSTS = frozenset(['youtu.be', 'www.youtu.be'])
+
+# urls like youtube.com/shorts/<video id> or youtube.com/embed/<video id>
+VIDEO_ID_PATH_PREFIXES = frozenset(['shorts', 'live', 'embed', 'v', 'e'])
+
+
+def extract_video_id(video_url: str) -> str:
+    '''
+    This function gets the video ID from a YT url without any network calls.
+    It works for all of these (with or without https:// and extra url params):
+    youtube.com/watch?v=<id>, youtu.be/<id>, youtube.com/shorts/<id>,
+    youtube.com/live/<id>, youtube.com/embed/<id>, and any youtube.com url with a v= param.
+    If you just pass in a video ID by itself, you get it right back.
+
+    Parameters:
+    video_url: str of the YT video url
+
+    Returns: str of the 11 character video ID
+
+    Raises: ValueError if there's no video ID in the url
+    '''
+    video_url = video_url.strip()
+
+    if VIDEO_ID_PATTERN.match(video_url):
+        return video_url
+
+    if '://' not in video_url:
+        video_url = 'https://' + video_url
+
+    parsed_url = urlparse(video_url)
+    host = (parsed_url.hostname or '').lower()
+    path_parts = [part for part in parsed_url.path.split('/') if part]
+
+    if host in SHORT_LINK_HOSTS and path_parts:
+        video_id = path_parts[0]
+
+    elif host in YOUTUBE_HOSTS:
+        video_id = parse_qs(parsed_url.query).get('v', [''])[0]
+
+        if not video_id and len(path_parts) >= 2 and path_parts[0] in VIDEO_ID_PATH_PREFIXES:
+            video_id = path_parts[1]
+
+    else:
+        video_id = ''
+
+    if not VIDEO_ID_PATTERN.match(video_id):
+        raise ValueError(f"I couldn't find a video ID in this url: {video_url}")
+
+    return video_id
+
+
+class LazyVideoInfo:
+    '''
+    Holds the info for one YT video. The video ID comes straight from the url, and
+    the title and publish date are only fetched from YT (with pytube) the first time
+    you ask for one of them. After that they're remembered.
+
+    Parameters:
+    video_url: str of the YT video url
+    '''
+
+    def __init__(self, video_url: str) -> None:
+        self.video_url = video_url
+        self.video_id = extract_video_id(video_url)
+
+    @cached_property
+    def youtube(self):
+        from pytube import YouTube
+
+        return YouTube(self.video_url)
+
+    @cached_property
+    def title(self) -> str:
+        with metrics.stage("get_video_info"):
+            return self.youtube.title
+
+    @cached_property
+    def publish_date(self):
+        with metrics.stage("get_video_info"):
+            return self.youtube.publish_date